@@ -0,0 +1,144 @@
+"""
+Admission control: a concurrency limit with a short, bounded wait queue.
+
+When more requests arrive than can run at once, a few wait briefly for a
+slot and the rest are turned away immediately with Overloaded (the app
+answers 503 with Retry-After). Running everything at once instead makes
+every request slow, and the excess keeps worker threads busy long after
+the clients have given up.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted; ``retry_after`` is in whole seconds"""
+
+    def __init__(self, name, reason, retry_after):
+        super().__init__(f"Server busy ({name}: {reason}), retry in {retry_after} s")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Args:
+        name: Shown in errors and stats
+        max_concurrent: Requests allowed to run at once (0 means unlimited)
+        max_queue: Requests allowed to wait for a slot; more are rejected at once
+        queue_timeout: Seconds a request may wait before it is rejected
+        max_retry_after: Upper bound for the Retry-After estimate
+    """
+
+    def __init__(self, name, max_concurrent, max_queue=0, queue_timeout=1.0, max_retry_after=30):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retry_after = max_retry_after
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        self._service_seconds = None  # moving average, for Retry-After
+        self._waits_ms = deque(maxlen=1000)
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: the queue ahead divided over the running slots"""
+        service = self._service_seconds or 1.0
+        slots = self.max_concurrent or 1
+        estimate = math.ceil(service * (self.waiting + 1) / slots)
+        return max(1, min(self.max_retry_after, estimate))
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        raise Overloaded(self.name, reason, self.retry_after())
+
+    def acquire(self, block=False):
+        """
+        Take a slot, waiting up to queue_timeout in the queue.
+
+        Args:
+            block: Wait for a slot however long it takes and regardless of the
+                queue bound (for background work, which has no client to
+                answer); it still counts against max_concurrent
+
+        Raises:
+            Overloaded: The queue is full or the wait timed out
+        """
+        began = time.perf_counter()
+        with self._cond:
+            if self.max_concurrent and (self.active >= self.max_concurrent or self.waiting):
+                if not block and self.waiting >= self.max_queue:
+                    self._reject('queue_full')
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                deadline = None if block else began + self.queue_timeout
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = None if deadline is None else deadline - time.perf_counter()
+                        if remaining is not None and remaining <= 0:
+                            self._reject('timeout')
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            self._waits_ms.append((time.perf_counter() - began) * 1000)
+
+    def check(self):
+        """
+        Raise Overloaded if a request arriving now would be turned away for a
+        full queue, without taking a slot: for work handed to a background
+        thread that will later acquire(block=True)
+        """
+        with self._cond:
+            if self.max_concurrent and self.active >= self.max_concurrent and self.waiting >= self.max_queue:
+                self._reject('queue_full')
+
+    def release(self, service_seconds=None):
+        with self._cond:
+            self.active -= 1
+            if service_seconds is not None:
+                if self._service_seconds is None:
+                    self._service_seconds = service_seconds
+                else:
+                    self._service_seconds = 0.9 * self._service_seconds + 0.1 * service_seconds
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, block=False):
+        """Hold a slot for the duration of a ``with`` block (see acquire)"""
+        self.acquire(block=block)
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - began)
+
+    def stats(self):
+        with self._cond:
+            waits = list(self._waits_ms)
+            stats = {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'peak_queue_depth': self.peak_waiting,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'avg_service_ms': round(self._service_seconds * 1000, 1) if self._service_seconds else None,
+            }
+        if waits:
+            stats['wait_p50_ms'] = round(float(np.percentile(waits, 50)), 2)
+            stats['wait_p95_ms'] = round(float(np.percentile(waits, 95)), 2)
+        return stats
@@ -1,31 +1,130 @@
-
 # app.py
+import gc
+import json
 import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+# First, so the import phase recorded below covers Flask and SQLAlchemy too
+from startup_profile import startup
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, Response, stream_with_context, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user, UserMixin
 from werkzeug.utils import secure_filename
-from PIL import Image
-from models import load_model, predict_food
+from admission import AdmissionController, Overloaded
+from food_search import FoodSearchIndex
+from label_nutrition import LabelNutritionMap, load_overrides
+from prediction_cache import NOT_STORED, PredictionCache, file_version
+from image_hashing import NearDuplicateIndex, perceptual_hash
+from meal_index import MealEmbeddingIndex
+from plate import classify_plate, decode_for_plate
+from preprocessing import CROP_SIZE, PRESIZED_SIDE, decode_image, is_presized
+from memory_stats import memory_usage
+from uploads import AsyncUploadWriter
+from model_registry import ModelRegistry, ModelVersion
+from nutrition_data import EXERCISE_DB, NUTRITION_DB
+
+startup.mark('imports')
 
 # CONFIG
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'my-secret-key-for-development'
-# Database URI - supports both SQLite (default) and PostgreSQL (if DATABASE_URL is set)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+MODEL_PATH = os.path.join(BASE_DIR, 'food101_model_for_inference (1).pth')
+
+def load_config(app):
+    """Defaults, overridable from the environment"""
+    app.config['SECRET_KEY'] = 'my-secret-key-for-development'
+    # Database URI - supports both SQLite (default) and PostgreSQL (if DATABASE_URL is set)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Upload forms downscale photos in the browser to this shorter side (0 sends originals)
+    app.config['UPLOAD_RESIZE_SIDE'] = int(os.environ.get('UPLOAD_RESIZE_SIDE', PRESIZED_SIDE))
+    app.config['UPLOAD_RESIZE_QUALITY'] = float(os.environ.get('UPLOAD_RESIZE_QUALITY', 0.85))
+    # Write uploaded originals in a background thread instead of before inference
+    app.config['ASYNC_UPLOAD_WRITES'] = os.environ.get('ASYNC_UPLOAD_WRITES', '1') == '1'
+    # Seconds a preview waits for an upload another worker process is still writing
+    app.config['UPLOAD_WAIT_TIMEOUT'] = float(os.environ.get('UPLOAD_WAIT_TIMEOUT', 2.0))
+    # Meal uploads: several photos classified in one batched forward pass
+    app.config['MAX_MEAL_IMAGES'] = int(os.environ.get('MAX_MEAL_IMAGES', 8))
+    app.config['DECODE_WORKERS'] = int(os.environ.get('DECODE_WORKERS', 4))
+    # Plate mode: the photo and overlapping grid regions of it classified in one batch at
+    # PLATE_CROP_SIZE, about 1.6x the cost of a single classification at 128 px (see plate.py)
+    app.config['PLATE_MODE'] = os.environ.get('PLATE_MODE', '1') == '1'
+    app.config['PLATE_GRID'] = int(os.environ.get('PLATE_GRID', 2))
+    app.config['PLATE_OVERLAP'] = float(os.environ.get('PLATE_OVERLAP', 0.25))
+    app.config['PLATE_CROP_SIZE'] = int(os.environ.get('PLATE_CROP_SIZE', 128))
+    app.config['PLATE_MIN_CONFIDENCE'] = float(os.environ.get('PLATE_MIN_CONFIDENCE', 0.3))
+    app.config['PLATE_MAX_ITEMS'] = int(os.environ.get('PLATE_MAX_ITEMS', 4))
+    # Background classification jobs (upload returns a job id, page polls / listens for the result)
+    app.config['CLASSIFICATION_JOB_WORKERS'] = int(os.environ.get('CLASSIFICATION_JOB_WORKERS', 2))
+    # Jobs a worker process accepts before answering 503 (queued and running together)
+    app.config['CLASSIFICATION_JOB_MAX_PENDING'] = int(os.environ.get('CLASSIFICATION_JOB_MAX_PENDING', 8))
+    app.config['CLASSIFICATION_JOB_TTL_HOURS'] = int(os.environ.get('CLASSIFICATION_JOB_TTL_HOURS', 24))
+    # Seconds a job may stay pending or running before it is reported failed (its worker process died)
+    app.config['CLASSIFICATION_JOB_TIMEOUT'] = int(os.environ.get('CLASSIFICATION_JOB_TIMEOUT', 120))
+    # Server-sent job events hold a request open, so they need threaded or async workers (gunicorn.conf.py turns them off otherwise)
+    app.config['JOB_EVENTS_STREAM'] = os.environ.get('JOB_EVENTS_STREAM', '1') == '1'
+    # Micro-batching of concurrent predictions (needs a threaded server, e.g. gunicorn --threads)
+    app.config['INFERENCE_BATCHING'] = os.environ.get('INFERENCE_BATCHING', '0') == '1'
+    app.config['INFERENCE_MAX_BATCH_SIZE'] = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 8))
+    app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 5))
+    # Admission control (per worker process): forward passes running at once, how many may wait and for
+    # how long; the rest get 503 + Retry-After. With batching, a batch's worth may run together.
+    app.config['INFERENCE_MAX_CONCURRENT'] = int(os.environ.get(
+        'INFERENCE_MAX_CONCURRENT', app.config['INFERENCE_MAX_BATCH_SIZE'] if app.config['INFERENCE_BATCHING'] else 2))
+    app.config['INFERENCE_MAX_QUEUE'] = int(os.environ.get('INFERENCE_MAX_QUEUE', 4))
+    app.config['INFERENCE_QUEUE_TIMEOUT'] = float(os.environ.get('INFERENCE_QUEUE_TIMEOUT', 2.0))
+    # Separate limit for every other route, so uploads cannot starve the dashboard (0 = unlimited)
+    app.config['WEB_MAX_CONCURRENT'] = int(os.environ.get('WEB_MAX_CONCURRENT', 32))
+    app.config['WEB_MAX_QUEUE'] = int(os.environ.get('WEB_MAX_QUEUE', 64))
+    app.config['WEB_QUEUE_TIMEOUT'] = float(os.environ.get('WEB_QUEUE_TIMEOUT', 5.0))
+    # 'local' loads the model in every web worker, 'remote' sends images to inference_server.py
+    app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'local')
+    app.config['INFERENCE_SOCKET'] = os.environ.get('INFERENCE_SOCKET', os.path.join(BASE_DIR, 'instance', 'inference.sock'))
+    app.config['INFERENCE_AUTHKEY'] = os.environ.get('INFERENCE_AUTHKEY')
+    # INT8 CPU inference: 'dynamic' (fc layer only) or 'static' (whole backbone, calibrated on UPLOAD_FOLDER)
+    app.config['INFERENCE_QUANTIZATION'] = os.environ.get('INFERENCE_QUANTIZATION') or None
+    # Model file to load: 'mmap' (memory-mapped weights from export_model.py, else the checkpoint), 'checkpoint',
+    # or the 'torchscript' / 'onnx' / 'auto' exports, which have no embeddings for SIMILAR_MEALS
+    app.config['MODEL_ARTIFACT'] = os.environ.get('MODEL_ARTIFACT', 'mmap')
+    # Threads / memory format / bf16 autocast per worker, written by `python inference_profile.py autotune`
+    app.config['INFERENCE_PROFILE'] = os.environ.get('INFERENCE_PROFILE', os.path.join(BASE_DIR, 'instance', 'inference_profile.json'))
+    app.config['INFERENCE_THREADS'] = int(os.environ['INFERENCE_THREADS']) if os.environ.get('INFERENCE_THREADS') else None
+    # Hot swapping: serve the newest *.pth in MODEL_DIR (or the one named in MODEL_DIR/ACTIVE), see model_registry.py
+    app.config['MODEL_DIR'] = os.environ.get('MODEL_DIR')
+    app.config['MODEL_POLL_INTERVAL'] = float(os.environ.get('MODEL_POLL_INTERVAL', 10))
+    app.config['MODEL_WARMUP_RUNS'] = int(os.environ.get('MODEL_WARMUP_RUNS', 2))
+    # Load the model while creating the app, so gunicorn --preload forks workers that share it (see gunicorn.conf.py)
+    app.config['PRELOAD_MODEL'] = os.environ.get('PRELOAD_MODEL') == '1'
+    # Cascade: a light model answers first, ResNet50 only runs when its confidence is below the threshold
+    app.config['CASCADE_CHECKPOINT'] = os.environ.get('CASCADE_CHECKPOINT')
+    app.config['CASCADE_THRESHOLD'] = float(os.environ.get('CASCADE_THRESHOLD', 0.8))
+    # Prediction cache keyed by upload hash + model version (set PREDICTION_CACHE_DIR to persist)
+    app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+    app.config['PREDICTION_CACHE_DIR'] = os.environ.get('PREDICTION_CACHE_DIR')
+    app.config['PREDICTION_CACHE_DISK_MB'] = int(os.environ.get('PREDICTION_CACHE_DISK_MB', 256))
+    app.config['PREDICTION_CACHE_MAX_AGE_DAYS'] = float(os.environ.get('PREDICTION_CACHE_MAX_AGE_DAYS', 30))
+    # Reuse predictions for re-saved/resized copies of a user's recent uploads (pHash Hamming distance)
+    app.config['NEAR_DUPLICATE_LOOKUP'] = os.environ.get('NEAR_DUPLICATE_LOOKUP', '1') == '1'
+    app.config['NEAR_DUPLICATE_MAX_DISTANCE'] = int(os.environ.get('NEAR_DUPLICATE_MAX_DISTANCE', 4))
+    # "Similar past meals": classifier embeddings of each upload in a per-user index (see meal_index.py)
+    app.config['SIMILAR_MEALS'] = os.environ.get('SIMILAR_MEALS', '1') == '1'
+    app.config['SIMILAR_MEALS_DIR'] = os.environ.get('SIMILAR_MEALS_DIR', os.path.join(BASE_DIR, 'instance', 'meal_index'))
+    app.config['SIMILAR_MEALS_K'] = int(os.environ.get('SIMILAR_MEALS_K', 3))
+    # Classifier label -> NUTRITION_DB entry or record, for labels the automatic mapping gets wrong or misses
+    app.config['LABEL_NUTRITION_OVERRIDES'] = os.environ.get('LABEL_NUTRITION_OVERRIDES', os.path.join(BASE_DIR, 'label_nutrition_overrides.json'))
+    app.config['SIMILAR_MEALS_MIN_SIMILARITY'] = float(os.environ.get('SIMILAR_MEALS_MIN_SIMILARITY', 0.8))
+
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+bp = Blueprint('main', __name__)
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -70,200 +169,554 @@ class ExerciseGoal(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-# Create tables
-with app.app_context():
-    db.create_all()
-
-# Load model at startup
-try:
-    MODEL_PATH = os.path.join(BASE_DIR, 'food101_model_for_inference (1).pth')
-    model, class_names, device = load_model(MODEL_PATH)
-    print(f"Model loaded successfully with {len(class_names)} classes")
-except Exception as e:
-    model = None
-    class_names = []
-    device = None
-    print(f"Model loading failed: {e}")
+class ClassificationJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    image_path = db.Column(db.String(300))
+    predictions = db.Column(db.Text, nullable=True)  # JSON list of [name, probability]
+    model_version = db.Column(db.String(100), nullable=True)
+    error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.status}
+        if self.status == 'done':
+            data['predictions'] = json.loads(self.predictions)
+            data['model_version'] = self.model_version
+            data['result_url'] = url_for('main.log_food', job=self.id)
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+# Per-process services, set up by create_app
+upload_writer = None
+model_registry = None
+inference_client = None
+# Label -> nutrition for the remote backend, built from the server's classes on connect (local models carry their own)
+remote_label_map = None
+inference_profile = None
+model_version = None
+# True in a gunicorn master loading the model before forking workers (PRELOAD_MODEL)
+preloading = False
+prediction_cache = None
+near_duplicates = None
+meal_index = None
+# FoodSearchIndex over NUTRITION_DB, see food_search_index()
+food_index = None
+_food_index_lock = threading.Lock()
+inference_admission = None
+web_admission = None
+job_admission = None
+# Uploads already downscaled by the browser vs full-size originals (old clients, HEIC, API callers)
+upload_stats = {'presized': 0, 'presized_bytes': 0, 'full_size': 0, 'full_size_bytes': 0}
+
+def init_services(app):
+    """
+    Caches, indexes and admission limits. All are cheap to create except the
+    food search index, which is built on first use, or here in the gunicorn
+    master with PRELOAD_MODEL so the workers share it instead of each
+    building a copy.
+    """
+    global upload_writer, prediction_cache, near_duplicates, meal_index, inference_admission, web_admission, job_admission
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    upload_writer = AsyncUploadWriter(app.config['UPLOAD_FOLDER'])
+    prediction_cache = PredictionCache(max_entries=app.config['PREDICTION_CACHE_SIZE'],
+                                       persist_dir=app.config['PREDICTION_CACHE_DIR'],
+                                       max_disk_bytes=app.config['PREDICTION_CACHE_DISK_MB'] * 1024 * 1024,
+                                       max_age=app.config['PREDICTION_CACHE_MAX_AGE_DAYS'] * 86400)
+    near_duplicates = NearDuplicateIndex(max_distance=app.config['NEAR_DUPLICATE_MAX_DISTANCE'])
+    meal_index = MealEmbeddingIndex(app.config['SIMILAR_MEALS_DIR']) if app.config['SIMILAR_MEALS'] else None
+    if app.config['PRELOAD_MODEL']:
+        with startup.phase('food search index'):
+            food_search_index()
+    inference_admission = AdmissionController('inference', app.config['INFERENCE_MAX_CONCURRENT'],
+                                              max_queue=app.config['INFERENCE_MAX_QUEUE'],
+                                              queue_timeout=app.config['INFERENCE_QUEUE_TIMEOUT'])
+    web_admission = AdmissionController('web', app.config['WEB_MAX_CONCURRENT'],
+                                        max_queue=app.config['WEB_MAX_QUEUE'],
+                                        queue_timeout=app.config['WEB_QUEUE_TIMEOUT'])
+    # Background jobs wait in the executor's queue, so bound them when they are created instead
+    job_admission = AdmissionController('classification jobs', app.config['CLASSIFICATION_JOB_MAX_PENDING'])
+
+def food_search_index():
+    """Search and name lookups for NUTRITION_DB (food_search.py), built once per process on first use"""
+    global food_index
+    if food_index is None:
+        with _food_index_lock:
+            if food_index is None:
+                food_index = FoodSearchIndex(NUTRITION_DB)
+    return food_index
+
+def init_inference(app):
+    """
+    Set up the configured inference backend without importing torch: the
+    local model is imported, loaded and warmed up in the registry's
+    background thread, so the worker serves other routes meanwhile.
+    """
+    global inference_client, model_registry, preloading
+    config = app.config
+    if config['INFERENCE_BACKEND'] == 'remote':
+        # Keep web workers torch-free; the model lives in inference_server.py
+        from inference_client import InferenceClient
+        if not config['INFERENCE_AUTHKEY']:
+            raise RuntimeError("INFERENCE_BACKEND=remote needs INFERENCE_AUTHKEY, the secret the inference server was started with")
+        inference_client = InferenceClient(config['INFERENCE_SOCKET'], authkey=config['INFERENCE_AUTHKEY'])
+        print(f"Using inference server at {config['INFERENCE_SOCKET']}")
+        try:
+            connect_inference_server(config)
+        except Exception as e:
+            # Retried on the first request that needs the labels
+            print(f"Inference server not reachable yet: {e}")
+        return
+
+    def process_profile():
+        # An OpenMP pool started before the fork leaves the workers' first parallel op hanging,
+        # so the gunicorn master loads and warms up single-threaded; after_fork restores the profile
+        return dict(inference_profile, threads=1) if preloading else inference_profile
+
+    def load_model_version(path):
+        """Load a checkpoint with the configured quantization, cascade and batching"""
+        global inference_profile
+        with startup.phase('import torch and models'):
+            from models import embedding_layer, load_cascade, load_model
+            from inference import BatchingEngine
+            from inference_profile import apply_profile, default_threads, load_profile
+
+        if inference_profile is None:
+            profile = load_profile(config['INFERENCE_PROFILE'], threads=config['INFERENCE_THREADS'])
+            if config['INFERENCE_QUANTIZATION'] and profile['autocast_bf16']:
+                # Quantized kernels only take float32 inputs
+                print("Ignoring bfloat16 autocast from the inference profile: quantization is enabled")
+                profile['autocast_bf16'] = False
+            profile['threads'] = profile['threads'] or default_threads()
+            inference_profile = profile
+            apply_profile(process_profile())
+
+        with startup.phase(f'load {os.path.basename(path)}'):
+            artifact = config['MODEL_ARTIFACT']
+            model, class_names, device = load_model(path,
+                                                    quantize=config['INFERENCE_QUANTIZATION'],
+                                                    calibration_dir=config['UPLOAD_FOLDER'],
+                                                    artifact=None if artifact == 'checkpoint' else artifact)
+            if config['SIMILAR_MEALS'] and embedding_layer(model) is None:
+                print(f"MODEL_ARTIFACT={artifact} loaded a model without embeddings: similar meals are off "
+                      f"for it (use 'mmap' or 'checkpoint')")
+            model = apply_profile(process_profile(), model)
+        version = file_version(path)
+        if config['INFERENCE_QUANTIZATION']:
+            version += f"-{config['INFERENCE_QUANTIZATION']}"
+        if config['CASCADE_CHECKPOINT']:
+            model = load_cascade(config['CASCADE_CHECKPOINT'], model, class_names, device,
+                                 threshold=config['CASCADE_THRESHOLD'])
+            version += f"-cascade-{file_version(config['CASCADE_CHECKPOINT'])}-{config['CASCADE_THRESHOLD']}"
+        engine = None
+        if config['INFERENCE_BATCHING']:
+            engine = BatchingEngine(model, class_names, device,
+                                    max_batch_size=config['INFERENCE_MAX_BATCH_SIZE'],
+                                    max_wait_ms=config['INFERENCE_MAX_WAIT_MS'])
+        return ModelVersion(path, model, class_names, device, version, engine=engine,
+                            label_map=build_label_map(class_names, config))
+
+    model_registry = ModelRegistry(load_model_version, models_dir=config['MODEL_DIR'], default_path=MODEL_PATH,
+                                   warmup_runs=config['MODEL_WARMUP_RUNS'],
+                                   poll_interval=config['MODEL_POLL_INTERVAL'])
+    if config['PRELOAD_MODEL']:
+        # In the gunicorn master: workers fork with the model loaded and start their own watcher
+        preloading = True
+        with startup.phase('preload model'):
+            model_registry.refresh()
+    else:
+        # Loaded and warmed up in the background; routes that do not need the model serve meanwhile
+        model_registry.start()
+
+def before_fork(app):
+    """
+    Called by gunicorn in the master before each worker is forked from the
+    preloaded app: drops database connections the workers must not share, and
+    freezes every object allocated so far (the model, NUTRITION_DB,
+    EXERCISE_DB, ...) out of the garbage collector, so collections in the
+    workers do not write to, and thereby copy, their pages.
+    """
+    # create_app loaded the model synchronously. Only look at the outcome: wait_ready() would
+    # start the registry's watcher thread here in the master, where it would keep polling
+    if model_registry is not None and model_registry.state != 'ready':
+        print(f"Forking workers without a preloaded model ({model_registry.state}: {model_registry.error}); "
+              f"each worker keeps trying to load its own")
+    with app.app_context():
+        db.engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+def after_fork():
+    """Called by gunicorn in each worker right after the fork"""
+    global preloading
+    gc.enable()
+    preloading = False
+    if 'torch' in sys.modules and inference_profile is not None:
+        # Start the worker's own intra-op thread pool at the profile's size
+        import torch
+        torch.set_num_threads(inference_profile['threads'])
+
+_default_app = None
+
+def __getattr__(name):
+    """
+    Keeps the ``app:app`` entry point (gunicorn app:app, flask --app app)
+    working: ``app.app`` is a create_app() instance made on first access,
+    so importing the module still does not build one
+    """
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_app(config=None):
+    """
+    Build the Flask app.
+
+    Args:
+        config: Settings applied over the environment-based defaults (e.g. for tests)
+    """
+    with startup.phase('config'):
+        app = Flask(__name__)
+        load_config(app)
+        if config:
+            app.config.update(config)
+    with startup.phase('database'):
+        db.init_app(app)
+        login_manager.init_app(app)
+        with app.app_context():
+            db.create_all()
+    with startup.phase('services'):
+        init_services(app)
+    with startup.phase('inference backend'):
+        init_inference(app)
+    app.register_blueprint(bp)
+    app.extensions['startup_profile'] = startup
+    print(f"App created: {startup.summary()}")
+    return app
+
+def active_model():
+    """The registry's ModelVersion serving local predictions, or None"""
+    return model_registry.current() if model_registry is not None else None
+
+def inference_available():
+    """True when either the local model or the inference server can classify images"""
+    return inference_client is not None or active_model() is not None
+
+def model_unavailable_message():
+    if model_registry is not None and model_registry.state in ('idle', 'loading'):
+        return "AI model is still loading, please try again in a few seconds"
+    return "AI model not available"
+
+def classify_image(img, topk=5):
+    """Classify a PIL image with whichever inference backend is configured"""
+    return classify_images([img], topk=topk)[0]
+
+def classify_images(images, topk=5, crop_size=CROP_SIZE, return_embeddings=False, entry=None):
+    """
+    Classify several PIL images together, as one batch where the backend allows it.
+    With ``return_embeddings`` returns (predictions, embeddings), one embedding
+    (or None when the model has none) per image. ``entry`` pins the local
+    ModelVersion to use (defaults to the active one).
+    """
+    if not images:
+        return ([], []) if return_embeddings else []
+    # Background jobs have no client waiting on a 503, so they queue for a slot instead
+    with inference_admission.slot(block=not has_request_context()):
+        return _classify_images(images, topk, crop_size, return_embeddings, entry)
+
+def _classify_images(images, topk, crop_size, return_embeddings, entry):
+    if inference_client is not None:
+        return inference_client.predict_batch(images, topk=topk, crop_size=crop_size,
+                                              return_embeddings=return_embeddings)
+    entry = entry or active_model()
+    from models import predict_batch
+    if entry.engine is not None:
+        # Submitting all images before waiting lets the engine put them in the same batch
+        futures = [entry.engine.submit(img, topk=topk, crop_size=crop_size, return_embedding=return_embeddings)
+                   for img in images]
+        results = [future.result() for future in futures]
+        if return_embeddings:
+            return [r[0] for r in results], [r[1] for r in results]
+        return results
+    results = predict_batch(entry.model, images, entry.class_names, entry.device, topk=topk, crop_size=crop_size,
+                            return_embeddings=return_embeddings)
+    if return_embeddings:
+        predictions, embeddings = results
+        return predictions, list(embeddings) if embeddings is not None else [None] * len(images)
+    return results
+
+def build_label_map(class_names, config):
+    """LabelNutritionMap for a model's classes, reporting any label left without nutrition"""
+    label_map = LabelNutritionMap(class_names, NUTRITION_DB, overrides=load_overrides(config['LABEL_NUTRITION_OVERRIDES']))
+    report = label_map.report()
+    print(f"Nutrition mapped for {report['mapped']}/{report['classes']} classes")
+    if report['unmapped']:
+        print(f"No nutrition for {', '.join(report['unmapped'])}; add them to NUTRITION_DB or "
+              f"{config['LABEL_NUTRITION_OVERRIDES']}")
+    return label_map
+
+def connect_inference_server(config):
+    """Read the inference server's model version and classes, and map its labels to nutrition once"""
+    global model_version, remote_label_map
+    version, class_names = inference_client.classes()
+    remote_label_map = build_label_map(class_names, config)
+    model_version = version
+
+def current_model_version():
+    """Version tag of the model answering predictions, or None if unknown"""
+    global model_version
+    entry = active_model()
+    if entry is not None:
+        return entry.version
+    if model_version is None and inference_client is not None:
+        try:
+            model_version = inference_client.ping()['version']
+        except Exception as e:
+            print(f"Could not read model version from inference server: {e}")
+    return model_version
+
+_decode_executor = None
+_decode_executor_pid = None
+
+def decode_executor():
+    """Thread pool for decoding multi-image uploads, created once per worker process"""
+    global _decode_executor, _decode_executor_pid
+    if _decode_executor is None or _decode_executor_pid != os.getpid():
+        _decode_executor = ThreadPoolExecutor(max_workers=current_app.config['DECODE_WORKERS'],
+                                              thread_name_prefix='decode')
+        _decode_executor_pid = os.getpid()
+    return _decode_executor
+
+def classify_uploads(images_bytes, user_id=None, topk=5, keys=None):
+    """
+    Classify several uploaded images, skipping the model when possible:
+    byte-identical uploads hit the prediction cache and visually identical
+    ones from the same user hit the perceptual-hash index. The remaining
+    images are decoded (in parallel, unless the browser already downscaled
+    them) and classified in a single batch.
+
+    When ``keys`` (the saved filenames) are given, every upload's embedding
+    goes into the user's similar-meals index under its filename: from the
+    forward pass, or for a repeat photo the one stored with its cache or
+    near-duplicate entry. Only a cache entry stored without an embedding
+    (e.g. before SIMILAR_MEALS was on) sends a repeat through the model.
+
+    Returns (predictions per image, version of the model that made them).
+    """
+    # One model version for the whole request, even if a new one is swapped in meanwhile
+    entry = active_model()
+    version = entry.version if entry is not None else current_model_version()
+    results = [None] * len(images_bytes)
+    misses = []
+    presized = []
+    index_embeddings = keys is not None and user_id is not None and meal_index is not None
+    for i, image_bytes in enumerate(images_bytes):
+        presized.append(is_presized(image_bytes, max(current_app.config['UPLOAD_RESIZE_SIDE'], PRESIZED_SIDE)))
+        kind = 'presized' if presized[-1] else 'full_size'
+        upload_stats[kind] += 1
+        upload_stats[kind + '_bytes'] += len(image_bytes)
+
+        cache_key = PredictionCache.key(image_bytes, version, topk) if version else None
+        if cache_key:
+            cached = prediction_cache.get(cache_key, with_embedding=index_embeddings)
+            if cached is not None:
+                if index_embeddings:
+                    results[i], embedding = cached
+                    # Indexed under the repeat's own filename, so it finds the earlier copies of the meal
+                    if embedding is not None:
+                        meal_index.add(user_id, keys[i], embedding)
+                else:
+                    results[i] = cached
+                continue
+
+        image_hash = None
+        if user_id is not None and current_app.config['NEAR_DUPLICATE_LOOKUP']:
+            image_hash = perceptual_hash(image_bytes)
+            match = near_duplicates.lookup(user_id, image_hash, model_version=version, with_embedding=True)
+            # Without a stored embedding the upload goes to the model after all
+            if match is not None and (not index_embeddings or match[1] is not None):
+                results[i], embedding = match
+                if index_embeddings:
+                    meal_index.add(user_id, keys[i], embedding)
+                if cache_key:
+                    prediction_cache.put(cache_key, results[i], embedding if index_embeddings else NOT_STORED)
+                continue
+        misses.append((i, cache_key, image_hash))
+
+    if misses:
+        # Pre-sized uploads decode in about a millisecond, less than a hop through the pool
+        if len(misses) == 1 or all(presized[i] for i, _, _ in misses):
+            images = [decode_image(images_bytes[i]) for i, _, _ in misses]
+        else:
+            images = list(decode_executor().map(decode_image, [images_bytes[i] for i, _, _ in misses]))
+        if index_embeddings:
+            batch_predictions, embeddings = classify_images(images, topk=topk, return_embeddings=True, entry=entry)
+            for (i, _, _), embedding in zip(misses, embeddings):
+                if embedding is not None:
+                    meal_index.add(user_id, keys[i], embedding)
+        else:
+            batch_predictions = classify_images(images, topk=topk, entry=entry)
+            embeddings = [None] * len(misses)
+        for (i, cache_key, image_hash), predictions, embedding in zip(misses, batch_predictions, embeddings):
+            results[i] = predictions
+            if cache_key:
+                prediction_cache.put(cache_key, predictions, embedding if index_embeddings else NOT_STORED)
+            if image_hash is not None:
+                near_duplicates.add(user_id, image_hash, predictions, model_version=version, embedding=embedding)
+    return results, version
+
+def classify_upload(image_bytes, user_id=None, topk=5, key=None):
+    """Single-image form of classify_uploads, returning (predictions, model version)"""
+    results, version = classify_uploads([image_bytes], user_id=user_id, topk=topk, keys=[key] if key else None)
+    return results[0], version
+
+def similar_meals(user_id, key):
+    """
+    The user's logged meals whose photos look most like the upload saved as
+    ``key``, as dicts with the FoodLog and the cosine similarity
+    """
+    if meal_index is None:
+        return []
+    embedding = meal_index.get(user_id, key)
+    if embedding is None:
+        return []
+    # Over-fetch: uploads that were never accepted have no FoodLog
+    k = current_app.config['SIMILAR_MEALS_K']
+    matches = meal_index.search(user_id, embedding, k=k * 4, exclude={key},
+                                min_similarity=current_app.config['SIMILAR_MEALS_MIN_SIMILARITY'])
+    if not matches:
+        return []
+    logs = {}
+    for log in FoodLog.query.filter(FoodLog.user_id == user_id,
+                                    FoodLog.image_path.in_([path for path, _ in matches])).order_by(FoodLog.date):
+        logs[log.image_path] = log
+    return [{'log': logs[path], 'similarity': similarity}
+            for path, similarity in matches if path in logs][:k]
+
+def classify_plate_upload(image_bytes, topk=3):
+    """Plate mode: suggest every food found in one photo, returning (items, whole) like plate.classify_plate"""
+    grid, overlap, crop_size = current_app.config['PLATE_GRID'], current_app.config['PLATE_OVERLAP'], current_app.config['PLATE_CROP_SIZE']
+    image = decode_for_plate(image_bytes, grid=grid, overlap=overlap, crop_size=crop_size)
+    return classify_plate(image, classify_images, grid=grid, overlap=overlap, crop_size=crop_size,
+                          min_confidence=current_app.config['PLATE_MIN_CONFIDENCE'],
+                          max_items=current_app.config['PLATE_MAX_ITEMS'], topk=topk)
+
+# Routes whose POSTs run the model: limited by inference_admission around the forward pass instead
+# (create_classification_job only checks it, the job's own forward pass waits for a slot)
+INFERENCE_ENDPOINTS = {'main.log_food', 'main.log_meal'}
+# Long-lived or monitoring requests that must not hold (or wait for) a web slot
+ADMISSION_EXEMPT_ENDPOINTS = {'static', 'main.classification_job_events', 'main.inference_stats',
+                              'main.healthz', 'main.readyz'}
+
+@bp.before_app_request
+def start_model_loading():
+    # The loader thread is per process: one started before a fork (gunicorn --preload) is gone in the worker
+    if model_registry is not None:
+        model_registry.start()
+
+@bp.before_app_request
+def admit_request():
+    endpoint = request.endpoint
+    if endpoint in ADMISSION_EXEMPT_ENDPOINTS or (endpoint in INFERENCE_ENDPOINTS and request.method == 'POST'):
+        return
+    web_admission.acquire()
+    g.admission_started = time.perf_counter()
+
+@bp.teardown_app_request
+def release_request(exc=None):
+    started = g.pop('admission_started', None)
+    if started is not None:
+        web_admission.release(time.perf_counter() - started)
+
+@bp.app_errorhandler(Overloaded)
+def overloaded(e):
+    """Fast 503 instead of queueing without bound; clients should retry after the given delay"""
+    if request.accept_mimetypes.best == 'application/json' or request.path.startswith('/classify_jobs'):
+        response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    else:
+        response = Response(f"The server is busy. Please try again in {e.retry_after} seconds.\n",
+                            mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def store_upload(filename, image_bytes):
+    """Persist an uploaded original, off the request thread unless ASYNC_UPLOAD_WRITES is off"""
+    if current_app.config['ASYNC_UPLOAD_WRITES']:
+        upload_writer.save(filename, image_bytes)
+    else:
+        with open(os.path.join(current_app.config['UPLOAD_FOLDER'], filename), 'wb') as f:
+            f.write(image_bytes)
+
+_job_executor = None
+_job_executor_pid = None
+
+def job_executor():
+    """Thread pool for background classification jobs, created once per worker process"""
+    global _job_executor, _job_executor_pid
+    if _job_executor is None or _job_executor_pid != os.getpid():
+        _job_executor = ThreadPoolExecutor(max_workers=current_app.config['CLASSIFICATION_JOB_WORKERS'],
+                                           thread_name_prefix='classify-job')
+        _job_executor_pid = os.getpid()
+    return _job_executor
+
+def run_classification_job(app, job_id, image_bytes, user_id):
+    """
+    Classify an upload in the background and record the outcome on its job
+    row; releases the job_admission slot taken by create_classification_job
+    """
+    began = time.perf_counter()
+    try:
+        _run_classification_job(app, job_id, image_bytes, user_id)
+    finally:
+        job_admission.release(time.perf_counter() - began)
+
+def _run_classification_job(app, job_id, image_bytes, user_id):
+    with app.app_context():
+        # Claimed in one UPDATE, and only while still pending: expire_stale_job may have failed it already
+        claimed = ClassificationJob.query.filter_by(id=job_id, status='pending').update(
+            {'status': 'running', 'started_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return
+        image_path = ClassificationJob.query.get(job_id).image_path
+        try:
+            predictions, version = classify_upload(image_bytes, user_id=user_id, topk=5, key=image_path)
+            outcome = {'status': 'done', 'predictions': json.dumps(predictions), 'model_version': version}
+        except Exception as e:
+            outcome = {'status': 'failed', 'error': str(e)[:500]}
+        outcome['finished_at'] = datetime.utcnow()
+        # Likewise, a job failed as stale while it ran keeps the outcome its client was given
+        ClassificationJob.query.filter_by(id=job_id, status='running').update(outcome, synchronize_session=False)
+        db.session.commit()
+
+def expire_stale_job(job):
+    """
+    Mark a job failed once it has been pending (since created_at) or running
+    (since started_at) for longer than CLASSIFICATION_JOB_TIMEOUT: the worker
+    process that owned it has died or restarted, so it will never finish
+    """
+    if job.status not in ('pending', 'running'):
+        return
+    since = job.started_at if job.status == 'running' else job.created_at
+    now = datetime.utcnow()
+    if since is not None and (now - since).total_seconds() > current_app.config['CLASSIFICATION_JOB_TIMEOUT']:
+        job.status = 'failed'
+        job.error = "Classification did not finish, please upload the photo again"
+        job.finished_at = now
+        db.session.commit()
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Extended Nutrition Database
-NUTRITION_DB = {
-    # Fruits
-    'apple': {'calories': 52, 'protein': 0.3, 'carbs': 14, 'fats': 0.2, 'serving': '100g'},
-    'banana': {'calories': 89, 'protein': 1.1, 'carbs': 23, 'fats': 0.3, 'serving': '100g'},
-    'orange': {'calories': 47, 'protein': 0.9, 'carbs': 12, 'fats': 0.1, 'serving': '100g'},
-    'mango': {'calories': 60, 'protein': 0.8, 'carbs': 15, 'fats': 0.4, 'serving': '100g'},
-    'grapes': {'calories': 69, 'protein': 0.7, 'carbs': 18, 'fats': 0.2, 'serving': '100g'},
-    'watermelon': {'calories': 30, 'protein': 0.6, 'carbs': 8, 'fats': 0.2, 'serving': '100g'},
-    'strawberry': {'calories': 32, 'protein': 0.7, 'carbs': 8, 'fats': 0.3, 'serving': '100g'},
-    'pineapple': {'calories': 50, 'protein': 0.5, 'carbs': 13, 'fats': 0.1, 'serving': '100g'},
-    'papaya': {'calories': 43, 'protein': 0.5, 'carbs': 11, 'fats': 0.3, 'serving': '100g'},
-    'pomegranate': {'calories': 83, 'protein': 1.7, 'carbs': 19, 'fats': 1.2, 'serving': '100g'},
-    
-    # Vegetables
-    'broccoli': {'calories': 34, 'protein': 2.8, 'carbs': 7, 'fats': 0.4, 'serving': '100g'},
-    'carrot': {'calories': 41, 'protein': 0.9, 'carbs': 10, 'fats': 0.2, 'serving': '100g'},
-    'tomato': {'calories': 18, 'protein': 0.9, 'carbs': 4, 'fats': 0.2, 'serving': '100g'},
-    'spinach': {'calories': 23, 'protein': 2.9, 'carbs': 4, 'fats': 0.4, 'serving': '100g'},
-    'potato': {'calories': 77, 'protein': 2, 'carbs': 17, 'fats': 0.1, 'serving': '100g'},
-    'onion': {'calories': 40, 'protein': 1.1, 'carbs': 9, 'fats': 0.1, 'serving': '100g'},
-    'cucumber': {'calories': 15, 'protein': 0.7, 'carbs': 4, 'fats': 0.1, 'serving': '100g'},
-    'cauliflower': {'calories': 25, 'protein': 1.9, 'carbs': 5, 'fats': 0.3, 'serving': '100g'},
-    'bell pepper': {'calories': 31, 'protein': 1, 'carbs': 6, 'fats': 0.3, 'serving': '100g'},
-    'cabbage': {'calories': 25, 'protein': 1.3, 'carbs': 6, 'fats': 0.1, 'serving': '100g'},
-    
-    # Grains & Staples
-    'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fats': 0.3, 'serving': '100g cooked'},
-    'bread': {'calories': 265, 'protein': 9, 'carbs': 49, 'fats': 3.2, 'serving': '100g'},
-    'pasta': {'calories': 131, 'protein': 5, 'carbs': 25, 'fats': 1.1, 'serving': '100g cooked'},
-    'oats': {'calories': 389, 'protein': 17, 'carbs': 66, 'fats': 7, 'serving': '100g'},
-    'quinoa': {'calories': 120, 'protein': 4.4, 'carbs': 21, 'fats': 1.9, 'serving': '100g cooked'},
-    'wheat flour': {'calories': 364, 'protein': 10, 'carbs': 76, 'fats': 1, 'serving': '100g'},
-    'corn': {'calories': 86, 'protein': 3.3, 'carbs': 19, 'fats': 1.4, 'serving': '100g'},
-    
-    # Proteins - Vegetarian
-    'paneer': {'calories': 265, 'protein': 18, 'carbs': 1.2, 'fats': 20, 'serving': '100g'},
-    'tofu': {'calories': 76, 'protein': 8, 'carbs': 1.9, 'fats': 4.8, 'serving': '100g'},
-    'chickpeas': {'calories': 164, 'protein': 8.9, 'carbs': 27, 'fats': 2.6, 'serving': '100g cooked'},
-    'lentils': {'calories': 116, 'protein': 9, 'carbs': 20, 'fats': 0.4, 'serving': '100g cooked'},
-    'kidney beans': {'calories': 127, 'protein': 8.7, 'carbs': 23, 'fats': 0.5, 'serving': '100g cooked'},
-    'black beans': {'calories': 132, 'protein': 8.9, 'carbs': 24, 'fats': 0.5, 'serving': '100g cooked'},
-    'green peas': {'calories': 81, 'protein': 5, 'carbs': 14, 'fats': 0.4, 'serving': '100g'},
-    'eggs': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fats': 11, 'serving': '100g'},
-    'yogurt': {'calories': 59, 'protein': 10, 'carbs': 3.6, 'fats': 0.4, 'serving': '100g'},
-    'milk': {'calories': 42, 'protein': 3.4, 'carbs': 5, 'fats': 1, 'serving': '100ml'},
-    
-    # Proteins - Non-Vegetarian
-    'chicken breast': {'calories': 165, 'protein': 31, 'carbs': 0, 'fats': 3.6, 'serving': '100g'},
-    'chicken': {'calories': 239, 'protein': 27, 'carbs': 0, 'fats': 14, 'serving': '100g'},
-    'fish': {'calories': 206, 'protein': 22, 'carbs': 0, 'fats': 12, 'serving': '100g'},
-    'salmon': {'calories': 208, 'protein': 20, 'carbs': 0, 'fats': 13, 'serving': '100g'},
-    'tuna': {'calories': 130, 'protein': 28, 'carbs': 0, 'fats': 1, 'serving': '100g'},
-    'shrimp': {'calories': 99, 'protein': 24, 'carbs': 0.2, 'fats': 0.3, 'serving': '100g'},
-    'beef': {'calories': 250, 'protein': 26, 'carbs': 0, 'fats': 15, 'serving': '100g'},
-    'lamb': {'calories': 294, 'protein': 25, 'carbs': 0, 'fats': 21, 'serving': '100g'},
-    'pork': {'calories': 242, 'protein': 27, 'carbs': 0, 'fats': 14, 'serving': '100g'},
-    'turkey': {'calories': 189, 'protein': 29, 'carbs': 0, 'fats': 7, 'serving': '100g'},
-    
-    # Fast Food & Snacks
-    'pizza': {'calories': 266, 'protein': 11, 'carbs': 33, 'fats': 10, 'serving': '100g'},
-    'burger': {'calories': 295, 'protein': 17, 'carbs': 24, 'fats': 14, 'serving': '100g'},
-    'french fries': {'calories': 312, 'protein': 3.4, 'carbs': 41, 'fats': 15, 'serving': '100g'},
-    'sandwich': {'calories': 250, 'protein': 10, 'carbs': 30, 'fats': 10, 'serving': '100g'},
-    'hot dog': {'calories': 290, 'protein': 10, 'carbs': 24, 'fats': 17, 'serving': '100g'},
-    'tacos': {'calories': 217, 'protein': 9, 'carbs': 19, 'fats': 11, 'serving': '100g'},
-    'nachos': {'calories': 312, 'protein': 7, 'carbs': 36, 'fats': 16, 'serving': '100g'},
-    
-    # Indian Foods
-    'roti': {'calories': 297, 'protein': 11, 'carbs': 54, 'fats': 4, 'serving': '100g'},
-    'naan': {'calories': 310, 'protein': 9, 'carbs': 52, 'fats': 7, 'serving': '100g'},
-    'dosa': {'calories': 168, 'protein': 3.9, 'carbs': 28, 'fats': 4, 'serving': '100g'},
-    'idli': {'calories': 156, 'protein': 4.4, 'carbs': 28, 'fats': 2.7, 'serving': '100g'},
-    'biryani': {'calories': 200, 'protein': 8, 'carbs': 30, 'fats': 5, 'serving': '100g'},
-    'dal': {'calories': 104, 'protein': 7, 'carbs': 17, 'fats': 1, 'serving': '100g'},
-    'samosa': {'calories': 262, 'protein': 5, 'carbs': 32, 'fats': 13, 'serving': '100g'},
-    'pakora': {'calories': 240, 'protein': 4, 'carbs': 22, 'fats': 15, 'serving': '100g'},
-    'paratha': {'calories': 320, 'protein': 7, 'carbs': 42, 'fats': 14, 'serving': '100g'},
-    
-    # Nuts & Seeds
-    'almonds': {'calories': 579, 'protein': 21, 'carbs': 22, 'fats': 50, 'serving': '100g'},
-    'cashews': {'calories': 553, 'protein': 18, 'carbs': 30, 'fats': 44, 'serving': '100g'},
-    'peanuts': {'calories': 567, 'protein': 26, 'carbs': 16, 'fats': 49, 'serving': '100g'},
-    'walnuts': {'calories': 654, 'protein': 15, 'carbs': 14, 'fats': 65, 'serving': '100g'},
-    'pumpkin seeds': {'calories': 446, 'protein': 19, 'carbs': 54, 'fats': 19, 'serving': '100g'},
-    'sunflower seeds': {'calories': 584, 'protein': 21, 'carbs': 20, 'fats': 51, 'serving': '100g'},
-    
-    # Dairy & Alternatives
-    'cheese': {'calories': 402, 'protein': 25, 'carbs': 1.3, 'fats': 33, 'serving': '100g'},
-    'butter': {'calories': 717, 'protein': 0.9, 'carbs': 0.1, 'fats': 81, 'serving': '100g'},
-    'cream': {'calories': 345, 'protein': 2.2, 'carbs': 2.7, 'fats': 37, 'serving': '100ml'},
-    'ice cream': {'calories': 207, 'protein': 3.5, 'carbs': 24, 'fats': 11, 'serving': '100g'},
-    
-    # Beverages & Others
-    'coffee': {'calories': 2, 'protein': 0.3, 'carbs': 0, 'fats': 0, 'serving': '100ml'},
-    'tea': {'calories': 1, 'protein': 0, 'carbs': 0.3, 'fats': 0, 'serving': '100ml'},
-    'orange juice': {'calories': 45, 'protein': 0.7, 'carbs': 10, 'fats': 0.2, 'serving': '100ml'},
-    'soda': {'calories': 41, 'protein': 0, 'carbs': 11, 'fats': 0, 'serving': '100ml'},
-    'honey': {'calories': 304, 'protein': 0.3, 'carbs': 82, 'fats': 0, 'serving': '100g'},
-    'sugar': {'calories': 387, 'protein': 0, 'carbs': 100, 'fats': 0, 'serving': '100g'},
-    'olive oil': {'calories': 884, 'protein': 0, 'carbs': 0, 'fats': 100, 'serving': '100ml'},
-    'chocolate': {'calories': 546, 'protein': 5, 'carbs': 61, 'fats': 31, 'serving': '100g'},
-    'cake': {'calories': 257, 'protein': 4.6, 'carbs': 41, 'fats': 9, 'serving': '100g'},
-    'cookies': {'calories': 502, 'protein': 5.6, 'carbs': 64, 'fats': 25, 'serving': '100g'},
-}
-
-EXERCISE_DB = {
-    # Cardio Exercises
-    'walking_slow': {'name': 'Walking (Slow pace, 3 km/h)', 'met': 2.5, 'category': 'Cardio', 'icon': '🚶'},
-    'walking_moderate': {'name': 'Walking (Moderate, 5 km/h)', 'met': 3.5, 'category': 'Cardio', 'icon': '🚶‍♂️'},
-    'walking_brisk': {'name': 'Walking (Brisk, 6.5 km/h)', 'met': 5.0, 'category': 'Cardio', 'icon': '🚶‍♀️'},
-    'jogging': {'name': 'Jogging (8 km/h)', 'met': 8.0, 'category': 'Cardio', 'icon': '🏃'},
-    'running_moderate': {'name': 'Running (10 km/h)', 'met': 10.0, 'category': 'Cardio', 'icon': '🏃‍♂️'},
-    'running_fast': {'name': 'Running (12 km/h)', 'met': 12.5, 'category': 'Cardio', 'icon': '🏃‍♀️'},
-    'sprinting': {'name': 'Sprinting (16+ km/h)', 'met': 16.0, 'category': 'Cardio', 'icon': '💨'},
-    
-    # Cycling
-    'cycling_leisure': {'name': 'Cycling (Leisure, 15 km/h)', 'met': 4.0, 'category': 'Cycling', 'icon': '🚴'},
-    'cycling_moderate': {'name': 'Cycling (Moderate, 20 km/h)', 'met': 6.8, 'category': 'Cycling', 'icon': '🚴‍♂️'},
-    'cycling_vigorous': {'name': 'Cycling (Vigorous, 25+ km/h)', 'met': 10.0, 'category': 'Cycling', 'icon': '🚴‍♀️'},
-    'stationary_bike_light': {'name': 'Stationary Bike (Light)', 'met': 3.5, 'category': 'Cycling', 'icon': '🚴'},
-    'stationary_bike_moderate': {'name': 'Stationary Bike (Moderate)', 'met': 6.8, 'category': 'Cycling', 'icon': '🚴‍♂️'},
-    'stationary_bike_vigorous': {'name': 'Stationary Bike (Vigorous)', 'met': 10.0, 'category': 'Cycling', 'icon': '🚴‍♀️'},
-    
-    # Swimming
-    'swimming_leisure': {'name': 'Swimming (Leisure)', 'met': 6.0, 'category': 'Swimming', 'icon': '🏊'},
-    'swimming_laps_light': {'name': 'Swimming Laps (Light)', 'met': 7.0, 'category': 'Swimming', 'icon': '🏊‍♂️'},
-    'swimming_laps_moderate': {'name': 'Swimming Laps (Moderate)', 'met': 8.0, 'category': 'Swimming', 'icon': '🏊‍♀️'},
-    'swimming_laps_vigorous': {'name': 'Swimming Laps (Vigorous)', 'met': 10.0, 'category': 'Swimming', 'icon': '🏊'},
-    
-    # Strength Training
-    'weight_training_light': {'name': 'Weight Training (Light)', 'met': 3.5, 'category': 'Strength', 'icon': '🏋️'},
-    'weight_training_moderate': {'name': 'Weight Training (Moderate)', 'met': 5.0, 'category': 'Strength', 'icon': '🏋️‍♂️'},
-    'weight_training_vigorous': {'name': 'Weight Training (Vigorous)', 'met': 6.0, 'category': 'Strength', 'icon': '🏋️‍♀️'},
-    'bodyweight_exercises': {'name': 'Bodyweight Exercises', 'met': 5.0, 'category': 'Strength', 'icon': '💪'},
-    'push_ups': {'name': 'Push-ups', 'met': 3.8, 'category': 'Strength', 'icon': '💪'},
-    'pull_ups': {'name': 'Pull-ups', 'met': 8.0, 'category': 'Strength', 'icon': '💪'},
-    
-    # Sports
-    'basketball': {'name': 'Basketball (Game)', 'met': 8.0, 'category': 'Sports', 'icon': '🏀'},
-    'football': {'name': 'Football/Soccer', 'met': 7.0, 'category': 'Sports', 'icon': '⚽'},
-    'tennis_singles': {'name': 'Tennis (Singles)', 'met': 8.0, 'category': 'Sports', 'icon': '🎾'},
-    'tennis_doubles': {'name': 'Tennis (Doubles)', 'met': 6.0, 'category': 'Sports', 'icon': '🎾'},
-    'badminton': {'name': 'Badminton', 'met': 5.5, 'category': 'Sports', 'icon': '🏸'},
-    'volleyball': {'name': 'Volleyball', 'met': 4.0, 'category': 'Sports', 'icon': '🏐'},
-    'cricket': {'name': 'Cricket', 'met': 4.8, 'category': 'Sports', 'icon': '🏏'},
-    
-    # HIIT & Aerobics
-    'hiit': {'name': 'HIIT (High Intensity)', 'met': 12.0, 'category': 'HIIT', 'icon': '🔥'},
-    'aerobics_low': {'name': 'Aerobics (Low Impact)', 'met': 5.0, 'category': 'Aerobics', 'icon': '🤸'},
-    'aerobics_high': {'name': 'Aerobics (High Impact)', 'met': 7.0, 'category': 'Aerobics', 'icon': '🤸‍♂️'},
-    'zumba': {'name': 'Zumba', 'met': 8.8, 'category': 'Aerobics', 'icon': '💃'},
-    'dancing': {'name': 'Dancing (General)', 'met': 4.5, 'category': 'Aerobics', 'icon': '💃'},
-    'jump_rope': {'name': 'Jump Rope', 'met': 12.3, 'category': 'HIIT', 'icon': '🦘'},
-    'burpees': {'name': 'Burpees', 'met': 8.0, 'category': 'HIIT', 'icon': '🔥'},
-    
-    # Flexibility & Mind-Body
-    'yoga_hatha': {'name': 'Yoga (Hatha)', 'met': 2.5, 'category': 'Flexibility', 'icon': '🧘'},
-    'yoga_vinyasa': {'name': 'Yoga (Vinyasa)', 'met': 4.0, 'category': 'Flexibility', 'icon': '🧘‍♀️'},
-    'yoga_power': {'name': 'Yoga (Power)', 'met': 4.0, 'category': 'Flexibility', 'icon': '🧘‍♂️'},
-    'pilates': {'name': 'Pilates', 'met': 3.0, 'category': 'Flexibility', 'icon': '🧘'},
-    'stretching': {'name': 'Stretching', 'met': 2.3, 'category': 'Flexibility', 'icon': '🤸'},
-    
-    # Other Activities
-    'stairs_climbing': {'name': 'Stair Climbing', 'met': 8.8, 'category': 'Cardio', 'icon': '🪜'},
-    'elliptical': {'name': 'Elliptical Machine', 'met': 5.0, 'category': 'Cardio', 'icon': '🏃'},
-    'rowing': {'name': 'Rowing Machine', 'met': 7.0, 'category': 'Cardio', 'icon': '🚣'},
-    'hiking': {'name': 'Hiking', 'met': 6.0, 'category': 'Outdoor', 'icon': '🥾'},
-    'rock_climbing': {'name': 'Rock Climbing', 'met': 8.0, 'category': 'Outdoor', 'icon': '🧗'},
-    'skating': {'name': 'Skating/Rollerblading', 'met': 7.0, 'category': 'Outdoor', 'icon': '⛸️'},
-    'martial_arts': {'name': 'Martial Arts', 'met': 10.0, 'category': 'Sports', 'icon': '🥋'},
-    'boxing': {'name': 'Boxing', 'met': 9.0, 'category': 'Sports', 'icon': '🥊'},
-}
-
-
 def calculate_calories_burned(exercise_key, duration_minutes, user_weight=70):
     """
     Calculate calories burned for an exercise
@@ -300,7 +753,7 @@ def get_daily_exercise_stats(user_id):
 
 # NEW ROUTES - Add these after the existing routes
 
-@app.route('/exercise')
+@bp.route('/exercise')
 @login_required
 def exercise():
     """Exercise tracking main page"""
@@ -342,7 +795,7 @@ def exercise():
                          exercises_by_category=exercises_by_category)
 
 
-@app.route('/log_exercise', methods=['POST'])
+@bp.route('/log_exercise', methods=['POST'])
 @login_required
 def log_exercise():
     """Log a new exercise"""
@@ -352,11 +805,11 @@ def log_exercise():
     
     if not exercise_key or duration <= 0:
         flash("Please select an exercise and enter valid duration", "danger")
-        return redirect(url_for('exercise'))
+        return redirect(url_for('main.exercise'))
     
     if exercise_key not in EXERCISE_DB:
         flash("Invalid exercise selected", "danger")
-        return redirect(url_for('exercise'))
+        return redirect(url_for('main.exercise'))
     
     # Calculate calories burned
     user_weight = current_user.weight_kg or 70
@@ -378,10 +831,10 @@ def log_exercise():
     db.session.commit()
     
     flash(f"Logged {exercise_data['name']}: {duration} min, {calories_burned} kcal burned! 🔥", "success")
-    return redirect(url_for('exercise'))
+    return redirect(url_for('main.exercise'))
 
 
-@app.route('/update_exercise_goal', methods=['POST'])
+@bp.route('/update_exercise_goal', methods=['POST'])
 @login_required
 def update_exercise_goal():
     """Update daily exercise goal"""
@@ -397,10 +850,10 @@ def update_exercise_goal():
     db.session.commit()
     
     flash(f"Exercise goal updated to {new_goal} kcal/day", "success")
-    return redirect(url_for('exercise'))
+    return redirect(url_for('main.exercise'))
 
 
-@app.route('/exercise_history')
+@bp.route('/exercise_history')
 @login_required
 def exercise_history():
     """View exercise history"""
@@ -433,7 +886,7 @@ def exercise_history():
                          avg_daily_duration=avg_daily_duration)
 
 
-@app.route('/delete_exercise/<int:log_id>', methods=['POST'])
+@bp.route('/delete_exercise/<int:log_id>', methods=['POST'])
 @login_required
 def delete_exercise(log_id):
     """Delete an exercise log"""
@@ -441,27 +894,47 @@ def delete_exercise(log_id):
     
     if log.user_id != current_user.id:
         flash("Unauthorized", "danger")
-        return redirect(url_for('exercise_history'))
+        return redirect(url_for('main.exercise_history'))
     
     db.session.delete(log)
     db.session.commit()
     flash("Exercise log deleted", "success")
-    return redirect(url_for('exercise_history'))
+    return redirect(url_for('main.exercise_history'))
+
+def current_label_map():
+    """LabelNutritionMap of the model answering predictions, or None"""
+    if inference_client is not None:
+        if remote_label_map is None:
+            try:
+                connect_inference_server(current_app.config)
+            except Exception as e:
+                print(f"Could not read classes from inference server: {e}")
+        return remote_label_map
+    entry = active_model()
+    return entry.label_map if entry is not None else None
+
+def prediction_nutrition(predictions):
+    """Label -> nutrition record (None when unmapped) for (label, probability) predictions"""
+    labels = current_label_map()
+    return labels.for_predictions(predictions) if labels is not None else {}
+
+def nutrition_for(food_name):
+    """
+    Nutrition for an accepted food: a classifier label through the label map
+    (unmapped labels are not guessed), anything else, e.g. a search result,
+    through lookup_nutrition
+    """
+    labels = current_label_map()
+    if labels is not None and food_name in labels:
+        return labels.get(food_name)
+    return lookup_nutrition(food_name)
 
 def lookup_nutrition(food_name):
     """Search for food in database with fuzzy matching"""
-    key = food_name.lower().strip()
-    
-    # Exact match
-    if key in NUTRITION_DB:
-        return {'name': key, **NUTRITION_DB[key]}
-    
-    # Partial match
-    for db_key in NUTRITION_DB:
-        if db_key in key or key in db_key:
-            return {'name': db_key, **NUTRITION_DB[db_key]}
-    
-    return None
+    key = food_search_index().best_match(food_name)
+    if key is None:
+        return None
+    return {'name': key, **NUTRITION_DB[key]}
 
 def get_exercise_suggestions(calories, user_weight=70):
     """Calculate exercise suggestions based on calories and user weight"""
@@ -537,7 +1010,7 @@ def get_daily_calorie_intake(user_id):
 
 # Update the /dashboard route (replace the existing one around line 195)
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     # Get logs for last 7 days
@@ -617,13 +1090,13 @@ def dashboard():
                          net_calories=net_calories)
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     return render_template('index.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         email = request.form['email'].strip().lower()
@@ -632,17 +1105,17 @@ def register():
         
         if User.query.filter_by(email=email).first():
             flash("Email already registered", "danger")
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         
         user = User(email=email, name=name, password_hash=generate_password_hash(password))
         db.session.add(user)
         db.session.commit()
         flash("Account created successfully! Please login.", "success")
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email'].strip().lower()
@@ -651,21 +1124,21 @@ def login():
         
         if not user or not check_password_hash(user.password_hash, password):
             flash("Invalid email or password", "danger")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         
         login_user(user)
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash("You have been logged out", "info")
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     if request.method == 'POST':
@@ -677,11 +1150,11 @@ def profile():
         current_user.conditions = request.form.get('conditions', '')
         db.session.commit()
         flash("Profile updated successfully!", "success")
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
     return render_template('profile.html')
 
-@app.route('/log_food', methods=['GET', 'POST'])
+@bp.route('/log_food', methods=['GET', 'POST'])
 @login_required
 def log_food():
     if request.method == 'POST':
@@ -690,34 +1163,252 @@ def log_food():
             file = request.files['image']
             if file and file.filename:
                 filename = secure_filename(f"{current_user.id}_{datetime.now().timestamp()}_{file.filename}")
-                save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(save_path)
-                
+                image_bytes = file.read()
+                store_upload(filename, image_bytes)
+
                 try:
-                    img = Image.open(save_path).convert('RGB')
-                    if model is None:
-                        flash("AI model not available", "warning")
-                        return redirect(url_for('log_food'))
-                    
-                    predictions = predict_food(model, img, class_names, device, topk=5)
+                    if not inference_available():
+                        flash(model_unavailable_message(), "warning")
+                        return redirect(url_for('main.log_food'))
+
+                    if request.form.get('plate_mode') and current_app.config['PLATE_MODE']:
+                        plate_items, whole = classify_plate_upload(image_bytes)
+                        # Each suggestion can be swapped for one of the whole-image alternatives
+                        items = [{
+                            'filename': filename,
+                            'predictions': [(item['food_name'], item['confidence'])] +
+                                           [p for p in whole if p[0] != item['food_name']],
+                            'regions': item['regions'],
+                        } for item in plate_items]
+                        for item in items:
+                            item['nutrition'] = prediction_nutrition(item['predictions'])
+                        return render_template('log_meal.html', items=items,
+                                             image_url=url_for('main.uploaded_file', filename=filename))
+
+                    predictions, version = classify_upload(image_bytes, user_id=current_user.id, topk=5, key=filename)
                     return render_template('log_food.html',
-                                         image_url=url_for('static', filename=f'uploads/{filename}'),
+                                         image_url=url_for('main.uploaded_file', filename=filename),
                                          predictions=predictions,
-                                         saved_filename=filename)
+                                         nutrition=prediction_nutrition(predictions),
+                                         model_version=version,
+                                         saved_filename=filename,
+                                         similar_meals=similar_meals(current_user.id, filename))
+                except Overloaded:
+                    raise
                 except Exception as e:
                     flash(f"Error processing image: {str(e)}", "danger")
-                    return redirect(url_for('log_food'))
+                    return redirect(url_for('main.log_food'))
+    
+    # Result page of a background classification job
+    job_id = request.args.get('job')
+    if job_id:
+        job = ClassificationJob.query.get(job_id)
+        if job is None or job.user_id != current_user.id or job.status != 'done':
+            flash("Classification result not available", "warning")
+            return redirect(url_for('main.log_food'))
+        predictions = [tuple(p) for p in json.loads(job.predictions)]
+        return render_template('log_food.html',
+                             image_url=url_for('main.uploaded_file', filename=job.image_path),
+                             predictions=predictions,
+                             nutrition=prediction_nutrition(predictions),
+                             model_version=job.model_version,
+                             saved_filename=job.image_path,
+                             similar_meals=similar_meals(current_user.id, job.image_path))
     
     return render_template('log_food.html')
 
-@app.route('/accept_prediction', methods=['POST'])
+@bp.route('/log_meal', methods=['GET', 'POST'])
+@login_required
+def log_meal():
+    """Several photos of one meal: classified together, accepted in one go"""
+    if request.method == 'POST':
+        files = [f for f in request.files.getlist('images') if f and f.filename]
+        wants_json = request.accept_mimetypes.best == 'application/json'
+        error = None
+        if not files:
+            error = "No images uploaded"
+        elif len(files) > current_app.config['MAX_MEAL_IMAGES']:
+            error = f"Upload at most {current_app.config['MAX_MEAL_IMAGES']} images per meal"
+        elif not inference_available():
+            error = model_unavailable_message()
+        if error:
+            if wants_json:
+                return jsonify({'error': error}), 400
+            flash(error, "warning")
+            return redirect(url_for('main.log_meal'))
+
+        timestamp = datetime.now().timestamp()
+        filenames = []
+        images_bytes = []
+        for i, file in enumerate(files):
+            filename = secure_filename(f"{current_user.id}_{timestamp}_{i}_{file.filename}")
+            image_bytes = file.read()
+            store_upload(filename, image_bytes)
+            filenames.append(filename)
+            images_bytes.append(image_bytes)
+
+        try:
+            predictions, version = classify_uploads(images_bytes, user_id=current_user.id, topk=5, keys=filenames)
+        except Overloaded:
+            raise
+        except Exception as e:
+            if wants_json:
+                return jsonify({'error': f"Error processing images: {str(e)}"}), 500
+            flash(f"Error processing images: {str(e)}", "danger")
+            return redirect(url_for('main.log_meal'))
+
+        items = [{
+            'filename': filename,
+            'image_url': url_for('main.uploaded_file', filename=filename),
+            'predictions': preds,
+            'nutrition': prediction_nutrition(preds),
+        } for filename, preds in zip(filenames, predictions)]
+        if wants_json:
+            return jsonify({'model_version': version,
+                            'items': [dict(item, predictions=[{'food_name': name, 'confidence': prob,
+                                                               'nutrition': item['nutrition'].get(name)}
+                                                              for name, prob in item['predictions']])
+                                      for item in items]})
+        return render_template('log_meal.html', items=items, model_version=version)
+
+    return render_template('log_meal.html', max_images=current_app.config['MAX_MEAL_IMAGES'])
+
+@bp.route('/accept_meal', methods=['POST'])
+@login_required
+def accept_meal():
+    count = request.form.get('count', '0').strip()
+    if not count.isdecimal():
+        return "Invalid meal item count", 400
+    count = min(int(count), current_app.config['MAX_MEAL_IMAGES'])
+    logged = []
+    skipped = []
+    for i in range(count):
+        if not request.form.get(f'include_{i}'):
+            continue
+        food_name = request.form.get(f'food_name_{i}', '')
+        nutrition = nutrition_for(food_name)
+        if not nutrition:
+            skipped.append(food_name)
+            continue
+        db.session.add(FoodLog(
+            user_id=current_user.id,
+            food_name=nutrition['name'],
+            calories=nutrition['calories'],
+            protein=nutrition['protein'],
+            carbs=nutrition['carbs'],
+            fats=nutrition['fats'],
+            serving_size=nutrition['serving'],
+            source='ai',
+            image_path=request.form.get(f'image_{i}')
+        ))
+        logged.append(nutrition)
+
+    # All items of the meal are saved in one transaction
+    if logged:
+        db.session.commit()
+        total = sum(n['calories'] for n in logged)
+        flash(f"Logged {len(logged)} items: {round(total)} kcal", "success")
+    if skipped:
+        flash(f"Not found in database: {', '.join(skipped)}. Please use manual entry.", "warning")
+    if not logged and not skipped:
+        flash("No items selected", "warning")
+        return redirect(url_for('main.log_meal'))
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/classify_jobs', methods=['POST'])
+@login_required
+def create_classification_job():
+    file = request.files.get('image')
+    if not file or not file.filename:
+        return jsonify({'error': 'No image uploaded'}), 400
+    if not inference_available():
+        return jsonify({'error': model_unavailable_message()}), 503
+
+    # Turned away here (503 with Retry-After) rather than queued without bound in the executor:
+    # when the model is saturated (the job would wait for inference_admission) or this worker has
+    # CLASSIFICATION_JOB_MAX_PENDING jobs already
+    inference_admission.check()
+    job_admission.acquire()
+    try:
+        filename = secure_filename(f"{current_user.id}_{datetime.now().timestamp()}_{file.filename}")
+        image_bytes = file.read()
+        store_upload(filename, image_bytes)
+
+        # Jobs are only needed until the page has picked up the result
+        cutoff = datetime.utcnow() - timedelta(hours=current_app.config['CLASSIFICATION_JOB_TTL_HOURS'])
+        ClassificationJob.query.filter(ClassificationJob.created_at < cutoff).delete()
+        job = ClassificationJob(id=uuid.uuid4().hex, user_id=current_user.id, image_path=filename)
+        db.session.add(job)
+        db.session.commit()
+
+        job_executor().submit(run_classification_job, current_app._get_current_object(), job.id, image_bytes,
+                              current_user.id)
+    except BaseException:
+        job_admission.release()
+        raise
+    reply = {
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('main.classification_job_status', job_id=job.id),
+        # Clients poll status_url for at most this long
+        'timeout': current_app.config['CLASSIFICATION_JOB_TIMEOUT'],
+    }
+    if current_app.config['JOB_EVENTS_STREAM']:
+        reply['events_url'] = url_for('main.classification_job_events', job_id=job.id)
+    return jsonify(reply), 202
+
+@bp.route('/classify_jobs/<job_id>')
+@login_required
+def classification_job_status(job_id):
+    job = ClassificationJob.query.get_or_404(job_id)
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    expire_stale_job(job)
+    return jsonify(job.to_dict())
+
+@bp.route('/classify_jobs/<job_id>/events')
+@login_required
+def classification_job_events(job_id):
+    """Server-sent events stream that reports status changes until the job finishes"""
+    if not current_app.config['JOB_EVENTS_STREAM']:
+        return jsonify({'error': 'Job events are not available, poll the job status instead'}), 404
+    job = ClassificationJob.query.get_or_404(job_id)
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    def stream():
+        deadline = time.monotonic() + 60
+        last_status = None
+        while True:
+            db.session.refresh(job)
+            expire_stale_job(job)
+            if job.status != last_status:
+                last_status = job.status
+                yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.status in ('done', 'failed') or time.monotonic() > deadline:
+                return
+            time.sleep(0.25)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/uploads/<path:filename>')
+@login_required
+def uploaded_file(filename):
+    # The original may still be in a background writer's queue, possibly another worker's;
+    # only the user's own uploads are waited for, so unknown names 404 straight away
+    own = filename.startswith(f"{current_user.id}_")
+    upload_writer.wait(filename, poll_timeout=current_app.config['UPLOAD_WAIT_TIMEOUT'] if own else 0.0)
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+@bp.route('/accept_prediction', methods=['POST'])
 @login_required
 def accept_prediction():
     food_name = request.form['food_name']
     source = request.form.get('source', 'ai')
     image_path = request.form.get('image')
     
-    nutrition = lookup_nutrition(food_name)
+    nutrition = nutrition_for(food_name)
     if nutrition:
         log = FoodLog(
             user_id=current_user.id,
@@ -736,9 +1427,34 @@ def accept_prediction():
     else:
         flash("Food not found in database. Please use manual entry.", "warning")
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+@bp.route('/relog_meal', methods=['POST'])
+@login_required
+def relog_meal():
+    """One-tap re-log of a past meal: copies its nutrition, no model or database lookup needed"""
+    original = FoodLog.query.get_or_404(int(request.form['log_id']))
+    if original.user_id != current_user.id:
+        flash("Unauthorized", "danger")
+        return redirect(url_for('main.log_food'))
+
+    log = FoodLog(
+        user_id=current_user.id,
+        food_name=original.food_name,
+        calories=original.calories,
+        protein=original.protein,
+        carbs=original.carbs,
+        fats=original.fats,
+        serving_size=original.serving_size,
+        source=original.source,
+        image_path=request.form.get('image') or original.image_path
+    )
+    db.session.add(log)
+    db.session.commit()
+    flash(f"Logged {log.food_name} again: {log.calories} kcal", "success")
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/manual_entry', methods=['POST'])
+@bp.route('/manual_entry', methods=['POST'])
 @login_required
 def manual_entry():
     food_name = request.form['food_name'].strip()
@@ -761,52 +1477,53 @@ def manual_entry():
     db.session.add(log)
     db.session.commit()
     flash(f"Manually logged {food_name}", "success")
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/search_food')
+@bp.route('/search_food')
 @login_required
 def search_food():
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify({'results': []})
     
-    # Search in database
+    # Ranked: exact, prefix, whole-word, then substring and typo matches
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
     results = []
-    query_lower = query.lower()
-    
-    for food_key, nutrition in NUTRITION_DB.items():
-        if query_lower in food_key or food_key in query_lower:
-            results.append({
-                'name': food_key,
-                'calories': nutrition['calories'],
-                'protein': nutrition['protein'],
-                'carbs': nutrition['carbs'],
-                'fats': nutrition['fats'],
-                'serving': nutrition['serving']
-            })
+    for match in food_search_index().search(query, limit=limit):
+        nutrition = NUTRITION_DB[match['name']]
+        results.append({
+            'name': match['name'],
+            'calories': nutrition['calories'],
+            'protein': nutrition['protein'],
+            'carbs': nutrition['carbs'],
+            'fats': nutrition['fats'],
+            'serving': nutrition['serving'],
+            'match': match['match'],
+            'score': match['score']
+        })
     
-    return jsonify({'results': results[:10]})
+    return jsonify({'results': results})
 
-@app.route('/food_history')
+@bp.route('/food_history')
 @login_required
 def food_history():
     logs = FoodLog.query.filter_by(user_id=current_user.id).order_by(FoodLog.date.desc()).all()
     return render_template('food_history.html', logs=logs)
 
-@app.route('/delete_log/<int:log_id>', methods=['POST'])
+@bp.route('/delete_log/<int:log_id>', methods=['POST'])
 @login_required
 def delete_log(log_id):
     log = FoodLog.query.get_or_404(log_id)
     if log.user_id != current_user.id:
         flash("Unauthorized", "danger")
-        return redirect(url_for('food_history'))
+        return redirect(url_for('main.food_history'))
     
     db.session.delete(log)
     db.session.commit()
     flash("Log deleted", "success")
-    return redirect(url_for('food_history'))
+    return redirect(url_for('main.food_history'))
 
-@app.route('/exercise_suggestions', methods=['POST'])
+@bp.route('/exercise_suggestions', methods=['POST'])
 @login_required
 def exercise_suggestions():
     calories = float(request.form.get('calories', 0))
@@ -815,827 +1532,73 @@ def exercise_suggestions():
     suggestions = get_exercise_suggestions(calories, user_weight)
     return jsonify({'calories': calories, 'suggestions': suggestions})
 
-
-if __name__ == '__main__':
-    app.run(debug=True)
-
-# app.py
-import os
-from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user, UserMixin
-from werkzeug.utils import secure_filename
-from PIL import Image
-from models import load_model, predict_food
-
-# CONFIG
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'my-secret-key-for-development'
-# Database URI - supports both SQLite (default) and PostgreSQL (if DATABASE_URL is set)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-
-# Database Models
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    name = db.Column(db.String(150))
-    height_cm = db.Column(db.Float, nullable=True)
-    weight_kg = db.Column(db.Float, nullable=True)
-    age = db.Column(db.Integer, nullable=True)
-    gender = db.Column(db.String(20), nullable=True)
-    conditions = db.Column(db.String(500), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class FoodLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    food_name = db.Column(db.String(200))
-    calories = db.Column(db.Float)
-    protein = db.Column(db.Float, default=0)
-    carbs = db.Column(db.Float, default=0)
-    fats = db.Column(db.Float, default=0)
-    serving_size = db.Column(db.String(100), default="100g")
-    date = db.Column(db.DateTime, default=datetime.utcnow)
-    source = db.Column(db.String(50))
-    image_path = db.Column(db.String(300), nullable=True)
-
-class ExerciseLog(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    exercise_name = db.Column(db.String(200))
-    duration_minutes = db.Column(db.Float)  # Duration in minutes
-    calories_burned = db.Column(db.Float)
-    met_value = db.Column(db.Float)  # Metabolic Equivalent of Task
-    date = db.Column(db.DateTime, default=datetime.utcnow)
-    notes = db.Column(db.String(500), nullable=True)
-
-class ExerciseGoal(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True)
-    daily_calorie_goal = db.Column(db.Float, default=500)  # Daily calorie burn goal
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-# Create tables
-with app.app_context():
-    db.create_all()
-
-# Load model at startup
-try:
-    MODEL_PATH = os.path.join(BASE_DIR, 'food101_model_for_inference (1).pth')
-    model, class_names, device = load_model(MODEL_PATH)
-    print(f"Model loaded successfully with {len(class_names)} classes")
-except Exception as e:
-    model = None
-    class_names = []
-    device = None
-    print(f"Model loading failed: {e}")
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Extended Nutrition Database
-NUTRITION_DB = {
-    # Fruits
-    'apple': {'calories': 52, 'protein': 0.3, 'carbs': 14, 'fats': 0.2, 'serving': '100g'},
-    'banana': {'calories': 89, 'protein': 1.1, 'carbs': 23, 'fats': 0.3, 'serving': '100g'},
-    'orange': {'calories': 47, 'protein': 0.9, 'carbs': 12, 'fats': 0.1, 'serving': '100g'},
-    'mango': {'calories': 60, 'protein': 0.8, 'carbs': 15, 'fats': 0.4, 'serving': '100g'},
-    'grapes': {'calories': 69, 'protein': 0.7, 'carbs': 18, 'fats': 0.2, 'serving': '100g'},
-    'watermelon': {'calories': 30, 'protein': 0.6, 'carbs': 8, 'fats': 0.2, 'serving': '100g'},
-    'strawberry': {'calories': 32, 'protein': 0.7, 'carbs': 8, 'fats': 0.3, 'serving': '100g'},
-    'pineapple': {'calories': 50, 'protein': 0.5, 'carbs': 13, 'fats': 0.1, 'serving': '100g'},
-    'papaya': {'calories': 43, 'protein': 0.5, 'carbs': 11, 'fats': 0.3, 'serving': '100g'},
-    'pomegranate': {'calories': 83, 'protein': 1.7, 'carbs': 19, 'fats': 1.2, 'serving': '100g'},
-    
-    # Vegetables
-    'broccoli': {'calories': 34, 'protein': 2.8, 'carbs': 7, 'fats': 0.4, 'serving': '100g'},
-    'carrot': {'calories': 41, 'protein': 0.9, 'carbs': 10, 'fats': 0.2, 'serving': '100g'},
-    'tomato': {'calories': 18, 'protein': 0.9, 'carbs': 4, 'fats': 0.2, 'serving': '100g'},
-    'spinach': {'calories': 23, 'protein': 2.9, 'carbs': 4, 'fats': 0.4, 'serving': '100g'},
-    'potato': {'calories': 77, 'protein': 2, 'carbs': 17, 'fats': 0.1, 'serving': '100g'},
-    'onion': {'calories': 40, 'protein': 1.1, 'carbs': 9, 'fats': 0.1, 'serving': '100g'},
-    'cucumber': {'calories': 15, 'protein': 0.7, 'carbs': 4, 'fats': 0.1, 'serving': '100g'},
-    'cauliflower': {'calories': 25, 'protein': 1.9, 'carbs': 5, 'fats': 0.3, 'serving': '100g'},
-    'bell pepper': {'calories': 31, 'protein': 1, 'carbs': 6, 'fats': 0.3, 'serving': '100g'},
-    'cabbage': {'calories': 25, 'protein': 1.3, 'carbs': 6, 'fats': 0.1, 'serving': '100g'},
-    
-    # Grains & Staples
-    'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fats': 0.3, 'serving': '100g cooked'},
-    'bread': {'calories': 265, 'protein': 9, 'carbs': 49, 'fats': 3.2, 'serving': '100g'},
-    'pasta': {'calories': 131, 'protein': 5, 'carbs': 25, 'fats': 1.1, 'serving': '100g cooked'},
-    'oats': {'calories': 389, 'protein': 17, 'carbs': 66, 'fats': 7, 'serving': '100g'},
-    'quinoa': {'calories': 120, 'protein': 4.4, 'carbs': 21, 'fats': 1.9, 'serving': '100g cooked'},
-    'wheat flour': {'calories': 364, 'protein': 10, 'carbs': 76, 'fats': 1, 'serving': '100g'},
-    'corn': {'calories': 86, 'protein': 3.3, 'carbs': 19, 'fats': 1.4, 'serving': '100g'},
-    
-    # Proteins - Vegetarian
-    'paneer': {'calories': 265, 'protein': 18, 'carbs': 1.2, 'fats': 20, 'serving': '100g'},
-    'tofu': {'calories': 76, 'protein': 8, 'carbs': 1.9, 'fats': 4.8, 'serving': '100g'},
-    'chickpeas': {'calories': 164, 'protein': 8.9, 'carbs': 27, 'fats': 2.6, 'serving': '100g cooked'},
-    'lentils': {'calories': 116, 'protein': 9, 'carbs': 20, 'fats': 0.4, 'serving': '100g cooked'},
-    'kidney beans': {'calories': 127, 'protein': 8.7, 'carbs': 23, 'fats': 0.5, 'serving': '100g cooked'},
-    'black beans': {'calories': 132, 'protein': 8.9, 'carbs': 24, 'fats': 0.5, 'serving': '100g cooked'},
-    'green peas': {'calories': 81, 'protein': 5, 'carbs': 14, 'fats': 0.4, 'serving': '100g'},
-    'eggs': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fats': 11, 'serving': '100g'},
-    'yogurt': {'calories': 59, 'protein': 10, 'carbs': 3.6, 'fats': 0.4, 'serving': '100g'},
-    'milk': {'calories': 42, 'protein': 3.4, 'carbs': 5, 'fats': 1, 'serving': '100ml'},
-    
-    # Proteins - Non-Vegetarian
-    'chicken breast': {'calories': 165, 'protein': 31, 'carbs': 0, 'fats': 3.6, 'serving': '100g'},
-    'chicken': {'calories': 239, 'protein': 27, 'carbs': 0, 'fats': 14, 'serving': '100g'},
-    'fish': {'calories': 206, 'protein': 22, 'carbs': 0, 'fats': 12, 'serving': '100g'},
-    'salmon': {'calories': 208, 'protein': 20, 'carbs': 0, 'fats': 13, 'serving': '100g'},
-    'tuna': {'calories': 130, 'protein': 28, 'carbs': 0, 'fats': 1, 'serving': '100g'},
-    'shrimp': {'calories': 99, 'protein': 24, 'carbs': 0.2, 'fats': 0.3, 'serving': '100g'},
-    'beef': {'calories': 250, 'protein': 26, 'carbs': 0, 'fats': 15, 'serving': '100g'},
-    'lamb': {'calories': 294, 'protein': 25, 'carbs': 0, 'fats': 21, 'serving': '100g'},
-    'pork': {'calories': 242, 'protein': 27, 'carbs': 0, 'fats': 14, 'serving': '100g'},
-    'turkey': {'calories': 189, 'protein': 29, 'carbs': 0, 'fats': 7, 'serving': '100g'},
-    
-    # Fast Food & Snacks
-    'pizza': {'calories': 266, 'protein': 11, 'carbs': 33, 'fats': 10, 'serving': '100g'},
-    'burger': {'calories': 295, 'protein': 17, 'carbs': 24, 'fats': 14, 'serving': '100g'},
-    'french fries': {'calories': 312, 'protein': 3.4, 'carbs': 41, 'fats': 15, 'serving': '100g'},
-    'sandwich': {'calories': 250, 'protein': 10, 'carbs': 30, 'fats': 10, 'serving': '100g'},
-    'hot dog': {'calories': 290, 'protein': 10, 'carbs': 24, 'fats': 17, 'serving': '100g'},
-    'tacos': {'calories': 217, 'protein': 9, 'carbs': 19, 'fats': 11, 'serving': '100g'},
-    'nachos': {'calories': 312, 'protein': 7, 'carbs': 36, 'fats': 16, 'serving': '100g'},
-    
-    # Indian Foods
-    'roti': {'calories': 297, 'protein': 11, 'carbs': 54, 'fats': 4, 'serving': '100g'},
-    'naan': {'calories': 310, 'protein': 9, 'carbs': 52, 'fats': 7, 'serving': '100g'},
-    'dosa': {'calories': 168, 'protein': 3.9, 'carbs': 28, 'fats': 4, 'serving': '100g'},
-    'idli': {'calories': 156, 'protein': 4.4, 'carbs': 28, 'fats': 2.7, 'serving': '100g'},
-    'biryani': {'calories': 200, 'protein': 8, 'carbs': 30, 'fats': 5, 'serving': '100g'},
-    'dal': {'calories': 104, 'protein': 7, 'carbs': 17, 'fats': 1, 'serving': '100g'},
-    'samosa': {'calories': 262, 'protein': 5, 'carbs': 32, 'fats': 13, 'serving': '100g'},
-    'pakora': {'calories': 240, 'protein': 4, 'carbs': 22, 'fats': 15, 'serving': '100g'},
-    'paratha': {'calories': 320, 'protein': 7, 'carbs': 42, 'fats': 14, 'serving': '100g'},
-    
-    # Nuts & Seeds
-    'almonds': {'calories': 579, 'protein': 21, 'carbs': 22, 'fats': 50, 'serving': '100g'},
-    'cashews': {'calories': 553, 'protein': 18, 'carbs': 30, 'fats': 44, 'serving': '100g'},
-    'peanuts': {'calories': 567, 'protein': 26, 'carbs': 16, 'fats': 49, 'serving': '100g'},
-    'walnuts': {'calories': 654, 'protein': 15, 'carbs': 14, 'fats': 65, 'serving': '100g'},
-    'pumpkin seeds': {'calories': 446, 'protein': 19, 'carbs': 54, 'fats': 19, 'serving': '100g'},
-    'sunflower seeds': {'calories': 584, 'protein': 21, 'carbs': 20, 'fats': 51, 'serving': '100g'},
-    
-    # Dairy & Alternatives
-    'cheese': {'calories': 402, 'protein': 25, 'carbs': 1.3, 'fats': 33, 'serving': '100g'},
-    'butter': {'calories': 717, 'protein': 0.9, 'carbs': 0.1, 'fats': 81, 'serving': '100g'},
-    'cream': {'calories': 345, 'protein': 2.2, 'carbs': 2.7, 'fats': 37, 'serving': '100ml'},
-    'ice cream': {'calories': 207, 'protein': 3.5, 'carbs': 24, 'fats': 11, 'serving': '100g'},
-    
-    # Beverages & Others
-    'coffee': {'calories': 2, 'protein': 0.3, 'carbs': 0, 'fats': 0, 'serving': '100ml'},
-    'tea': {'calories': 1, 'protein': 0, 'carbs': 0.3, 'fats': 0, 'serving': '100ml'},
-    'orange juice': {'calories': 45, 'protein': 0.7, 'carbs': 10, 'fats': 0.2, 'serving': '100ml'},
-    'soda': {'calories': 41, 'protein': 0, 'carbs': 11, 'fats': 0, 'serving': '100ml'},
-    'honey': {'calories': 304, 'protein': 0.3, 'carbs': 82, 'fats': 0, 'serving': '100g'},
-    'sugar': {'calories': 387, 'protein': 0, 'carbs': 100, 'fats': 0, 'serving': '100g'},
-    'olive oil': {'calories': 884, 'protein': 0, 'carbs': 0, 'fats': 100, 'serving': '100ml'},
-    'chocolate': {'calories': 546, 'protein': 5, 'carbs': 61, 'fats': 31, 'serving': '100g'},
-    'cake': {'calories': 257, 'protein': 4.6, 'carbs': 41, 'fats': 9, 'serving': '100g'},
-    'cookies': {'calories': 502, 'protein': 5.6, 'carbs': 64, 'fats': 25, 'serving': '100g'},
-}
-
-EXERCISE_DB = {
-    # Cardio Exercises
-    'walking_slow': {'name': 'Walking (Slow pace, 3 km/h)', 'met': 2.5, 'category': 'Cardio', 'icon': '🚶'},
-    'walking_moderate': {'name': 'Walking (Moderate, 5 km/h)', 'met': 3.5, 'category': 'Cardio', 'icon': '🚶‍♂️'},
-    'walking_brisk': {'name': 'Walking (Brisk, 6.5 km/h)', 'met': 5.0, 'category': 'Cardio', 'icon': '🚶‍♀️'},
-    'jogging': {'name': 'Jogging (8 km/h)', 'met': 8.0, 'category': 'Cardio', 'icon': '🏃'},
-    'running_moderate': {'name': 'Running (10 km/h)', 'met': 10.0, 'category': 'Cardio', 'icon': '🏃‍♂️'},
-    'running_fast': {'name': 'Running (12 km/h)', 'met': 12.5, 'category': 'Cardio', 'icon': '🏃‍♀️'},
-    'sprinting': {'name': 'Sprinting (16+ km/h)', 'met': 16.0, 'category': 'Cardio', 'icon': '💨'},
-    
-    # Cycling
-    'cycling_leisure': {'name': 'Cycling (Leisure, 15 km/h)', 'met': 4.0, 'category': 'Cycling', 'icon': '🚴'},
-    'cycling_moderate': {'name': 'Cycling (Moderate, 20 km/h)', 'met': 6.8, 'category': 'Cycling', 'icon': '🚴‍♂️'},
-    'cycling_vigorous': {'name': 'Cycling (Vigorous, 25+ km/h)', 'met': 10.0, 'category': 'Cycling', 'icon': '🚴‍♀️'},
-    'stationary_bike_light': {'name': 'Stationary Bike (Light)', 'met': 3.5, 'category': 'Cycling', 'icon': '🚴'},
-    'stationary_bike_moderate': {'name': 'Stationary Bike (Moderate)', 'met': 6.8, 'category': 'Cycling', 'icon': '🚴‍♂️'},
-    'stationary_bike_vigorous': {'name': 'Stationary Bike (Vigorous)', 'met': 10.0, 'category': 'Cycling', 'icon': '🚴‍♀️'},
-    
-    # Swimming
-    'swimming_leisure': {'name': 'Swimming (Leisure)', 'met': 6.0, 'category': 'Swimming', 'icon': '🏊'},
-    'swimming_laps_light': {'name': 'Swimming Laps (Light)', 'met': 7.0, 'category': 'Swimming', 'icon': '🏊‍♂️'},
-    'swimming_laps_moderate': {'name': 'Swimming Laps (Moderate)', 'met': 8.0, 'category': 'Swimming', 'icon': '🏊‍♀️'},
-    'swimming_laps_vigorous': {'name': 'Swimming Laps (Vigorous)', 'met': 10.0, 'category': 'Swimming', 'icon': '🏊'},
-    
-    # Strength Training
-    'weight_training_light': {'name': 'Weight Training (Light)', 'met': 3.5, 'category': 'Strength', 'icon': '🏋️'},
-    'weight_training_moderate': {'name': 'Weight Training (Moderate)', 'met': 5.0, 'category': 'Strength', 'icon': '🏋️‍♂️'},
-    'weight_training_vigorous': {'name': 'Weight Training (Vigorous)', 'met': 6.0, 'category': 'Strength', 'icon': '🏋️‍♀️'},
-    'bodyweight_exercises': {'name': 'Bodyweight Exercises', 'met': 5.0, 'category': 'Strength', 'icon': '💪'},
-    'push_ups': {'name': 'Push-ups', 'met': 3.8, 'category': 'Strength', 'icon': '💪'},
-    'pull_ups': {'name': 'Pull-ups', 'met': 8.0, 'category': 'Strength', 'icon': '💪'},
-    
-    # Sports
-    'basketball': {'name': 'Basketball (Game)', 'met': 8.0, 'category': 'Sports', 'icon': '🏀'},
-    'football': {'name': 'Football/Soccer', 'met': 7.0, 'category': 'Sports', 'icon': '⚽'},
-    'tennis_singles': {'name': 'Tennis (Singles)', 'met': 8.0, 'category': 'Sports', 'icon': '🎾'},
-    'tennis_doubles': {'name': 'Tennis (Doubles)', 'met': 6.0, 'category': 'Sports', 'icon': '🎾'},
-    'badminton': {'name': 'Badminton', 'met': 5.5, 'category': 'Sports', 'icon': '🏸'},
-    'volleyball': {'name': 'Volleyball', 'met': 4.0, 'category': 'Sports', 'icon': '🏐'},
-    'cricket': {'name': 'Cricket', 'met': 4.8, 'category': 'Sports', 'icon': '🏏'},
-    
-    # HIIT & Aerobics
-    'hiit': {'name': 'HIIT (High Intensity)', 'met': 12.0, 'category': 'HIIT', 'icon': '🔥'},
-    'aerobics_low': {'name': 'Aerobics (Low Impact)', 'met': 5.0, 'category': 'Aerobics', 'icon': '🤸'},
-    'aerobics_high': {'name': 'Aerobics (High Impact)', 'met': 7.0, 'category': 'Aerobics', 'icon': '🤸‍♂️'},
-    'zumba': {'name': 'Zumba', 'met': 8.8, 'category': 'Aerobics', 'icon': '💃'},
-    'dancing': {'name': 'Dancing (General)', 'met': 4.5, 'category': 'Aerobics', 'icon': '💃'},
-    'jump_rope': {'name': 'Jump Rope', 'met': 12.3, 'category': 'HIIT', 'icon': '🦘'},
-    'burpees': {'name': 'Burpees', 'met': 8.0, 'category': 'HIIT', 'icon': '🔥'},
-    
-    # Flexibility & Mind-Body
-    'yoga_hatha': {'name': 'Yoga (Hatha)', 'met': 2.5, 'category': 'Flexibility', 'icon': '🧘'},
-    'yoga_vinyasa': {'name': 'Yoga (Vinyasa)', 'met': 4.0, 'category': 'Flexibility', 'icon': '🧘‍♀️'},
-    'yoga_power': {'name': 'Yoga (Power)', 'met': 4.0, 'category': 'Flexibility', 'icon': '🧘‍♂️'},
-    'pilates': {'name': 'Pilates', 'met': 3.0, 'category': 'Flexibility', 'icon': '🧘'},
-    'stretching': {'name': 'Stretching', 'met': 2.3, 'category': 'Flexibility', 'icon': '🤸'},
-    
-    # Other Activities
-    'stairs_climbing': {'name': 'Stair Climbing', 'met': 8.8, 'category': 'Cardio', 'icon': '🪜'},
-    'elliptical': {'name': 'Elliptical Machine', 'met': 5.0, 'category': 'Cardio', 'icon': '🏃'},
-    'rowing': {'name': 'Rowing Machine', 'met': 7.0, 'category': 'Cardio', 'icon': '🚣'},
-    'hiking': {'name': 'Hiking', 'met': 6.0, 'category': 'Outdoor', 'icon': '🥾'},
-    'rock_climbing': {'name': 'Rock Climbing', 'met': 8.0, 'category': 'Outdoor', 'icon': '🧗'},
-    'skating': {'name': 'Skating/Rollerblading', 'met': 7.0, 'category': 'Outdoor', 'icon': '⛸️'},
-    'martial_arts': {'name': 'Martial Arts', 'met': 10.0, 'category': 'Sports', 'icon': '🥋'},
-    'boxing': {'name': 'Boxing', 'met': 9.0, 'category': 'Sports', 'icon': '🥊'},
-}
-
-
-def calculate_calories_burned(exercise_key, duration_minutes, user_weight=70):
-    """
-    Calculate calories burned for an exercise
-    Formula: Calories = MET × weight(kg) × time(hours)
-    """
-    if exercise_key not in EXERCISE_DB:
-        return 0
-    
-    met = EXERCISE_DB[exercise_key]['met']
-    hours = duration_minutes / 60.0
-    calories = met * user_weight * hours
-    
-    return round(calories, 1)
-
-
-def get_daily_exercise_stats(user_id):
-    """Get today's exercise statistics"""
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_exercises = ExerciseLog.query.filter(
-        ExerciseLog.user_id == user_id,
-        ExerciseLog.date >= today_start
-    ).all()
-    
-    total_calories = sum(ex.calories_burned or 0 for ex in today_exercises)
-    total_duration = sum(ex.duration_minutes or 0 for ex in today_exercises)
-    
-    return {
-        'total_calories': round(total_calories),
-        'total_duration': round(total_duration),
-        'exercise_count': len(today_exercises),
-        'exercises': today_exercises
-    }
-
-
-# NEW ROUTES - Add these after the existing routes
-
-@app.route('/exercise')
-@login_required
-def exercise():
-    """Exercise tracking main page"""
-    # Get or create exercise goal
-    goal = ExerciseGoal.query.filter_by(user_id=current_user.id).first()
-    if not goal:
-        goal = ExerciseGoal(user_id=current_user.id, daily_calorie_goal=500)
-        db.session.add(goal)
-        db.session.commit()
-    
-    # Get today's stats
-    stats = get_daily_exercise_stats(current_user.id)
-    
-    # Calculate progress
-    progress_percentage = 0
-    if goal.daily_calorie_goal > 0:
-        progress_percentage = min(100, round((stats['total_calories'] / goal.daily_calorie_goal) * 100, 1))
-    
-    remaining_calories = max(0, goal.daily_calorie_goal - stats['total_calories'])
-    
-    # Group exercises by category
-    exercises_by_category = {}
-    for key, ex in EXERCISE_DB.items():
-        category = ex['category']
-        if category not in exercises_by_category:
-            exercises_by_category[category] = []
-        exercises_by_category[category].append({
-            'key': key,
-            'name': ex['name'],
-            'met': ex['met'],
-            'icon': ex['icon']
-        })
-    
-    return render_template('exercise.html',
-                         goal=goal,
-                         stats=stats,
-                         progress_percentage=progress_percentage,
-                         remaining_calories=remaining_calories,
-                         exercises_by_category=exercises_by_category)
-
-
-@app.route('/log_exercise', methods=['POST'])
+@bp.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving, whatever the model is doing"""
+    state = model_registry.state if model_registry is not None else 'remote'
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'model': state})
+
+@bp.route('/readyz')
+def readyz():
+    """Readiness: 200 once this worker can classify images, 503 (with the reason) until then"""
+    if inference_client is not None:
+        try:
+            info = inference_client.ping()
+        except Exception as e:
+            return jsonify({'status': 'unreachable', 'error': str(e)}), 503
+        return jsonify({'status': 'ready', 'model_version': info.get('version')})
+
+    entry = active_model()
+    if entry is not None:
+        return jsonify({'status': 'ready', 'model_version': entry.version,
+                        'loaded_at': entry.info()['loaded_at']})
+    # A failed load is retried by the registry's poller; with polling disabled only a restart helps
+    retrying = model_registry.state != 'failed' or model_registry.retrying()
+    response = jsonify({'status': model_registry.state, 'error': model_registry.error,
+                        'restart_required': not retrying})
+    response.status_code = 503
+    if retrying:
+        response.headers['Retry-After'] = '5'
+    return response
+
+@bp.route('/inference_stats')
 @login_required
-def log_exercise():
-    """Log a new exercise"""
-    exercise_key = request.form.get('exercise_key')
-    duration = float(request.form.get('duration', 0))
-    notes = request.form.get('notes', '').strip()
-    
-    if not exercise_key or duration <= 0:
-        flash("Please select an exercise and enter valid duration", "danger")
-        return redirect(url_for('exercise'))
-    
-    if exercise_key not in EXERCISE_DB:
-        flash("Invalid exercise selected", "danger")
-        return redirect(url_for('exercise'))
-    
-    # Calculate calories burned
-    user_weight = current_user.weight_kg or 70
-    calories_burned = calculate_calories_burned(exercise_key, duration, user_weight)
-    
-    exercise_data = EXERCISE_DB[exercise_key]
-    
-    # Create log entry
-    log = ExerciseLog(
-        user_id=current_user.id,
-        exercise_name=exercise_data['name'],
-        duration_minutes=duration,
-        calories_burned=calories_burned,
-        met_value=exercise_data['met'],
-        notes=notes
-    )
-    
-    db.session.add(log)
-    db.session.commit()
-    
-    flash(f"Logged {exercise_data['name']}: {duration} min, {calories_burned} kcal burned! 🔥", "success")
-    return redirect(url_for('exercise'))
-
-
-@app.route('/update_exercise_goal', methods=['POST'])
-@login_required
-def update_exercise_goal():
-    """Update daily exercise goal"""
-    new_goal = float(request.form.get('daily_goal', 500))
-    
-    goal = ExerciseGoal.query.filter_by(user_id=current_user.id).first()
-    if not goal:
-        goal = ExerciseGoal(user_id=current_user.id)
-        db.session.add(goal)
-    
-    goal.daily_calorie_goal = new_goal
-    goal.updated_at = datetime.utcnow()
-    db.session.commit()
-    
-    flash(f"Exercise goal updated to {new_goal} kcal/day", "success")
-    return redirect(url_for('exercise'))
-
-
-@app.route('/exercise_history')
-@login_required
-def exercise_history():
-    """View exercise history"""
-    # Get all exercise logs
-    logs = ExerciseLog.query.filter_by(user_id=current_user.id).order_by(ExerciseLog.date.desc()).all()
-    
-    # Calculate statistics
-    total_calories = sum(log.calories_burned for log in logs)
-    total_duration = sum(log.duration_minutes for log in logs)
-    total_workouts = len(logs)
-    
-    # Get last 7 days stats
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    week_logs = [log for log in logs if log.date >= week_ago]
-    week_calories = sum(log.calories_burned for log in week_logs)
-    week_duration = sum(log.duration_minutes for log in week_logs)
-    
-    # Daily average
-    avg_daily_calories = round(week_calories / 7, 1) if week_logs else 0
-    avg_daily_duration = round(week_duration / 7, 1) if week_logs else 0
-    
-    return render_template('exercise_history.html',
-                         logs=logs,
-                         total_calories=round(total_calories),
-                         total_duration=round(total_duration),
-                         total_workouts=total_workouts,
-                         week_calories=round(week_calories),
-                         week_duration=round(week_duration),
-                         avg_daily_calories=avg_daily_calories,
-                         avg_daily_duration=avg_daily_duration)
-
-
-@app.route('/delete_exercise/<int:log_id>', methods=['POST'])
-@login_required
-def delete_exercise(log_id):
-    """Delete an exercise log"""
-    log = ExerciseLog.query.get_or_404(log_id)
-    
-    if log.user_id != current_user.id:
-        flash("Unauthorized", "danger")
-        return redirect(url_for('exercise_history'))
-    
-    db.session.delete(log)
-    db.session.commit()
-    flash("Exercise log deleted", "success")
-    return redirect(url_for('exercise_history'))
-
-def lookup_nutrition(food_name):
-    """Search for food in database with fuzzy matching"""
-    key = food_name.lower().strip()
-    
-    # Exact match
-    if key in NUTRITION_DB:
-        return {'name': key, **NUTRITION_DB[key]}
-    
-    # Partial match
-    for db_key in NUTRITION_DB:
-        if db_key in key or key in db_key:
-            return {'name': db_key, **NUTRITION_DB[db_key]}
-    
-    return None
-
-def get_exercise_suggestions(calories, user_weight=70):
-    """Calculate exercise suggestions based on calories and user weight"""
-    # MET values (Metabolic Equivalent of Task)
-    # Calories burned = MET × weight(kg) × time(hours)
-    exercises = [
-        {"name": "Walking (5 km/h)", "met": 3.5, "icon": "🚶"},
-        {"name": "Jogging (8 km/h)", "met": 8.0, "icon": "🏃"},
-        {"name": "Running (12 km/h)", "met": 12.0, "icon": "🏃‍♂️"},
-        {"name": "Cycling (moderate)", "met": 6.8, "icon": "🚴"},
-        {"name": "Swimming", "met": 8.0, "icon": "🏊"},
-        {"name": "Jump Rope", "met": 12.3, "icon": "🦘"},
-        {"name": "Yoga", "met": 3.0, "icon": "🧘"},
-        {"name": "Weight Training", "met": 6.0, "icon": "🏋️"},
-        {"name": "Dancing", "met": 4.5, "icon": "💃"},
-        {"name": "Stairs Climbing", "met": 8.8, "icon": "🪜"},
-    ]
-    
-    suggestions = []
-    for ex in exercises:
-        # Calories per minute = MET × weight(kg) × 0.0175
-        cal_per_min = ex['met'] * user_weight * 0.0175
-        minutes = max(1, int(round(calories / cal_per_min)))
-        suggestions.append({
-            'exercise': ex['name'],
-            'minutes': minutes,
-            'icon': ex['icon'],
-            'calories_per_min': round(cal_per_min, 1)
-        })
-    
-    return suggestions
-
-def calculate_bmr(user):
-    """
-    Calculate Basal Metabolic Rate using Mifflin-St Jeor Equation
-    BMR (men) = 10 × weight(kg) + 6.25 × height(cm) − 5 × age(years) + 5
-    BMR (women) = 10 × weight(kg) + 6.25 × height(cm) − 5 × age(years) − 161
-    
-    Returns daily calorie needs based on activity level (moderate activity multiplier = 1.55)
-    """
-    if not all([user.weight_kg, user.height_cm, user.age, user.gender]):
-        return None
-    
-    # Calculate BMR
-    bmr = 10 * user.weight_kg + 6.25 * user.height_cm - 5 * user.age
-    
-    if user.gender.lower() == 'male':
-        bmr += 5
-    elif user.gender.lower() == 'female':
-        bmr -= 161
-    else:
-        # For 'other' or unspecified, use average
-        bmr -= 78
-    
-    # Apply activity multiplier (moderate activity)
-    # Sedentary: 1.2, Light: 1.375, Moderate: 1.55, Active: 1.725, Very Active: 1.9
-    daily_calories = bmr * 1.55
-    
-    return round(daily_calories)
-
-
-def get_daily_calorie_intake(user_id):
-    """Get total calories consumed today"""
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_logs = FoodLog.query.filter(
-        FoodLog.user_id == user_id,
-        FoodLog.date >= today_start
-    ).all()
-    
-    total_calories = sum(log.calories or 0 for log in today_logs)
-    return round(total_calories), today_logs
-
-
-# Update the /dashboard route (replace the existing one around line 195)
-
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    # Get logs for last 7 days
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_logs = FoodLog.query.filter(
-        FoodLog.user_id == current_user.id,
-        FoodLog.date >= week_ago
-    ).order_by(FoodLog.date.desc()).all()
-    
-    # Calculate totals
-    total_calories = sum(log.calories or 0 for log in recent_logs)
-    total_protein = sum(log.protein or 0 for log in recent_logs)
-    total_carbs = sum(log.carbs or 0 for log in recent_logs)
-    total_fats = sum(log.fats or 0 for log in recent_logs)
-    
-    # Daily averages
-    days_count = 7
-    avg_calories = round(total_calories / days_count, 1)
-    avg_protein = round(total_protein / days_count, 1)
-    avg_carbs = round(total_carbs / days_count, 1)
-    avg_fats = round(total_fats / days_count, 1)
-    
-    # BMI calculation
-    bmi = None
-    bmi_category = ""
-    if current_user.height_cm and current_user.weight_kg:
-        height_m = current_user.height_cm / 100.0
-        if height_m > 0:
-            bmi = round(current_user.weight_kg / (height_m * height_m), 1)
-            if bmi < 18.5:
-                bmi_category = "Underweight"
-            elif bmi < 25:
-                bmi_category = "Normal"
-            elif bmi < 30:
-                bmi_category = "Overweight"
-            else:
-                bmi_category = "Obese"
-    
-    # BMR and daily calorie tracking
-    recommended_calories = calculate_bmr(current_user)
-    consumed_today, today_logs = get_daily_calorie_intake(current_user.id)
-    
-    # Calculate percentage and remaining calories
-    calorie_percentage = 0
-    remaining_calories = 0
-    if recommended_calories:
-        calorie_percentage = round((consumed_today / recommended_calories) * 100, 1)
-        remaining_calories = recommended_calories - consumed_today
-    
-    # NEW: Get today's exercise stats
-    exercise_stats = get_daily_exercise_stats(current_user.id)
-    
-    # Get exercise goal
-    exercise_goal = ExerciseGoal.query.filter_by(user_id=current_user.id).first()
-    exercise_goal_value = exercise_goal.daily_calorie_goal if exercise_goal else 500
-    
-    # Calculate net calories (consumed - burned)
-    net_calories = consumed_today - exercise_stats['total_calories']
-    
-    return render_template('dashboard.html',
-                         recent_logs=recent_logs[:10],
-                         total_calories=total_calories,
-                         avg_calories=avg_calories,
-                         avg_protein=avg_protein,
-                         avg_carbs=avg_carbs,
-                         avg_fats=avg_fats,
-                         bmi=bmi,
-                         bmi_category=bmi_category,
-                         recommended_calories=recommended_calories,
-                         consumed_today=consumed_today,
-                         remaining_calories=remaining_calories,
-                         calorie_percentage=calorie_percentage,
-                         today_logs=today_logs,
-                         # NEW: Exercise data
-                         exercise_stats=exercise_stats,
-                         exercise_goal=exercise_goal_value,
-                         net_calories=net_calories)
-
-# Routes
-@app.route('/')
-def index():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return render_template('index.html')
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        email = request.form['email'].strip().lower()
-        name = request.form.get('name', '').strip()
-        password = request.form['password']
-        
-        if User.query.filter_by(email=email).first():
-            flash("Email already registered", "danger")
-            return redirect(url_for('register'))
-        
-        user = User(email=email, name=name, password_hash=generate_password_hash(password))
-        db.session.add(user)
-        db.session.commit()
-        flash("Account created successfully! Please login.", "success")
-        return redirect(url_for('login'))
-    
-    return render_template('register.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        email = request.form['email'].strip().lower()
-        password = request.form['password']
-        user = User.query.filter_by(email=email).first()
-        
-        if not user or not check_password_hash(user.password_hash, password):
-            flash("Invalid email or password", "danger")
-            return redirect(url_for('login'))
-        
-        login_user(user)
-        return redirect(url_for('dashboard'))
-    
-    return render_template('login.html')
-
-@app.route('/logout')
-@login_required
-def logout():
-    logout_user()
-    flash("You have been logged out", "info")
-    return redirect(url_for('index'))
-
-@app.route('/profile', methods=['GET', 'POST'])
-@login_required
-def profile():
-    if request.method == 'POST':
-        current_user.name = request.form.get('name', '').strip()
-        current_user.height_cm = float(request.form.get('height_cm') or 0)
-        current_user.weight_kg = float(request.form.get('weight_kg') or 0)
-        current_user.age = int(request.form.get('age') or 0)
-        current_user.gender = request.form.get('gender', '')
-        current_user.conditions = request.form.get('conditions', '')
-        db.session.commit()
-        flash("Profile updated successfully!", "success")
-        return redirect(url_for('profile'))
-    
-    return render_template('profile.html')
-
-@app.route('/log_food', methods=['GET', 'POST'])
-@login_required
-def log_food():
-    if request.method == 'POST':
-        # Handle image upload
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename:
-                filename = secure_filename(f"{current_user.id}_{datetime.now().timestamp()}_{file.filename}")
-                save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(save_path)
-                
-                try:
-                    img = Image.open(save_path).convert('RGB')
-                    if model is None:
-                        flash("AI model not available", "warning")
-                        return redirect(url_for('log_food'))
-                    
-                    predictions = predict_food(model, img, class_names, device, topk=5)
-                    return render_template('log_food.html',
-                                         image_url=url_for('static', filename=f'uploads/{filename}'),
-                                         predictions=predictions,
-                                         saved_filename=filename)
-                except Exception as e:
-                    flash(f"Error processing image: {str(e)}", "danger")
-                    return redirect(url_for('log_food'))
-    
-    return render_template('log_food.html')
-
-@app.route('/accept_prediction', methods=['POST'])
-@login_required
-def accept_prediction():
-    food_name = request.form['food_name']
-    source = request.form.get('source', 'ai')
-    image_path = request.form.get('image')
-    
-    nutrition = lookup_nutrition(food_name)
-    if nutrition:
-        log = FoodLog(
-            user_id=current_user.id,
-            food_name=nutrition['name'],
-            calories=nutrition['calories'],
-            protein=nutrition['protein'],
-            carbs=nutrition['carbs'],
-            fats=nutrition['fats'],
-            serving_size=nutrition['serving'],
-            source=source,
-            image_path=image_path
-        )
-        db.session.add(log)
-        db.session.commit()
-        flash(f"Logged {nutrition['name']}: {nutrition['calories']} kcal", "success")
-    else:
-        flash("Food not found in database. Please use manual entry.", "warning")
-    
-    return redirect(url_for('dashboard'))
-
-@app.route('/manual_entry', methods=['POST'])
-@login_required
-def manual_entry():
-    food_name = request.form['food_name'].strip()
-    calories = float(request.form.get('calories', 0))
-    protein = float(request.form.get('protein', 0))
-    carbs = float(request.form.get('carbs', 0))
-    fats = float(request.form.get('fats', 0))
-    serving_size = request.form.get('serving_size', '100g')
-    
-    log = FoodLog(
-        user_id=current_user.id,
-        food_name=food_name,
-        calories=calories,
-        protein=protein,
-        carbs=carbs,
-        fats=fats,
-        serving_size=serving_size,
-        source='manual'
-    )
-    db.session.add(log)
-    db.session.commit()
-    flash(f"Manually logged {food_name}", "success")
-    return redirect(url_for('dashboard'))
-
-@app.route('/search_food')
-@login_required
-def search_food():
-    query = request.args.get('q', '').strip()
-    if not query:
-        return jsonify({'results': []})
-    
-    # Search in database
-    results = []
-    query_lower = query.lower()
-    
-    for food_key, nutrition in NUTRITION_DB.items():
-        if query_lower in food_key or food_key in query_lower:
-            results.append({
-                'name': food_key,
-                'calories': nutrition['calories'],
-                'protein': nutrition['protein'],
-                'carbs': nutrition['carbs'],
-                'fats': nutrition['fats'],
-                'serving': nutrition['serving']
-            })
-    
-    return jsonify({'results': results[:10]})
-
-@app.route('/food_history')
-@login_required
-def food_history():
-    logs = FoodLog.query.filter_by(user_id=current_user.id).order_by(FoodLog.date.desc()).all()
-    return render_template('food_history.html', logs=logs)
-
-@app.route('/delete_log/<int:log_id>', methods=['POST'])
-@login_required
-def delete_log(log_id):
-    log = FoodLog.query.get_or_404(log_id)
-    if log.user_id != current_user.id:
-        flash("Unauthorized", "danger")
-        return redirect(url_for('food_history'))
-    
-    db.session.delete(log)
-    db.session.commit()
-    flash("Log deleted", "success")
-    return redirect(url_for('food_history'))
-
-@app.route('/exercise_suggestions', methods=['POST'])
-@login_required
-def exercise_suggestions():
-    calories = float(request.form.get('calories', 0))
-    user_weight = current_user.weight_kg or 70
-    
-    suggestions = get_exercise_suggestions(calories, user_weight)
-    return jsonify({'calories': calories, 'suggestions': suggestions})
+def inference_stats():
+    stats = {
+        'model_version': current_model_version(),
+        'prediction_cache': prediction_cache.stats(),
+        'near_duplicates': near_duplicates.stats(),
+    }
+    if meal_index is not None:
+        stats['similar_meals'] = meal_index.stats()
+    stats['uploads'] = dict(upload_stats)
+    for kind in ('presized', 'full_size'):
+        if upload_stats[kind]:
+            stats['uploads'][kind + '_avg_kb'] = round(upload_stats[kind + '_bytes'] / upload_stats[kind] / 1024, 1)
+    stats['admission'] = {'inference': inference_admission.stats(), 'web': web_admission.stats(),
+                          'jobs': job_admission.stats()}
+    if inference_profile is not None:
+        stats['inference_profile'] = inference_profile
+    entry = active_model()
+    if model_registry is not None:
+        stats['models'] = model_registry.stats()
+    if entry is not None and entry.engine is not None:
+        stats['batching'] = entry.engine.stats()
+    if entry is not None:
+        from models import CascadeClassifier
+        if isinstance(entry.model, CascadeClassifier):
+            stats['cascade'] = entry.model.stats()
+    labels = current_label_map()
+    if labels is not None:
+        stats['label_nutrition'] = labels.report()
+    stats['startup'] = startup.report()
+    # USS is this worker's own memory; the rest of RSS is shared with the master and the other workers
+    stats['memory'] = dict(memory_usage(), pid=os.getpid(), gc_frozen_objects=gc.get_freeze_count())
+    if model_registry is not None and model_registry.ready_at is not None:
+        stats['startup']['model_ready_s'] = round(model_registry.ready_at - (startup.process_started or startup.created), 3)
+    return jsonify(stats)
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
 
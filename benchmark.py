@@ -0,0 +1,452 @@
+"""
+Inference latency and throughput benchmark for models.py.
+
+Each measured iteration classifies one batch the way the app does, timing
+every stage separately:
+    decode      preprocessing.decode_image on the encoded upload bytes
+    preprocess  models.preprocess_image for each image, concatenated
+    forward     models.forward_logits (the model itself)
+    postprocess models.top_predictions (softmax, top-k, class names)
+for every combination of batch size and torch thread count. Results hold
+p50/p95/p99 latency per stage and end to end, images/sec and the peak RSS
+reached during that combination.
+
+Without the checkpoint a randomly initialised FoodClassifier is used, which
+costs the same per image as the trained one. Without --images a synthetic
+photo-sized JPEG is used.
+
+``boot`` measures worker startup instead: it starts fresh interpreters that
+import app.py, call create_app() and request /healthz, then poll /readyz
+until the model is loaded, and reports p50/p95 of the time from process
+start to each of those points.
+
+Usage:
+    python benchmark.py run --output bench.json
+    python benchmark.py run --batch-sizes 1,8 --threads 1,4 --images static/uploads --baseline bench.json
+    python benchmark.py compare bench.json new.json
+    python benchmark.py boot --runs 5 --output boot.json --baseline boot-baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from memory_stats import memory_usage, peak_rss_mb, reset_peak_rss
+from models import FoodClassifier, forward_logits, load_model, preprocess_image, top_predictions
+from preprocessing import decode_image
+
+STAGES = ('decode', 'preprocess', 'forward', 'postprocess')
+DEFAULT_CHECKPOINT = 'food101_model_for_inference (1).pth'
+# Latency metrics compared against a baseline; higher is worse for all of them
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+BOOT_PHASES = ('import', 'create_app', 'first_response', 'ready')
+# Runs in each fresh process of `boot`; prints wall-clock timestamps as JSON
+BOOT_SCRIPT = '''
+import json, sys, time
+stamps = {}
+import app
+stamps['import'] = time.time()
+flask_app = app.create_app()
+stamps['create_app'] = time.time()
+client = flask_app.test_client()
+client.get('/healthz')
+stamps['first_response'] = time.time()
+deadline = time.time() + float(sys.argv[1])
+while client.get('/readyz').status_code != 200 and time.time() < deadline:
+    time.sleep(0.05)
+stamps['ready'] = time.time() if time.time() < deadline else None
+print('BOOT ' + json.dumps({'stamps': stamps, 'startup': app.startup.report()}))
+'''
+
+
+def synthetic_jpeg(width=1600, height=1200, seed=0):
+    """A JPEG with smooth gradients and noise, so decode cost resembles a real photo"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def load_images(images_dir=None, limit=64):
+    """Encoded image bytes to benchmark with: files from ``images_dir`` or one synthetic JPEG"""
+    if images_dir:
+        from quantization import list_images
+        paths = list_images(images_dir, limit=limit)
+        if not paths:
+            raise SystemExit(f"No images found in {images_dir}")
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                images.append(f.read())
+        return images
+    return [synthetic_jpeg()]
+
+
+def load_benchmark_model(checkpoint_path, num_classes=101):
+    """
+    The model to benchmark: the checkpoint if it exists, else a randomly
+    initialised FoodClassifier (seeded, so every run builds the same one)
+
+    Returns:
+        (model, class_names, description)
+    """
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        model, class_names, _ = load_model(checkpoint_path, device=torch.device('cpu'))
+        return model, class_names, checkpoint_path
+    torch.manual_seed(0)
+    model = FoodClassifier(num_classes=num_classes).eval()
+    class_names = [f'class_{i}' for i in range(num_classes)]
+    return model, class_names, f'random FoodClassifier ({num_classes} classes)'
+
+
+def summarize(timings_ms):
+    """Percentiles and mean of a list of millisecond timings"""
+    timings = np.asarray(timings_ms)
+    return {
+        'mean_ms': round(float(timings.mean()), 3),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'p99_ms': round(float(np.percentile(timings, 99)), 3),
+    }
+
+
+def run_iteration(model, class_names, encoded, device, topk=5):
+    """Classify one batch of encoded images; returns the seconds spent in each stage"""
+    timings = {}
+    began = time.perf_counter()
+    images = [decode_image(data) for data in encoded]
+    timings['decode'] = time.perf_counter() - began
+
+    began = time.perf_counter()
+    batch = torch.cat([preprocess_image(image) for image in images])
+    timings['preprocess'] = time.perf_counter() - began
+
+    began = time.perf_counter()
+    outputs = forward_logits(model, batch, device)
+    timings['forward'] = time.perf_counter() - began
+
+    began = time.perf_counter()
+    top_predictions(outputs, class_names, topk=topk)
+    timings['postprocess'] = time.perf_counter() - began
+    return timings
+
+
+def benchmark_config(model, class_names, images, batch_size, threads, runs=30, warmup=3):
+    """
+    Measure one batch size / thread count combination
+
+    Returns:
+        Dict with per-stage and end-to-end latency summaries, images/sec and peak RSS
+    """
+    torch.set_num_threads(threads)
+    device = torch.device('cpu')
+    # Cycle through the images so a directory of real uploads is spread over the batches
+    batches = [[images[(i * batch_size + j) % len(images)] for j in range(batch_size)]
+               for i in range(runs + warmup)]
+
+    for encoded in batches[:warmup]:
+        run_iteration(model, class_names, encoded, device)
+
+    reset_peak_rss()
+    stage_ms = {stage: [] for stage in STAGES}
+    total_ms = []
+    for encoded in batches[warmup:]:
+        timings = run_iteration(model, class_names, encoded, device)
+        for stage in STAGES:
+            stage_ms[stage].append(timings[stage] * 1000)
+        total_ms.append(sum(timings.values()) * 1000)
+
+    total = summarize(total_ms)
+    return {
+        'batch_size': batch_size,
+        'threads': threads,
+        'runs': runs,
+        'stages': {stage: summarize(stage_ms[stage]) for stage in STAGES},
+        'total': total,
+        'images_per_sec': round(batch_size * 1000 / total['mean_ms'], 2),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_suite(checkpoint_path=DEFAULT_CHECKPOINT, batch_sizes=(1, 4, 8), thread_counts=None,
+              runs=30, warmup=3, images_dir=None, profile_path=None):
+    """
+    Benchmark every batch size x thread count combination
+
+    Returns:
+        Dict with 'meta' (host, versions, model) and 'results' (one entry per combination)
+    """
+    if thread_counts is None:
+        cores = os.cpu_count() or 1
+        thread_counts = sorted({1, max(1, cores // 2), cores})
+
+    model, class_names, model_description = load_benchmark_model(checkpoint_path)
+    profile = None
+    if profile_path:
+        from inference_profile import apply_profile, load_profile
+        profile = load_profile(profile_path)
+        model = apply_profile(profile, model)
+    images = load_images(images_dir)
+    memory_after_load = memory_usage()
+
+    results = []
+    for threads in thread_counts:
+        for batch_size in batch_sizes:
+            result = benchmark_config(model, class_names, images, batch_size, threads, runs=runs, warmup=warmup)
+            results.append(result)
+            stages = ', '.join(f"{stage} {result['stages'][stage]['p50_ms']:.1f}" for stage in STAGES)
+            print(f"batch {batch_size:>3} x {threads:>2} threads: p50 {result['total']['p50_ms']:.1f} ms, "
+                  f"p95 {result['total']['p95_ms']:.1f} ms, p99 {result['total']['p99_ms']:.1f} ms, "
+                  f"{result['images_per_sec']:.1f} images/sec, peak RSS {result['peak_rss_mb']} MB "
+                  f"(p50 ms: {stages})")
+
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'model': model_description,
+            'random_weights': not (checkpoint_path and os.path.exists(checkpoint_path)),
+            'images': images_dir or 'synthetic 1600x1200 JPEG',
+            'profile': {key: value for key, value in profile.items() if key != 'threads'} if profile else None,
+            'cpu_count': os.cpu_count(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'numpy': np.__version__,
+            'rss_after_load_mb': memory_after_load['rss_mb'],
+        },
+        'results': results,
+    }
+
+
+def boot_once(timeout=120, env=None):
+    """
+    Boot the app in a fresh interpreter
+
+    Returns:
+        (seconds from spawning the process to each of BOOT_PHASES, the app's startup profile)
+    """
+    began = time.time()
+    result = subprocess.run([sys.executable, '-c', BOOT_SCRIPT, str(timeout)], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env, timeout=timeout + 60)
+    line = next((line for line in result.stdout.splitlines() if line.startswith('BOOT ')), None)
+    if line is None:
+        raise SystemExit(f"Boot failed (exit {result.returncode}):\n{result.stderr[-2000:]}")
+    report = json.loads(line[len('BOOT '):])
+    seconds = {phase: round(stamp - began, 3) if stamp else None for phase, stamp in report['stamps'].items()}
+    return seconds, report['startup']
+
+
+def run_boot(runs=5, timeout=120, inference_backend=None):
+    """
+    Time ``runs`` cold boots of the app
+
+    Returns:
+        Dict with 'meta' and 'phases' (p50/p95 ms of each of BOOT_PHASES)
+    """
+    env = dict(os.environ)
+    if inference_backend:
+        env['INFERENCE_BACKEND'] = inference_backend
+    timings = {phase: [] for phase in BOOT_PHASES}
+    profile_ms = {}
+    for i in range(runs):
+        seconds, startup = boot_once(timeout, env=env)
+        for phase in BOOT_PHASES:
+            if seconds.get(phase) is None:
+                raise SystemExit(f"The model was not ready within {timeout} s")
+            timings[phase].append(seconds[phase] * 1000)
+        for entry in startup['phases']:
+            profile_ms.setdefault(entry['phase'], []).append(entry['ms'])
+        print(f"boot {i + 1}/{runs}: " + ', '.join(f"{phase} {seconds[phase]:.2f} s" for phase in BOOT_PHASES))
+
+    phases = {}
+    for phase in BOOT_PHASES:
+        summary = summarize(timings[phase])
+        phases[phase] = {'p50_ms': summary['p50_ms'], 'p95_ms': summary['p95_ms']}
+    return {
+        'meta': {
+            'kind': 'boot',
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'runs': runs,
+            'inference_backend': env.get('INFERENCE_BACKEND', 'local'),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+        },
+        'phases': phases,
+        # What the app itself recorded, for diagnosing where a regression came from
+        'startup_profile_p50_ms': {name: round(float(np.percentile(ms, 50)), 1) for name, ms in profile_ms.items()},
+    }
+
+
+def compare_boot(baseline, current, tolerance=0.10):
+    """
+    Compare two boot reports phase by phase
+
+    Returns:
+        (rows, regressions) as in compare(), with the phase name in place of the config
+    """
+    for key in ('cpu_count', 'torch', 'inference_backend'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"Warning: {key} differs from the baseline "
+                  f"({baseline['meta'].get(key)!r} vs {current['meta'].get(key)!r})")
+    rows, regressions = [], []
+    for phase, result in current['phases'].items():
+        base = baseline['phases'].get(phase)
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            old, new = base[metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            row = (phase, metric, old, new, change)
+            rows.append(row)
+            if change > tolerance:
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_boot_comparison(rows, regressions):
+    regressed = set(id(row) for row in regressions)
+    for row in rows:
+        phase, metric, old, new, change = row
+        marker = '  REGRESSION' if id(row) in regressed else ''
+        print(f"{phase:<15} {metric:<7} {old:>10.1f} -> {new:>10.1f} ({change:+.1%}){marker}")
+    print(f"{len(regressions)} regression(s)" if regressions else "No regressions")
+
+
+def compare(baseline, current, tolerance=0.10):
+    """
+    Compare two benchmark reports, matching results by batch size and threads
+
+    Returns:
+        (rows, regressions): rows are (config, metric, baseline, current,
+        relative change) tuples; regressions are the rows slower than
+        ``tolerance`` (or, for images/sec, lower by more than ``tolerance``)
+    """
+    for key in ('cpu_count', 'torch', 'model', 'images', 'profile'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"Warning: {key} differs from the baseline "
+                  f"({baseline['meta'].get(key)!r} vs {current['meta'].get(key)!r})")
+
+    baseline_results = {(r['batch_size'], r['threads']): r for r in baseline['results']}
+    rows, regressions = [], []
+    for result in current['results']:
+        config = (result['batch_size'], result['threads'])
+        base = baseline_results.get(config)
+        if base is None:
+            continue
+        pairs = [(f'total.{metric}', base['total'][metric], result['total'][metric]) for metric in COMPARED_METRICS]
+        pairs += [(f'{stage}.p50_ms', base['stages'][stage]['p50_ms'], result['stages'][stage]['p50_ms'])
+                  for stage in STAGES]
+        pairs.append(('images_per_sec', base['images_per_sec'], result['images_per_sec']))
+        pairs.append(('peak_rss_mb', base['peak_rss_mb'], result['peak_rss_mb']))
+        for metric, old, new in pairs:
+            change = (new - old) / old if old else 0.0
+            row = (config, metric, old, new, change)
+            rows.append(row)
+            worse = -change if metric == 'images_per_sec' else change
+            # Per-stage p50s are shown for diagnosis; the verdict uses end-to-end figures
+            if worse > tolerance and (metric.startswith('total.') or metric in ('images_per_sec', 'peak_rss_mb')):
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_comparison(rows, regressions):
+    regressed = set(id(row) for row in regressions)
+    for row in rows:
+        (batch_size, threads), metric, old, new, change = row
+        marker = '  REGRESSION' if id(row) in regressed else ''
+        print(f"batch {batch_size:>3} x {threads:>2} threads  {metric:<20} {old:>10.2f} -> {new:>10.2f} "
+              f"({change:+.1%}){marker}")
+    print(f"{len(regressions)} regression(s)" if regressions else "No regressions")
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark food classification latency and throughput")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="run the benchmark suite")
+    run.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                     help="checkpoint to load; a random FoodClassifier is used if it does not exist")
+    run.add_argument('--batch-sizes', type=parse_ints, default=[1, 4, 8])
+    run.add_argument('--threads', type=parse_ints, default=None,
+                     help="torch thread counts (default: 1, half and all cores)")
+    run.add_argument('--runs', type=int, default=30, help="measured iterations per combination")
+    run.add_argument('--warmup', type=int, default=3)
+    run.add_argument('--images', help="directory of real images (default: a synthetic JPEG)")
+    run.add_argument('--profile', help="inference profile to apply (its thread count is ignored)")
+    run.add_argument('--output', help="write the JSON report here")
+    run.add_argument('--baseline', help="JSON report to compare this run against")
+    run.add_argument('--tolerance', type=float, default=0.10, help="allowed slowdown before failing")
+
+    comparison = commands.add_parser('compare', help="compare two saved reports")
+    comparison.add_argument('baseline')
+    comparison.add_argument('current')
+    comparison.add_argument('--tolerance', type=float, default=0.10)
+
+    boot = commands.add_parser('boot', help="measure worker boot time over fresh processes")
+    boot.add_argument('--runs', type=int, default=5)
+    boot.add_argument('--timeout', type=float, default=120, help="seconds to wait for the model to be ready")
+    boot.add_argument('--inference-backend', choices=['local', 'remote'],
+                      help="INFERENCE_BACKEND for the booted app (default: the environment's)")
+    boot.add_argument('--output', help="write the JSON report here")
+    boot.add_argument('--baseline', help="JSON report to compare this run against")
+    boot.add_argument('--tolerance', type=float, default=0.10, help="allowed slowdown before failing")
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+    elif args.command == 'boot':
+        current = run_boot(runs=args.runs, timeout=args.timeout, inference_backend=args.inference_backend)
+        print(json.dumps(current['phases'], indent=2))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"Report written to {args.output}")
+        if not args.baseline:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        current = run_suite(args.checkpoint, batch_sizes=args.batch_sizes, thread_counts=args.threads,
+                            runs=args.runs, warmup=args.warmup, images_dir=args.images,
+                            profile_path=args.profile)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"Report written to {args.output}")
+        if not args.baseline:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if current['meta'].get('kind') == 'boot':
+        rows, regressions = compare_boot(baseline, current, tolerance=args.tolerance)
+        print_boot_comparison(rows, regressions)
+    else:
+        rows, regressions = compare(baseline, current, tolerance=args.tolerance)
+        print_comparison(rows, regressions)
+    # Non-zero exit so CI can fail on a slowdown
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Classify every image under a directory, e.g. to re-score the upload history
+after a model change.
+
+Images are decoded, resized and cropped by a pool of DataLoader worker
+processes while the main process runs large batches through the model.
+Results are appended to a JSONL or CSV file after every batch; re-running
+the same command skips images that already have a result for the current
+model version, so an interrupted run picks up where it stopped. Images that
+failed are tried again; their new record is appended after the old one.
+
+Usage:
+    python bulk_classify.py static/uploads --output rescored.jsonl
+    python bulk_classify.py /data/partner_dump --output partner.csv --workers 8 --batch-size 128
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from models import ImagePreprocessor, load_model, predict_tensors
+from prediction_cache import file_version
+from preprocessing import prepare_array
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+CSV_FIELDS = ['path', 'model_version', 'food_name', 'confidence', 'predictions', 'error']
+
+
+def find_images(directory):
+    """All image files below ``directory`` (recursively), sorted for a stable order"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+
+class ImageFiles(Dataset):
+    """Decodes one image file into a cropped uint8 array; runs inside DataLoader workers"""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        path = self.paths[index]
+        try:
+            with open(path, 'rb') as f:
+                return path, prepare_array(f.read()), None
+        except Exception as e:
+            return path, None, str(e)
+
+
+def collate(samples):
+    """Stack the decoded images of a batch, keeping failures aside"""
+    ok = [(path, array) for path, array, _ in samples if array is not None]
+    failed = [(path, error) for path, array, error in samples if array is None]
+    arrays = torch.from_numpy(np.stack([array for _, array in ok])) if ok else None
+    return [path for path, _ in ok], arrays, failed
+
+
+def done_paths(output_path, model_version):
+    """Paths that already have a successful result for ``model_version`` in an existing output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, newline='') as f:
+        if output_path.endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # Last line of a run that was killed mid-write
+                    continue
+        for row in rows:
+            # Error rows are not done, so a resumed run retries those images
+            if row.get('model_version') == model_version and not row.get('error'):
+                done.add(row['path'])
+    return done
+
+
+class ResultWriter:
+    """Appends one record per image to a JSONL or CSV file, flushed after every batch"""
+
+    def __init__(self, path):
+        self.csv = path.endswith('.csv')
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            # Make sure a partially written last line does not swallow the first new record
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self.file = open(path, 'a', newline='')
+        if not new_file and needs_newline:
+            self.file.write('\n')
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.csv:
+            row = dict(record)
+            row['predictions'] = ';'.join(f"{p['food_name']}:{p['confidence']:.4f}" for p in record.get('predictions', []))
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def classify_directory(model, class_names, device, paths, writer, model_version,
+                       batch_size=64, workers=4, topk=5, report_every=10):
+    """
+    Classify ``paths`` and write one record per image
+
+    Returns:
+        Dict with image/error counts, elapsed seconds and throughput
+    """
+    preprocessor = ImagePreprocessor()
+    loader = DataLoader(ImageFiles(paths), batch_size=batch_size, num_workers=workers,
+                        collate_fn=collate, prefetch_factor=2 if workers else None)
+    processed = errors = 0
+    model_seconds = 0.0
+    began = time.perf_counter()
+    for batch_index, (batch_paths, arrays, failed) in enumerate(loader, 1):
+        if arrays is not None:
+            batch = torch.empty((len(batch_paths), 3) + arrays.shape[1:3], dtype=torch.float32)
+            for i, array in enumerate(arrays.numpy()):
+                preprocessor.normalize(array, out=batch[i])
+            model_began = time.perf_counter()
+            results = predict_tensors(model, batch, class_names, device, topk=topk)
+            model_seconds += time.perf_counter() - model_began
+            for path, predictions in zip(batch_paths, results):
+                writer.write({
+                    'path': path,
+                    'model_version': model_version,
+                    'food_name': predictions[0][0],
+                    'confidence': predictions[0][1],
+                    'predictions': [{'food_name': name, 'confidence': prob} for name, prob in predictions],
+                })
+        for path, error in failed:
+            writer.write({'path': path, 'model_version': model_version, 'error': error})
+        writer.flush()
+
+        processed += len(batch_paths)
+        errors += len(failed)
+        if report_every and batch_index % report_every == 0:
+            elapsed = time.perf_counter() - began
+            print(f"{processed + errors}/{len(paths)} images, {processed / elapsed:.1f} images/sec")
+
+    elapsed = time.perf_counter() - began
+    return {
+        'images': processed,
+        'errors': errors,
+        'seconds': round(elapsed, 2),
+        'images_per_sec': round(processed / elapsed, 1) if elapsed else 0.0,
+        'model_images_per_sec': round(processed / model_seconds, 1) if model_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify every image under a directory")
+    parser.add_argument('directory')
+    parser.add_argument('--output', required=True, help="results file; .csv for CSV, anything else is JSONL")
+    parser.add_argument('--checkpoint', default='food101_model_for_inference (1).pth')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4, help="decode worker processes")
+    parser.add_argument('--threads', type=int, default=None, help="torch threads for the forward pass")
+    parser.add_argument('--topk', type=int, default=5)
+    parser.add_argument('--quantize', choices=['dynamic', 'static'])
+    parser.add_argument('--no-resume', action='store_true', help="classify everything again")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    model, class_names, device = load_model(args.checkpoint, quantize=args.quantize, calibration_dir=args.directory)
+    model_version = file_version(args.checkpoint)
+    if args.quantize:
+        model_version += f"-{args.quantize}"
+
+    paths = find_images(args.directory)
+    if not args.no_resume:
+        done = done_paths(args.output, model_version)
+        if done:
+            print(f"Resuming: {len(done)} images already classified with model {model_version}")
+            paths = [path for path in paths if path not in done]
+    print(f"{len(paths)} images to classify")
+    if not paths:
+        return
+
+    writer = ResultWriter(args.output)
+    try:
+        report = classify_directory(model, class_names, device, paths, writer, model_version,
+                                    batch_size=args.batch_size, workers=args.workers, topk=args.topk)
+    finally:
+        writer.close()
+
+    print(f"Classified {report['images']} images ({report['errors']} unreadable) in {report['seconds']} s: "
+          f"{report['images_per_sec']} images/sec end to end, {report['model_images_per_sec']} images/sec in the model")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Measure the cascade (light model first, ResNet50 only for low-confidence
+images) against the ResNet50 alone on a labelled image directory.
+
+The directory holds one sub-directory per class, named like the checkpoint's
+class_names (e.g. eval/pizza/*.jpg, eval/chicken_curry/*.jpg).
+
+Usage:
+    python evaluate_cascade.py --light light_model.pth --images eval/ --thresholds 0.5,0.7,0.8,0.9
+"""
+import argparse
+import os
+import time
+
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from models import load_light_model, load_model, preprocess_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def labelled_images(directory, class_names):
+    """(path, class index) pairs for every image in a class-per-folder tree"""
+    index = {name: i for i, name in enumerate(class_names)}
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        folder = os.path.join(directory, name)
+        if not os.path.isdir(folder):
+            continue
+        if name not in index:
+            print(f"Skipping folder {name!r}: not one of the model's classes")
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(folder, filename), index[name]))
+    return samples
+
+
+def run_model(model, samples, batch_size):
+    """Logits for every sample plus the mean forward time per image in ms"""
+    outputs = []
+    elapsed = 0.0
+    with torch.no_grad():
+        for start in range(0, len(samples), batch_size):
+            batch = torch.cat([preprocess_image(Image.open(path)) for path, _ in samples[start:start + batch_size]])
+            began = time.perf_counter()
+            outputs.append(model(batch))
+            elapsed += time.perf_counter() - began
+    return torch.cat(outputs), elapsed * 1000 / len(samples)
+
+
+def evaluate(light_logits, large_logits, labels, threshold, light_ms, large_ms):
+    """Accuracy, escalation rate and estimated cost of the cascade at one threshold"""
+    confidence = F.softmax(light_logits, dim=1).max(dim=1).values
+    escalate = confidence < threshold
+    cascade_pred = torch.where(escalate, large_logits.argmax(dim=1), light_logits.argmax(dim=1))
+    escalation_rate = escalate.float().mean().item()
+    return {
+        'threshold': threshold,
+        'escalation_rate': escalation_rate,
+        'accuracy': (cascade_pred == labels).float().mean().item(),
+        'ms_per_image': light_ms + escalation_rate * large_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the cascade classifier against the ResNet50 alone")
+    parser.add_argument('--checkpoint', default='food101_model_for_inference (1).pth')
+    parser.add_argument('--light', required=True, help="LightFoodClassifier checkpoint")
+    parser.add_argument('--images', required=True, help="class-per-folder evaluation directory")
+    parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.8,0.9')
+    parser.add_argument('--batch-size', type=int, default=16)
+    args = parser.parse_args()
+
+    device = torch.device('cpu')
+    large_model, class_names, _ = load_model(args.checkpoint, device=device)
+    light_model, light_class_names = load_light_model(args.light, device=device)
+    if list(light_class_names) != list(class_names):
+        raise SystemExit("The light and large checkpoints have different class_names")
+
+    samples = labelled_images(args.images, class_names)
+    if not samples:
+        raise SystemExit(f"No labelled images found under {args.images}")
+    labels = torch.tensor([label for _, label in samples])
+
+    light_logits, light_ms = run_model(light_model, samples, args.batch_size)
+    large_logits, large_ms = run_model(large_model, samples, args.batch_size)
+    large_accuracy = (large_logits.argmax(dim=1) == labels).float().mean().item()
+    light_accuracy = (light_logits.argmax(dim=1) == labels).float().mean().item()
+
+    print(f"{len(samples)} images")
+    print(f"ResNet50 only:    accuracy {large_accuracy:.1%}  {large_ms:.1f} ms/image")
+    print(f"Light model only: accuracy {light_accuracy:.1%}  {light_ms:.1f} ms/image")
+    for threshold in (float(t) for t in args.thresholds.split(',')):
+        result = evaluate(light_logits, large_logits, labels, threshold, light_ms, large_ms)
+        print(f"Cascade @ {threshold:.2f}:   accuracy {result['accuracy']:.1%} "
+              f"(delta {result['accuracy'] - large_accuracy:+.1%})  "
+              f"escalated {result['escalation_rate']:.1%}  ~{result['ms_per_image']:.1f} ms/image")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Export a FoodClassifier checkpoint to ahead-of-time compiled artifacts.
+
+    torchscript - traced and frozen TorchScript, optimized for the host at load time
+    onnx        - ONNX graph for onnxruntime on CPU (needs onnx + onnxruntime)
+    mmap        - flat state_dict loaded with torch.load(mmap=True), plus a
+                  class-name JSON file; workers share the weight pages
+
+Artifacts are written next to the checkpoint (see models.artifact_paths) and
+carry class_names as metadata, so load_model can pick them up without
+unpickling the checkpoint or rebuilding the Python model.
+
+Usage:
+    python export_model.py all --checkpoint "food101_model_for_inference (1).pth" --check
+    python export_model.py mmap --measure --workers 4
+"""
+import argparse
+import inspect
+import json
+import multiprocessing
+import time
+
+import torch
+
+from memory_stats import memory_usage
+from models import OnnxFoodClassifier, artifact_paths, load_artifact, load_model
+
+EXAMPLE_SHAPE = (1, 3, 224, 224)
+
+
+def export_torchscript(model, class_names, path):
+    """Trace and freeze the model (weights inlined, conv/bn folded)"""
+    example = torch.randn(EXAMPLE_SHAPE)
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(model, example).eval())
+    # optimize_for_inference output is host specific and does not always
+    # serialize, so load_artifact applies it after loading instead
+    torch.jit.save(frozen, path, _extra_files={'class_names.json': json.dumps(list(class_names))})
+    return path
+
+
+def export_onnx(model, class_names, path):
+    """Export to ONNX with dynamic batch and image size dimensions and class_names metadata"""
+    import onnx
+
+    example = torch.randn(EXAMPLE_SHAPE)
+    kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # Newer torch defaults to the dynamo exporter; keep the classic one
+        kwargs['dynamo'] = False
+    torch.onnx.export(
+        model, example, path,
+        input_names=['image'], output_names=['logits'],
+        dynamic_axes={'image': {0: 'batch', 2: 'height', 3: 'width'}, 'logits': {0: 'batch'}},
+        opset_version=17,
+        **kwargs,
+    )
+    onnx_model = onnx.load(path)
+    entry = onnx_model.metadata_props.add()
+    entry.key = 'class_names'
+    entry.value = json.dumps(list(class_names))
+    onnx.save(onnx_model, path)
+    return path
+
+
+def export_mmap(model, class_names, weights_path, classes_path):
+    """Save a flat, contiguous state_dict that torch.load can memory-map"""
+    state_dict = {name: tensor.detach().contiguous() for name, tensor in model.state_dict().items()}
+    torch.save(state_dict, weights_path)
+    with open(classes_path, 'w') as f:
+        json.dump(list(class_names), f)
+    return weights_path
+
+
+def _measure_worker(checkpoint_path, artifact, results, loaded, done):
+    start = time.perf_counter()
+    model, _, _ = load_model(checkpoint_path, device=torch.device('cpu'), artifact=artifact)
+    load_ms = (time.perf_counter() - start) * 1000
+    # A forward pass touches every weight page, as serving requests would
+    with torch.no_grad():
+        model(torch.randn(EXAMPLE_SHAPE))
+    # Measure once every worker holds its model so shared pages show up as shared
+    loaded.wait()
+    results.put({'load_ms': load_ms, **memory_usage()})
+    done.wait()
+
+
+def measure_workers(checkpoint_path, artifact, workers=4):
+    """Start ``workers`` fresh processes that each load the model and report load time and memory"""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    loaded = ctx.Barrier(workers)
+    done = ctx.Barrier(workers + 1)
+    procs = [ctx.Process(target=_measure_worker, args=(checkpoint_path, artifact, results, loaded, done))
+             for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    samples = [results.get() for _ in procs]
+    done.wait()
+    for proc in procs:
+        proc.join()
+
+    def mean(key):
+        return round(sum(sample[key] for sample in samples) / len(samples), 1)
+
+    return {key: mean(key) for key in ('load_ms', 'rss_mb', 'pss_mb', 'uss_mb')}
+
+
+def check_parity(eager_model, exported_model, batch_size=4, atol=1e-3):
+    """
+    Compare an exported model against the eager one on random inputs.
+
+    Returns:
+        Dict with the max absolute logit difference and top-1 agreement;
+        raises AssertionError when the outputs drift beyond ``atol``
+    """
+    torch.manual_seed(0)
+    batch = torch.randn(batch_size, *EXAMPLE_SHAPE[1:])
+    with torch.no_grad():
+        expected = eager_model(batch)
+        actual = exported_model(batch)
+    max_diff = (expected - actual).abs().max().item()
+    top1 = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+    if max_diff > atol:
+        raise AssertionError(f"Exported model differs from eager model by {max_diff:.2e} (atol {atol:.0e})")
+    return {'max_abs_diff': max_diff, 'top1_agreement': top1}
+
+
+def _time_load(loader, runs=3):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        loader()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export FoodClassifier to TorchScript and/or ONNX")
+    parser.add_argument('format', choices=('torchscript', 'onnx', 'mmap', 'all'))
+    parser.add_argument('--checkpoint', default='food101_model_for_inference (1).pth')
+    parser.add_argument('--check', action='store_true', help="verify parity with the eager model and time loading")
+    parser.add_argument('--measure', action='store_true',
+                        help="compare per-worker load time and memory of the checkpoint and the exported format")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    cpu = torch.device('cpu')
+    model, class_names, _ = load_model(args.checkpoint, device=cpu, artifact=None)
+    paths = artifact_paths(args.checkpoint)
+    formats = ('torchscript', 'onnx', 'mmap') if args.format == 'all' else (args.format,)
+
+    for fmt in formats:
+        if fmt == 'torchscript':
+            export_torchscript(model, class_names, paths['torchscript'])
+        elif fmt == 'onnx':
+            export_onnx(model, class_names, paths['onnx'])
+        else:
+            export_mmap(model, class_names, paths['mmap'], paths['classes'])
+        print(f"Exported {fmt} artifact to {paths[fmt]}")
+
+        if args.check:
+            if fmt == 'torchscript':
+                exported, _ = load_artifact(args.checkpoint, cpu, 'torchscript')
+            elif fmt == 'onnx':
+                exported = OnnxFoodClassifier(paths['onnx'])
+            else:
+                exported, _, _ = load_model(args.checkpoint, device=cpu, artifact='mmap')
+            parity = check_parity(model, exported)
+            load_ms = _time_load(lambda: load_model(args.checkpoint, device=cpu, artifact=fmt))
+            print(f"  parity: max |diff| {parity['max_abs_diff']:.2e}, top-1 agreement {parity['top1_agreement']:.0%}")
+            print(f"  load_model with artifact: {load_ms:.0f} ms")
+
+    if args.check:
+        eager_ms = _time_load(lambda: load_model(args.checkpoint, device=cpu, artifact=None))
+        print(f"load_model from checkpoint: {eager_ms:.0f} ms")
+
+    if args.measure:
+        del model
+        print(f"Per-worker averages over {args.workers} processes:")
+        for label, artifact in [('checkpoint', None)] + [(fmt, fmt) for fmt in formats]:
+            stats = measure_workers(args.checkpoint, artifact, workers=args.workers)
+            print(f"  {label:12s} load {stats['load_ms']:7.0f} ms  rss {stats['rss_mb']:7.1f} MB  "
+                  f"pss {stats['pss_mb']:7.1f} MB  uss {stats['uss_mb']:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Ranked food search over the nutrition catalog.
+
+Built once from NUTRITION_DB, the index answers each query from lookups
+proportional to the query and its matches rather than a scan of the catalog:
+
+    exact        the normalised name ("hot_dog" -> "hot dog")
+    prefix       a prefix trie over names and over each word of a name; nodes
+                 keep their shortest names, so "chi" is one walk of 3 nodes;
+                 longer queries filter the small bucket at the trie's last level
+    token        whole-word inverted index ("grilled chicken breast" ->
+                 "chicken breast", then "chicken")
+    substring /  character-trigram inverted index; candidates sharing rare
+    fuzzy        trigrams with the query are scored by trigram similarity,
+                 which catches typos ("brocolli") and infixes ("berry")
+
+Scores order the tiers (exact > prefix > word prefix > token > substring >
+fuzzy); within a tier closer and shorter names rank first.
+"""
+import re
+from array import array
+from collections import Counter, defaultdict
+
+# Names kept per trie node, i.e. the most results a bare prefix can return
+TRIE_NODE_SIZE = 50
+# Trie levels; nodes on the last one keep all their names, which longer queries filter
+TRIE_DEPTH = 8
+# Trigrams in more names than this carry little signal and are skipped when gathering fuzzy candidates
+MAX_TRIGRAM_POSTINGS = 20000
+# Candidates (those sharing the most rare trigrams) whose exact similarity is computed
+FUZZY_CANDIDATES = 200
+
+
+def normalize(text):
+    """Lowercase, with underscores, punctuation and repeated spaces collapsed to single spaces"""
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text.lower()).split())
+
+
+def trigrams(text):
+    """Character trigrams of a normalised string, padded so word starts and ends count"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Dice coefficient of two trigram sets"""
+    return 2.0 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+class FoodSearchIndex:
+    """
+    Args:
+        foods: Catalog names (e.g. the keys of NUTRITION_DB); results use them unchanged
+        min_similarity: Trigram similarity below which fuzzy candidates are dropped
+    """
+
+    def __init__(self, foods, min_similarity=0.3):
+        self.min_similarity = min_similarity
+        self.names = list(foods)
+        self._normalized = [normalize(name) for name in self.names]
+        self._ids = {}
+        # Trie nodes are dicts of child nodes by character; key '' holds the node's best ids
+        self._trie = {}
+        # Postings as int arrays: a few bytes per entry instead of a list slot and refcount each
+        self._tokens = defaultdict(lambda: array('i'))
+        self._trigrams = defaultdict(lambda: array('i'))
+
+        for i, name in enumerate(self._normalized):
+            self._ids.setdefault(name, i)
+            words = name.split()
+            for start in range(len(words)):
+                self._insert(' '.join(words[start:]), i)
+            for word in set(words):
+                self._tokens[word].append(i)
+            for trigram in trigrams(name):
+                self._trigrams[trigram].append(i)
+        self._trim(self._trie)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _insert(self, key, i):
+        node = self._trie
+        for char in key[:TRIE_DEPTH]:
+            node = node.setdefault(char, {})
+            node.setdefault('', []).append(i)
+
+    def _trim(self, root):
+        """Keep the TRIE_NODE_SIZE shortest names of each node above the last level"""
+        stack = [(root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            for char, child in node.items():
+                if char == '':
+                    continue
+                ids = sorted(set(child['']), key=lambda i: (len(self._normalized[i]), self._normalized[i]))
+                child[''] = ids if depth + 1 == TRIE_DEPTH else ids[:TRIE_NODE_SIZE]
+                stack.append((child, depth + 1))
+
+    def _prefix_ids(self, query):
+        node = self._trie
+        for char in query[:TRIE_DEPTH]:
+            node = node.get(char)
+            if node is None:
+                return []
+        ids = node.get('', [])
+        if len(query) > TRIE_DEPTH:
+            # Past the last level: keep the names where the query starts the name or one of its words
+            ids = [i for i in ids if f' {self._normalized[i]}'.find(f' {query}') != -1]
+        return ids
+
+    def search(self, query, limit=10):
+        """
+        Rank catalog names against a free-text query
+
+        Returns:
+            Up to ``limit`` dicts with 'name', 'score' and 'match' (the tier);
+            substring and fuzzy matches also carry 'similarity'
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        found = {}
+
+        def offer(i, score, match, **extra):
+            if i not in found or found[i]['score'] < score:
+                found[i] = dict(score=round(score, 2), match=match, **extra)
+
+        i = self._ids.get(query)
+        if i is not None:
+            offer(i, 1000, 'exact')
+
+        for i in self._prefix_ids(query):
+            name = self._normalized[i]
+            closeness = len(query) / len(name)
+            if name.startswith(query):
+                offer(i, 800 + 100 * closeness, 'prefix')
+            else:
+                offer(i, 700 + 100 * closeness, 'word_prefix')
+
+        words = query.split()
+        hits = Counter()
+        for word in set(words):
+            hits.update(self._tokens.get(word, ()))
+        for i, count in hits.items():
+            # How much of the query the name explains, and how much of the name the query covers
+            query_coverage = count / len(set(words))
+            name_coverage = count / len(set(self._normalized[i].split()))
+            offer(i, 500 + 100 * (query_coverage + name_coverage) / 2, 'token')
+
+        # Fuzzy matching only runs when the cheaper tiers did not fill the page
+        if len(found) < limit:
+            for i, score, match, sim in self._fuzzy(query):
+                offer(i, score, match, similarity=round(sim, 3))
+
+        ranked = sorted(found.items(), key=lambda item: (-item[1]['score'], len(self._normalized[item[0]]),
+                                                         self._normalized[item[0]]))
+        return [dict(name=self.names[i], **result) for i, result in ranked[:limit]]
+
+    def _fuzzy(self, query):
+        query_trigrams = trigrams(query)
+        postings = [self._trigrams[t] for t in query_trigrams if t in self._trigrams]
+        rare = [p for p in postings if len(p) <= MAX_TRIGRAM_POSTINGS] or postings
+        shared = Counter()
+        for ids in rare:
+            shared.update(ids)
+        for i, _ in shared.most_common(FUZZY_CANDIDATES):
+            name = self._normalized[i]
+            sim = similarity(query_trigrams, trigrams(name))
+            if query in name:
+                yield i, 400 + 100 * sim, 'substring', sim
+            elif sim >= self.min_similarity:
+                yield i, 400 * sim, 'fuzzy', sim
+
+    def best_match(self, query, min_fuzzy_similarity=0.6):
+        """
+        The single best name for a query, or None. Fuzzy matches only count
+        when they are close (a typo, not merely a similar word)
+        """
+        results = self.search(query, limit=1)
+        if not results:
+            return None
+        best = results[0]
+        if best['match'] == 'fuzzy' and best['similarity'] < min_fuzzy_similarity:
+            return None
+        return best['name']
@@ -0,0 +1,50 @@
+"""
+gunicorn settings, read automatically from the working directory.
+
+With PRELOAD_MODEL=1 the app, the model, the nutrition tables and the
+food search index are loaded once in the master and the workers are
+forked from it, sharing those pages copy-on-write instead of each
+loading a private copy:
+    PRELOAD_MODEL=1 WEB_CONCURRENCY=4 gunicorn 'app:create_app()'
+Hot-swapped model versions (MODEL_DIR) are loaded by each worker and are
+not shared. `python memory_stats.py <master pid>` shows how much memory
+each worker really has to itself.
+
+Background classification jobs stream their progress as server-sent
+events only with threaded or async workers (--threads, gthread, gevent,
+eventlet); a sync worker would be tied up for the whole stream, so there
+the page polls the job status instead.
+"""
+import gc
+import os
+
+preload_app = os.environ.get('PRELOAD_MODEL') == '1'
+
+if preload_app:
+    # No collections in the master while the app loads: freed objects leave holes in
+    # pages the workers would otherwise share, and freezing (in pre_fork) is the
+    # only collector state they should inherit
+    gc.disable()
+
+
+def streaming_workers(cfg):
+    """Whether a worker keeps serving other requests while one holds an event stream open"""
+    worker_class = cfg.worker_class_str.lower()
+    return cfg.threads > 1 or any(name in worker_class for name in ('gthread', 'gevent', 'eventlet', 'tornado'))
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import before_fork
+        before_fork(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    if not streaming_workers(server.cfg):
+        # Read by the app's config when the worker loads it; a preloaded app already has its config
+        os.environ['JOB_EVENTS_STREAM'] = '0'
+        if server.cfg.preload_app:
+            server.app.wsgi().config['JOB_EVENTS_STREAM'] = False
+    if server.cfg.preload_app:
+        from app import after_fork
+        after_fork()
@@ -0,0 +1,119 @@
+import io
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis as an n x n matrix"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix(DCT_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)[::-1]).astype(np.uint64)
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image):
+    """
+    64-bit pHash of an image.
+
+    Args:
+        image: PIL Image or raw encoded image bytes
+
+    Returns:
+        The hash as a Python int. Re-saved, resized or re-compressed copies of
+        the same photo land within a few bits of each other.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    # JPEG draft mode lets libjpeg decode at 1/8 scale, which is all we need here
+    image.draft('L', (DCT_SIZE * 2, DCT_SIZE * 2))
+    pixels = np.asarray(image.convert('L').resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR), dtype=np.float64)
+
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # Skip the DC term when choosing the threshold so overall brightness does not matter
+    bits = coefficients > np.median(coefficients[1:])
+    return int((bits.astype(np.uint64) * _BIT_WEIGHTS).sum())
+
+
+def hamming_distances(hashes, value):
+    """Vectorized Hamming distance between a uint64 array and a single hash"""
+    diff = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT8[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    Per-user index of recent upload hashes and their predictions.
+
+    Each user keeps at most ``max_per_user`` packed 64-bit hashes in a NumPy
+    array, so a lookup is a single XOR + popcount over a few hundred words.
+    """
+
+    def __init__(self, max_per_user=256, max_distance=4, max_age_seconds=14 * 24 * 3600):
+        self.max_per_user = max_per_user
+        self.max_distance = max_distance
+        self.max_age_seconds = max_age_seconds
+        self._users = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, user_id, image_hash, model_version=None, with_embedding=False):
+        """
+        Return predictions of the closest recent match for this user, or None;
+        with ``with_embedding`` a (predictions, embedding or None) pair
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and len(entry['hashes']):
+                distances = hamming_distances(entry['hashes'], image_hash)
+                fresh = entry['times'] >= time.time() - self.max_age_seconds
+                candidates = np.flatnonzero(fresh & (distances <= self.max_distance))
+                for i in candidates[np.argsort(distances[candidates], kind='stable')]:
+                    predictions, version = entry['predictions'][i]
+                    if version == model_version:
+                        self.hits += 1
+                        return (predictions, entry['embeddings'][i]) if with_embedding else predictions
+            self.misses += 1
+            return None
+
+    def add(self, user_id, image_hash, predictions, model_version=None, embedding=None):
+        """
+        Remember predictions (and optionally the classifier embedding, kept as
+        float16) for an upload, evicting the user's oldest entry when full
+        """
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float16)
+        with self._lock:
+            entry = self._users.setdefault(user_id, {
+                'hashes': np.empty(0, dtype=np.uint64),
+                'times': np.empty(0, dtype=np.float64),
+                'predictions': [],
+                'embeddings': [],
+            })
+            entry['hashes'] = np.append(entry['hashes'], np.uint64(image_hash))[-self.max_per_user:]
+            entry['times'] = np.append(entry['times'], time.time())[-self.max_per_user:]
+            entry['predictions'] = (entry['predictions'] + [(predictions, model_version)])[-self.max_per_user:]
+            entry['embeddings'] = (entry['embeddings'] + [embedding])[-self.max_per_user:]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'users': len(self._users),
+                'entries': sum(len(e['hashes']) for e in self._users.values()),
+                'max_distance': self.max_distance,
+            }
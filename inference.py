@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from models import preprocess_image, predict_tensors
+from preprocessing import CROP_SIZE
+
+
+class BatchingEngine:
+    """
+    Dynamic micro-batching in front of the food classifier.
+
+    Requests submitted from concurrent threads are queued for at most
+    ``max_wait_ms`` (or until ``max_batch_size`` is reached), stacked into one
+    tensor and classified with a single forward pass. Each caller gets back
+    its own top-k list.
+    """
+
+    def __init__(self, model, class_names, device, max_batch_size=8, max_wait_ms=5.0):
+        self.model = model
+        self.class_names = class_names
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        """Start the batching thread (restarted automatically after a fork)"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._closed = False
+            self._pending = []
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='batching-engine', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the batching thread once the queued requests are served"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join()
+
+    def submit(self, image_pil, topk=5, crop_size=CROP_SIZE, return_embedding=False):
+        """
+        Queue a PIL image for classification and return a Future of its top-k
+        list, or of (top-k list, embedding) with ``return_embedding``
+        """
+        # Preprocessing runs on the caller's thread so the batching thread
+        # only has to stack tensors and run the model.
+        tensor = preprocess_image(image_pil, crop_size=crop_size)
+        return self.submit_tensor(tensor, topk=topk, return_embedding=return_embedding)
+
+    def submit_tensor(self, tensor, topk=5, return_embedding=False):
+        """Queue an already preprocessed (1, 3, H, W) tensor, usually 224 x 224"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self.start()
+
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batching engine is closed")
+            self._pending.append((tensor, topk, future, return_embedding))
+            self._cond.notify()
+        return future
+
+    def predict(self, image_pil, topk=5, timeout=None):
+        """Blocking helper with the same return value as models.predict_food"""
+        return self.submit(image_pil, topk=topk).result(timeout=timeout)
+
+    def stats(self):
+        """Return batch counters for monitoring"""
+        with self._cond:
+            queued = len(self._pending)
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'queued': queued,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+        }
+
+    def _next_batch(self):
+        """Wait for work, then keep collecting until the batch is full or the wait expires"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Only tensors of the same size can be stacked; others wait for the next batch
+            shape = self._pending[0][0].shape
+            batch = []
+            remaining = []
+            for item in self._pending:
+                if len(batch) < self.max_batch_size and item[0].shape == shape:
+                    batch.append(item)
+                else:
+                    remaining.append(item)
+            self._pending = remaining
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            # Drop requests whose callers already gave up
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                tensors = torch.cat([tensor for tensor, _, _, _ in batch])
+                max_k = max(k for _, k, _, _ in batch)
+                embed = any(item[3] for item in batch)
+                results = predict_tensors(self.model, tensors, self.class_names, self.device, topk=max_k,
+                                          return_embeddings=embed)
+                embeddings = None
+                if embed:
+                    results, embeddings = results
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for i, ((_, k, future, return_embedding), predictions) in enumerate(zip(batch, results)):
+                if return_embedding:
+                    future.set_result((predictions[:k], embeddings[i] if embeddings is not None else None))
+                else:
+                    future.set_result(predictions[:k])
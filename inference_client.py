@@ -0,0 +1,83 @@
+"""
+Client side of the out-of-process inference service.
+
+This module deliberately avoids importing torch so that web workers can talk
+to inference_server.py without loading the model runtime themselves. Images
+are decoded, resized and center-cropped here and sent as small uint8 arrays.
+"""
+import threading
+from multiprocessing.connection import Client
+
+from preprocessing import CROP_SIZE, prepare_array, resize_for_crop
+
+
+class InferenceClient:
+    """Talks to inference_server.py over a Unix socket, one connection per thread"""
+
+    def __init__(self, socket_path, authkey=None, timeout=30.0):
+        self.socket_path = socket_path
+        self.authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def request(self, message):
+        """Send one request and wait for its reply, reconnecting once if the server restarted"""
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                if not conn.poll(self.timeout):
+                    self._reset()
+                    raise TimeoutError("Inference server did not answer in time")
+                reply = conn.recv()
+                break
+            except (EOFError, ConnectionError, BrokenPipeError, FileNotFoundError):
+                self._reset()
+                if attempt:
+                    raise
+        if reply.get('error'):
+            raise RuntimeError(f"Inference server error: {reply['error']}")
+        return reply
+
+    def predict(self, image_pil, topk=5):
+        """Same contract as models.predict_food (PIL image or raw bytes in, top-k tuples out)"""
+        reply = self.request({'op': 'predict', 'images': [prepare_array(image_pil)], 'topk': topk})
+        return [tuple(p) for p in reply['predictions'][0]]
+
+    def predict_batch(self, images, topk=5, crop_size=CROP_SIZE, return_embeddings=False):
+        """
+        Classify several PIL images in one round trip; with ``return_embeddings``
+        also return one float16 embedding (or None) per image
+        """
+        resize = resize_for_crop(crop_size)
+        arrays = [prepare_array(img, resize=resize, crop=crop_size) for img in images]
+        reply = self.request({'op': 'predict', 'images': arrays, 'topk': topk, 'embeddings': return_embeddings})
+        predictions = [[tuple(p) for p in preds] for preds in reply['predictions']]
+        if return_embeddings:
+            return predictions, reply['embeddings']
+        return predictions
+
+    def classes(self):
+        """Model version and class names the server predicts"""
+        reply = self.request({'op': 'classes'})
+        return reply['version'], reply['class_names']
+
+    def ping(self):
+        """Return basic information about the server (model, class count, pid)"""
+        return self.request({'op': 'ping'})
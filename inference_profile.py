@@ -0,0 +1,214 @@
+"""
+Inference profiles: how a worker process runs the model on this host.
+
+A profile is a small JSON file:
+    {"threads": 2, "interop_threads": 1, "channels_last": true,
+     "inference_mode": true, "autocast_bf16": false}
+
+``threads`` is the intra-op thread count of *one* worker. Left unset it
+defaults to the host's cores divided by WEB_CONCURRENCY, so several gunicorn
+workers do not oversubscribe the CPU (which is what wrecks tail latency).
+
+Find the best profile for the current host and write it where the app reads it:
+    python inference_profile.py autotune --output instance/inference_profile.json --workers 4
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+from models import configure_inference, load_model, predict_tensors
+
+DEFAULT_PROFILE = {
+    'threads': None,
+    'interop_threads': None,
+    'channels_last': False,
+    'inference_mode': True,
+    'autocast_bf16': False,
+}
+
+
+def bf16_supported():
+    """True when this CPU has native bfloat16 kernels (AVX512-BF16 / AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        pass
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+        return 'avx512_bf16' in flags or 'amx_bf16' in flags
+    except OSError:
+        return False
+
+
+def default_threads(workers=None):
+    """Intra-op threads per worker that keep ``workers`` processes within the host's cores"""
+    if workers is None:
+        workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def load_profile(path=None, **overrides):
+    """DEFAULT_PROFILE, updated from the JSON file at ``path`` (if it exists) and non-None overrides"""
+    profile = dict(DEFAULT_PROFILE)
+    if path and os.path.exists(path):
+        with open(path) as f:
+            profile.update({key: value for key, value in json.load(f).items() if key in DEFAULT_PROFILE})
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+    return profile
+
+
+def apply_profile(profile, model=None):
+    """
+    Apply a profile to this process and, optionally, a loaded model.
+
+    Returns:
+        The model, converted to channels_last when the profile asks for it
+    """
+    threads = profile.get('threads') or default_threads()
+    torch.set_num_threads(threads)
+    if profile.get('interop_threads'):
+        try:
+            torch.set_num_interop_threads(profile['interop_threads'])
+        except RuntimeError:
+            # Only possible before the first inter-op parallel work in the process
+            pass
+
+    autocast_bf16 = profile.get('autocast_bf16', False)
+    if autocast_bf16 and not bf16_supported():
+        print("bfloat16 autocast requested but this CPU has no bf16 support; using float32")
+        autocast_bf16 = False
+    configure_inference(inference_mode=profile.get('inference_mode', True),
+                        channels_last=profile.get('channels_last', False),
+                        autocast_bf16=autocast_bf16)
+
+    if model is not None and profile.get('channels_last') and isinstance(model, torch.nn.Module):
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def measure(model, class_names, batch, runs):
+    """Latency percentiles (ms) of ``runs`` forward passes over ``batch``"""
+    predict_tensors(model, batch, class_names, torch.device('cpu'))  # warm-up
+    timings = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        predict_tensors(model, batch, class_names, torch.device('cpu'))
+        timings.append((time.perf_counter() - began) * 1000)
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'images_per_sec': round(batch.shape[0] * 1000 / float(np.mean(timings)), 1),
+    }
+
+
+def top1_agreement(model, class_names, batch, profile, reference):
+    """Share of images whose top-1 class under ``profile`` matches ``reference``"""
+    apply_profile(profile)
+    predictions = predict_tensors(model, batch, class_names, torch.device('cpu'), topk=1)
+    return float(np.mean([p[0][0] == r[0][0] for p, r in zip(predictions, reference)]))
+
+
+def autotune(checkpoint_path, workers=1, batch_size=1, runs=20, images_dir=None, min_agreement=0.99):
+    """
+    Benchmark the model under candidate profiles and return the fastest.
+
+    Thread counts are tried first with the other settings at their defaults;
+    channels_last and bf16 autocast are then each kept only if they lower p95
+    latency by at least 2% (less is within run-to-run noise). bf16 must also
+    keep top-1 agreement with float32 at ``min_agreement`` or better.
+    inference_mode is always on: it is never slower than no_grad.
+
+    Returns:
+        (best profile, list of every measured candidate)
+    """
+    model, class_names, _ = load_model(checkpoint_path, device=torch.device('cpu'))
+    if images_dir:
+        from models import preprocess_image
+        from quantization import list_images
+        paths = list_images(images_dir, limit=max(batch_size, 32))
+        check_batch = torch.cat([preprocess_image(open(path, 'rb').read()) for path in paths])
+    else:
+        check_batch = torch.randn(32, 3, 224, 224)
+    batch = check_batch[:batch_size] if check_batch.shape[0] >= batch_size else torch.randn(batch_size, 3, 224, 224)
+
+    results = []
+
+    def run(profile):
+        tuned_model = apply_profile(profile, model)
+        metrics = measure(tuned_model, class_names, batch, runs)
+        results.append({'profile': dict(profile), **metrics})
+        print(f"  {profile} -> p50 {metrics['p50_ms']} ms, p95 {metrics['p95_ms']} ms, "
+              f"{metrics['images_per_sec']} images/sec")
+        # Undo channels_last so the next candidate starts from the original layout
+        if profile.get('channels_last'):
+            model.to(memory_format=torch.contiguous_format)
+        return metrics['p95_ms']
+
+    max_threads = default_threads(workers)
+    thread_options = sorted({t for t in (1, 2, 4, 8, 16, 32) if t < max_threads} | {max_threads})
+    print(f"Tuning for {workers} worker(s), batch size {batch_size}, up to {max_threads} threads per worker")
+
+    best = dict(DEFAULT_PROFILE)
+    best_p95 = None
+    for threads in thread_options:
+        candidate = dict(best, threads=threads)
+        p95 = run(candidate)
+        if best_p95 is None or p95 < best_p95:
+            best, best_p95 = candidate, p95
+
+    apply_profile(dict(best, autocast_bf16=False))
+    reference = predict_tensors(model, check_batch, class_names, torch.device('cpu'), topk=1)
+    flags = ['channels_last'] + (['autocast_bf16'] if bf16_supported() else [])
+    for flag in flags:
+        candidate = dict(best, **{flag: True})
+        p95 = run(candidate)
+        if flag == 'autocast_bf16':
+            agreement = top1_agreement(model, class_names, check_batch, candidate, reference)
+            print(f"  bf16 top-1 agreement with float32: {agreement:.1%}")
+            if agreement < min_agreement:
+                continue
+        if p95 < best_p95 * 0.98:
+            best, best_p95 = candidate, p95
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the fastest inference profile for this host")
+    parser.add_argument('command', choices=['autotune', 'show'])
+    parser.add_argument('--checkpoint', default='food101_model_for_inference (1).pth')
+    parser.add_argument('--output', default=os.path.join('instance', 'inference_profile.json'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 1)),
+                        help="worker processes that will share this host")
+    parser.add_argument('--batch-size', type=int, default=1, help="batch size to optimise p95 latency for")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--images', help="directory of real images for the bf16 accuracy check")
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        print(json.dumps(load_profile(args.output), indent=2))
+        print(f"bf16 supported: {bf16_supported()}, default threads per worker: {default_threads(args.workers)}")
+        return
+
+    best, results = autotune(args.checkpoint, workers=args.workers, batch_size=args.batch_size,
+                             runs=args.runs, images_dir=args.images, min_agreement=args.min_agreement)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(dict(best, tuned={
+            'workers': args.workers,
+            'batch_size': args.batch_size,
+            'cpu_count': os.cpu_count(),
+            'torch': torch.__version__,
+            'candidates': results,
+        }), f, indent=2)
+    print(f"Best profile: {best}")
+    print(f"Written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
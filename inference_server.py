@@ -0,0 +1,188 @@
+"""
+Local inference service that owns the food classifier.
+
+The model is loaded once in the parent process, its tensors are moved to
+shared memory and a pool of forked worker processes serves requests from
+inference_client.InferenceClient over a Unix socket. Memory therefore grows
+with the number of inference processes instead of the number of web workers.
+
+Clients must present the shared INFERENCE_AUTHKEY; the server refuses to
+start without one. Give the web app the same value:
+    export INFERENCE_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(32))')
+    python inference_server.py --socket instance/inference.sock --processes 2
+    INFERENCE_BACKEND=remote gunicorn 'app:create_app()'
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+from multiprocessing.connection import Listener
+
+import numpy as np
+import torch
+
+from inference import BatchingEngine
+from inference_profile import apply_profile, default_threads, load_profile
+from models import load_cascade, load_model, tensor_from_array
+from prediction_cache import file_version
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHECKPOINT = os.path.join(BASE_DIR, 'food101_model_for_inference (1).pth')
+DEFAULT_SOCKET = os.path.join(BASE_DIR, 'instance', 'inference.sock')
+
+
+def _handle_connection(conn, engine, checkpoint_path, version):
+    """Serve requests on one client connection until it is closed"""
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                if message.get('op') == 'ping':
+                    reply = {'pid': os.getpid(), 'checkpoint': checkpoint_path,
+                             'version': version,
+                             'num_classes': len(engine.class_names), 'batching': engine.stats()}
+                elif message.get('op') == 'classes':
+                    reply = {'version': version, 'class_names': list(engine.class_names)}
+                elif message.get('op') == 'predict':
+                    topk = int(message.get('topk', 5))
+                    embed = bool(message.get('embeddings'))
+                    futures = [engine.submit_tensor(tensor_from_array(np.ascontiguousarray(arr)), topk=topk,
+                                                    return_embedding=embed)
+                               for arr in message['images']]
+                    results = [f.result() for f in futures]
+                    if embed:
+                        reply = {'predictions': [r[0] for r in results], 'embeddings': [r[1] for r in results]}
+                    else:
+                        reply = {'predictions': results}
+                else:
+                    reply = {'error': f"unknown op {message.get('op')!r}"}
+            except Exception as e:
+                reply = {'error': str(e)}
+
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+def _worker(listener, model, class_names, device, checkpoint_path, version, profile, max_batch_size, max_wait_ms):
+    """Accept loop of one inference process; each connection gets its own thread"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    apply_profile(profile)
+    engine = BatchingEngine(model, class_names, device, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            return
+        except Exception as e:
+            # Failed authentication or a client that hung up during the handshake
+            print(f"Inference worker {os.getpid()}: rejected connection: {e}")
+            continue
+        threading.Thread(target=_handle_connection, args=(conn, engine, checkpoint_path, version), daemon=True).start()
+
+
+def serve(socket_path=DEFAULT_SOCKET, checkpoint_path=DEFAULT_CHECKPOINT, processes=2, threads=None,
+          authkey=None, max_batch_size=8, max_wait_ms=5.0, quantize=None, calibration_dir=None,
+          cascade_checkpoint=None, cascade_threshold=0.8, profile_path=None, artifact='mmap'):
+    """Load the model once, fork the worker pool and block until terminated"""
+    if not authkey:
+        raise ValueError("The inference server needs an authkey (INFERENCE_AUTHKEY) shared with its clients")
+    profile = load_profile(profile_path, threads=threads)
+    profile['threads'] = profile['threads'] or default_threads(processes)
+    if quantize and profile['autocast_bf16']:
+        print("Ignoring bfloat16 autocast from the inference profile: quantization is enabled")
+        profile['autocast_bf16'] = False
+    model, class_names, device = load_model(checkpoint_path, device=torch.device('cpu'),
+                                            quantize=quantize, calibration_dir=calibration_dir,
+                                            artifact=None if artifact == 'checkpoint' else artifact)
+    if cascade_checkpoint:
+        model = load_cascade(cascade_checkpoint, model, class_names, device, threshold=cascade_threshold)
+    model = apply_profile(profile, model)
+    # Forked workers map the same pages instead of holding private copies
+    if isinstance(model, torch.nn.Module):
+        model.share_memory()
+    version = file_version(checkpoint_path) + (f"-{quantize}" if quantize else '')
+    if cascade_checkpoint:
+        version += f"-cascade-{file_version(cascade_checkpoint)}-{cascade_threshold}"
+    print(f"Model loaded successfully with {len(class_names)} classes")
+
+    os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    # Created with owner/group access only, so there is no window before a chmod
+    umask = os.umask(0o117)
+    try:
+        listener = Listener(socket_path, family='AF_UNIX', authkey=authkey)
+    finally:
+        os.umask(umask)
+
+    ctx = multiprocessing.get_context('fork')
+    worker_args = (listener, model, class_names, device, checkpoint_path, version,
+                   profile, max_batch_size, max_wait_ms)
+    workers = []
+    for _ in range(processes):
+        proc = ctx.Process(target=_worker, args=worker_args, daemon=True)
+        proc.start()
+        workers.append(proc)
+    print(f"Inference server listening on {socket_path} with {processes} processes x {profile['threads']} threads")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        while not stop.wait(1.0):
+            for i, proc in enumerate(workers):
+                if not proc.is_alive():
+                    print(f"Inference worker {proc.pid} exited with {proc.exitcode}, restarting")
+                    workers[i] = ctx.Process(target=_worker, args=worker_args, daemon=True)
+                    workers[i].start()
+    finally:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.join(5)
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the food classification inference service")
+    parser.add_argument('--socket', default=os.environ.get('INFERENCE_SOCKET', DEFAULT_SOCKET))
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('INFERENCE_PROCESSES', 2)))
+    parser.add_argument('--threads', type=int, default=None, help="torch threads per process (overrides the profile)")
+    parser.add_argument('--profile', default=os.environ.get('INFERENCE_PROFILE', os.path.join(BASE_DIR, 'instance', 'inference_profile.json')),
+                        help="inference profile written by inference_profile.py autotune")
+    parser.add_argument('--max-batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--artifact', default=os.environ.get('MODEL_ARTIFACT', 'mmap'),
+                        choices=('mmap', 'checkpoint', 'torchscript', 'onnx', 'auto'),
+                        help="model file to load; TorchScript/ONNX exports return no embeddings (similar meals)")
+    parser.add_argument('--quantize', choices=('dynamic', 'static'), default=os.environ.get('INFERENCE_QUANTIZATION') or None)
+    parser.add_argument('--calibration-dir', default=os.path.join(BASE_DIR, 'static', 'uploads'))
+    parser.add_argument('--cascade-checkpoint', default=os.environ.get('CASCADE_CHECKPOINT'))
+    parser.add_argument('--cascade-threshold', type=float, default=float(os.environ.get('CASCADE_THRESHOLD', 0.8)))
+    args = parser.parse_args()
+
+    if not os.environ.get('INFERENCE_AUTHKEY'):
+        raise SystemExit("Set INFERENCE_AUTHKEY to a random secret shared with the web app, e.g.\n"
+                         "  export INFERENCE_AUTHKEY=$(python -c 'import secrets; print(secrets.token_hex(32))')")
+    serve(socket_path=args.socket, checkpoint_path=args.checkpoint, processes=args.processes,
+          threads=args.threads, authkey=os.environ.get('INFERENCE_AUTHKEY'),
+          max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+          quantize=args.quantize, calibration_dir=args.calibration_dir,
+          cascade_checkpoint=args.cascade_checkpoint, cascade_threshold=args.cascade_threshold,
+          profile_path=args.profile, artifact=args.artifact)
+
+
+if __name__ == '__main__':
+    main()
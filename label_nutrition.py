@@ -0,0 +1,155 @@
+"""
+Classifier label -> nutrition record table.
+
+Built once per loaded model from its class names, so the predictions shown
+for an upload carry their nutrition and accepting one is a dict lookup. A
+label is mapped by the first rule that applies:
+
+    override  its entry in the overrides file: a NUTRITION_DB name, a full
+              record ({"calories", "protein", "carbs", "fats", "serving",
+              optionally "name"}), or null to leave it unmapped
+    estimate  a full record marked "estimate": true -- a hand-estimated
+              value with no cited source, listed separately so it can be
+              audited and replaced by a sourced one
+    exact     the normalised label is a catalog name ("hot_dog" -> "hot dog")
+    tokens    the same words once plurals are folded ("french_fry" -> "french fries")
+
+Anything else stays unmapped instead of being matched to the closest
+catalog word ("chicken_curry" is not "chicken"); list those with
+    python label_nutrition.py --checkpoint model.pth
+and add them to the overrides file.
+"""
+import argparse
+import json
+import os
+
+from food_search import normalize
+
+RECORD_FIELDS = ('calories', 'protein', 'carbs', 'fats', 'serving')
+
+
+def fold(word):
+    """Crude singular form, enough to match "fries"/"fry" and "cakes"/"cake\""""
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def token_key(name):
+    return frozenset(fold(word) for word in normalize(name).split())
+
+
+def load_overrides(path):
+    """Label -> override from a JSON file; {} when the file does not exist"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class LabelNutritionMap:
+    """
+    Args:
+        class_names: Labels the model predicts
+        foods: Catalog of name -> nutrition record (NUTRITION_DB)
+        overrides: Label -> override, see the module docstring
+    """
+
+    def __init__(self, class_names, foods, overrides=None):
+        self.foods = foods
+        self.overrides = overrides or {}
+        self._exact = {normalize(name): name for name in foods}
+        self._tokens = {}
+        for name in foods:
+            self._tokens.setdefault(token_key(name), name)
+        self.entries = {}
+        for label in class_names:
+            self.add(label)
+
+    def _resolve(self, label):
+        """(record with 'name', rule) for a label, or (None, reason)"""
+        if label in self.overrides:
+            override = self.overrides[label]
+            if override is None:
+                return None, 'override'
+            if isinstance(override, str):
+                if override not in self.foods:
+                    print(f"Ignoring nutrition override {label} -> {override!r}: not in NUTRITION_DB")
+                    return None, 'bad override'
+                return {'name': override, **self.foods[override]}, 'override'
+            missing = [field for field in RECORD_FIELDS if field not in override]
+            if missing:
+                print(f"Ignoring nutrition override for {label}: missing {', '.join(missing)}")
+                return None, 'bad override'
+            rule = 'estimate' if override.get('estimate') else 'override'
+            return dict(override, name=override.get('name', normalize(label))), rule
+
+        name = self._exact.get(normalize(label))
+        if name is not None:
+            return {'name': name, **self.foods[name]}, 'exact'
+        name = self._tokens.get(token_key(label))
+        if name is not None:
+            return {'name': name, **self.foods[name]}, 'tokens'
+        return None, 'no match'
+
+    def add(self, label):
+        """Map a label (once; later calls are lookups)"""
+        if label not in self.entries:
+            self.entries[label] = self._resolve(label)
+        return self.entries[label][0]
+
+    def __contains__(self, label):
+        return label in self.entries
+
+    def get(self, label):
+        """The nutrition record (with 'name') for a known label, or None"""
+        entry = self.entries.get(label)
+        return entry[0] if entry else None
+
+    def for_predictions(self, predictions):
+        """Label -> record (or None) for a list of (label, probability) predictions"""
+        return {label: self.add(label) for label, _ in predictions}
+
+    def report(self):
+        rules = {}
+        for record, rule in self.entries.values():
+            if record is not None:
+                rules[rule] = rules.get(rule, 0) + 1
+        unmapped = sorted(label for label, (record, _) in self.entries.items() if record is None)
+        return {
+            'classes': len(self.entries),
+            'mapped': len(self.entries) - len(unmapped),
+            'by_rule': rules,
+            'unmapped': unmapped,
+        }
+
+
+def main():
+    from nutrition_data import NUTRITION_DB
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Show how a model's class labels map to NUTRITION_DB")
+    parser.add_argument('--checkpoint', default=os.path.join(base_dir, 'food101_model_for_inference (1).pth'))
+    parser.add_argument('--overrides', default=os.environ.get('LABEL_NUTRITION_OVERRIDES',
+                                                              os.path.join(base_dir, 'label_nutrition_overrides.json')))
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    import torch
+    checkpoint = torch.load(args.checkpoint, map_location='cpu', weights_only=False)
+    labels = LabelNutritionMap(checkpoint['class_names'], NUTRITION_DB, overrides=load_overrides(args.overrides))
+    report = labels.report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for label, (record, rule) in sorted(labels.entries.items()):
+        target = f"{record['name']} ({record['calories']} kcal / {record['serving']})" if record else '-'
+        print(f"{label:<28} {rule:<12} {target}")
+    print(f"{report['mapped']}/{report['classes']} classes mapped {report['by_rule']}; "
+          f"{len(report['unmapped'])} unmapped")
+
+
+if __name__ == '__main__':
+    main()
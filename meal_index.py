@@ -0,0 +1,163 @@
+"""
+Per-user index of food image embeddings for "similar past meals".
+
+Every classified upload contributes the classifier's pooled feature vector
+(L2-normalized, stored as float16: 4 KB per image), keyed by the upload's
+filename. Finding a user's past meals that look like a new photo is then a
+single matrix-vector product over their embeddings.
+
+Each user has two append-only files, <user>.f16 (raw embedding rows) and
+<user>.keys (one filename per line), so adding an upload costs one small
+write. Web workers reload a user's index when the files have changed
+(inode, size or mtime), under a shared lock so they never see one file
+compacted and the other not. The in-memory copy is float32, since
+converting float16 on every search costs more than the BLAS matrix-vector
+product itself.
+"""
+import fcntl
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class MealEmbeddingIndex:
+    """
+    Args:
+        directory: Where the per-user files live
+        dim: Embedding size (2048 for the ResNet50 FoodClassifier)
+        max_per_user: Oldest entries beyond this are dropped on the next add
+        max_cached_embeddings: Embeddings kept in memory across users (LRU by
+            user; 20000 x 2048 float32 is ~160 MB)
+    """
+
+    def __init__(self, directory, dim=2048, max_per_user=2000, max_cached_embeddings=20000):
+        self.directory = directory
+        self.dim = dim
+        self.max_per_user = max_per_user
+        self.max_cached_embeddings = max_cached_embeddings
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.searches = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, user_id):
+        base = os.path.join(self.directory, str(int(user_id)))
+        return base + '.f16', base + '.keys', base + '.lock'
+
+    @staticmethod
+    def _signature(path):
+        # Appends change size and mtime, compaction replaces the file (new inode)
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self, user_id):
+        """(embeddings, keys) for a user, re-read only if another process changed the files since"""
+        vectors_path, keys_path, lock_path = self._paths(user_id)
+        try:
+            signature = self._signature(vectors_path)
+        except OSError:
+            return None, []
+
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(user_id)
+                return cached[1], cached[2]
+
+        # Shared with other readers, excluded from add(): both files are read in the same state
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            signature = self._signature(vectors_path)
+            with open(keys_path) as f:
+                keys = f.read().splitlines()
+            embeddings = np.fromfile(vectors_path, dtype=np.float16)
+        # A crash between the two appends can leave one file a row ahead
+        rows = min(len(keys), embeddings.size // self.dim)
+        embeddings = embeddings[:rows * self.dim].reshape(rows, self.dim).astype(np.float32)
+        keys = keys[:rows]
+
+        with self._lock:
+            self._cache[user_id] = (signature, embeddings, keys)
+            self._cache.move_to_end(user_id)
+            cached = sum(len(entry[2]) for entry in self._cache.values())
+            while cached > self.max_cached_embeddings and len(self._cache) > 1:
+                cached -= len(self._cache.popitem(last=False)[1][2])
+        return embeddings, keys
+
+    def add(self, user_id, key, embedding):
+        """Remember the embedding of an upload (``key`` is its filename, matching FoodLog.image_path)"""
+        embedding = np.asarray(embedding, dtype=np.float16).reshape(-1)
+        if embedding.size != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d embedding, got {embedding.size}")
+        if '\n' in key:
+            raise ValueError("Index keys must be single-line filenames")
+        vectors_path, keys_path, lock_path = self._paths(user_id)
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(vectors_path, 'ab') as f:
+                f.write(embedding.tobytes())
+            with open(keys_path, 'a') as f:
+                f.write(key + '\n')
+            if os.path.getsize(vectors_path) > 2 * self.dim * self.max_per_user * 1.25:
+                self._compact(user_id)
+
+    def _compact(self, user_id):
+        """Keep the newest max_per_user entries (called with the user's lock held)"""
+        vectors_path, keys_path, _ = self._paths(user_id)
+        with open(keys_path) as f:
+            keys = f.read().splitlines()
+        embeddings = np.fromfile(vectors_path, dtype=np.float16)
+        rows = min(len(keys), embeddings.size // self.dim)
+        keep = slice(max(0, rows - self.max_per_user), rows)
+        embeddings = embeddings[:rows * self.dim].reshape(rows, self.dim)[keep]
+        for path, data in ((vectors_path, embeddings.tobytes()), (keys_path, ''.join(k + '\n' for k in keys[keep]))):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb' if isinstance(data, bytes) else 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    def get(self, user_id, key):
+        """Embedding stored for an upload, or None"""
+        embeddings, keys = self._load(user_id)
+        for i in range(len(keys) - 1, -1, -1):
+            if keys[i] == key:
+                return embeddings[i]
+        return None
+
+    def search(self, user_id, embedding, k=5, exclude=(), min_similarity=0.0):
+        """
+        A user's most similar past uploads by cosine similarity.
+
+        Returns:
+            Up to ``k`` (key, similarity) pairs, most similar first, one per key
+        """
+        embeddings, keys = self._load(user_id)
+        if not keys:
+            return []
+        self.searches += 1
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        similarities = embeddings @ query
+
+        # Only sort the candidates that could make the top k
+        candidates = min(len(keys), k + len(exclude) + 8)
+        order = np.argpartition(-similarities, candidates - 1)[:candidates]
+        order = order[np.argsort(-similarities[order])]
+        results = []
+        seen = set(exclude)
+        for i in order:
+            if similarities[i] < min_similarity:
+                break
+            if keys[i] in seen:
+                continue
+            seen.add(keys[i])
+            results.append((keys[i], float(similarities[i])))
+            if len(results) == k:
+                break
+        return results
+
+    def stats(self):
+        with self._lock:
+            cached = sum(len(keys) for _, _, keys in self._cache.values())
+        return {'users_cached': len(self._cache), 'embeddings_cached': cached, 'searches': self.searches}
@@ -0,0 +1,119 @@
+"""
+Per-process memory figures from /proc (Linux only).
+
+Run with a gunicorn master's pid to see what each worker holds privately
+(USS) versus shares with the master and its siblings:
+    python memory_stats.py $(cat gunicorn.pid)
+"""
+import argparse
+import os
+
+
+def memory_usage(pid='self'):
+    """
+    RSS, PSS and USS of a process in MB.
+
+    USS (Private_Clean + Private_Dirty) is the memory that would be freed if
+    the process exited; pages shared with other workers only count in RSS,
+    and proportionally in PSS.
+    """
+    fields = {}
+    path = f'/proc/{pid}/smaps_rollup'
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    else:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    fields['Rss'] = int(line.split()[1])
+
+    def to_mb(kb):
+        return round(kb / 1024.0, 1)
+
+    return {
+        'rss_mb': to_mb(fields.get('Rss', 0)),
+        'pss_mb': to_mb(fields.get('Pss', 0)),
+        'uss_mb': to_mb(fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)),
+    }
+
+
+def peak_rss_mb():
+    """Peak RSS (VmHWM) of this process in MB since start or the last reset_peak_rss()"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def reset_peak_rss():
+    """Restart peak RSS tracking at the current RSS (Linux >= 4.0); False if unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def child_pids(pid):
+    """Pids of the direct children of ``pid``"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The parent pid is the second field after the parenthesised command name
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def worker_report(master_pid):
+    """
+    Memory of a pre-forking server: the master and each worker, and totals
+
+    Returns:
+        Dict with 'processes' (pid, role, rss/pss/uss MB) and 'total'. The
+        total USS plus the shared part of PSS is what the server really uses;
+        the sum of RSS counts every shared page once per process.
+    """
+    processes = [dict(memory_usage(master_pid), pid=master_pid, role='master')]
+    processes += [dict(memory_usage(pid), pid=pid, role='worker') for pid in child_pids(master_pid)]
+    total = {key: round(sum(p[key] for p in processes), 1) for key in ('rss_mb', 'pss_mb', 'uss_mb')}
+    # PSS sums to the real footprint; whatever is not private is shared between the processes
+    total['shared_mb'] = round(total['pss_mb'] - total['uss_mb'], 1)
+    return {'processes': processes, 'total': total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory of a pre-forking server such as gunicorn")
+    parser.add_argument('pid', type=int, help="pid of the master process")
+    args = parser.parse_args()
+
+    report = worker_report(args.pid)
+    print(f"{'pid':>8} {'role':<7} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9} {'shared MB':>10}")
+    for p in report['processes']:
+        print(f"{p['pid']:>8} {p['role']:<7} {p['rss_mb']:>9.1f} {p['pss_mb']:>9.1f} {p['uss_mb']:>9.1f} "
+              f"{p['rss_mb'] - p['uss_mb']:>10.1f}")
+    total = report['total']
+    print(f"{'total':>8} {'':<7} {total['rss_mb']:>9.1f} {total['pss_mb']:>9.1f} {total['uss_mb']:>9.1f} "
+          f"{total['shared_mb']:>10.1f}")
+    print(f"Real footprint (PSS) {total['pss_mb']:.1f} MB, {total['shared_mb']:.1f} MB of it shared; "
+          f"summing RSS would claim {total['rss_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
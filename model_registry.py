@@ -0,0 +1,299 @@
+"""
+Hot-swappable model registry.
+
+Watches a models directory for checkpoints and serves the newest one (or the
+one named in the directory's ACTIVE file). A new checkpoint is loaded and
+warmed up with a few dummy forward passes in a background thread, then
+swapped in with a single reference assignment. Requests that already hold
+the old version finish on it, and it is kept loaded so a rollback is instant.
+
+The first version is loaded the same way, so a web worker can serve
+requests that do not need the model while it is still loading; ``state``
+says whether it is loading, ready or failed. A first load that failed is
+retried every poll interval, with or without a models directory. torch and models.py are only
+imported by the loader and warm-up, i.e. in that background thread.
+
+Deploy by copying the checkpoint into the directory under a temporary name
+and renaming it to *.pth. Roll back every worker with:
+    python model_registry.py rollback --models-dir models/
+"""
+import argparse
+import atexit
+import glob
+import os
+import threading
+import time
+
+from prediction_cache import file_version
+from preprocessing import CROP_SIZE
+
+ACTIVE_FILE = 'ACTIVE'
+CHECKPOINT_PATTERN = '*.pth'
+
+
+class ModelVersion:
+    """One loaded checkpoint with everything needed to serve predictions from it"""
+
+    def __init__(self, path, model, class_names, device, version, engine=None, label_map=None):
+        self.path = path
+        self.model = model
+        self.class_names = class_names
+        self.device = device
+        self.version = version
+        self.engine = engine
+        # label_nutrition.LabelNutritionMap for class_names
+        self.label_map = label_map
+        self.file_key = file_version(path)
+        self.loaded_at = time.time()
+
+    def info(self):
+        return {
+            'version': self.version,
+            'path': self.path,
+            'num_classes': len(self.class_names),
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at)),
+        }
+
+
+def wanted_checkpoint(models_dir):
+    """Checkpoint the directory asks for: the ACTIVE file's choice, else the newest *.pth"""
+    active_path = os.path.join(models_dir, ACTIVE_FILE)
+    if os.path.exists(active_path):
+        with open(active_path) as f:
+            name = f.read().strip()
+        path = os.path.join(models_dir, name)
+        if name and os.path.exists(path):
+            return path
+        print(f"{active_path} names missing checkpoint {name!r}, using the newest one")
+    paths = glob.glob(os.path.join(models_dir, CHECKPOINT_PATTERN))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def pin_checkpoint(models_dir, path):
+    """Make every registry watching ``models_dir`` serve ``path``"""
+    active_path = os.path.join(models_dir, ACTIVE_FILE)
+    tmp_path = f"{active_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(os.path.basename(path) + '\n')
+    os.replace(tmp_path, active_path)
+
+
+class ModelRegistry:
+    """
+    Args:
+        loader: Callable taking a checkpoint path and returning a ModelVersion
+        models_dir: Directory to watch, or None to serve ``default_path`` only
+        default_path: Checkpoint used while ``models_dir`` has none
+        warmup_runs: Dummy forward passes before a new version takes traffic
+        poll_interval: Seconds between directory checks (and between retries
+            of a default checkpoint that failed to load); 0 disables polling
+    """
+
+    def __init__(self, loader, models_dir=None, default_path=None, warmup_runs=2, poll_interval=10.0):
+        self.loader = loader
+        self.models_dir = models_dir
+        self.default_path = default_path
+        self.warmup_runs = warmup_runs
+        self.poll_interval = poll_interval
+        self.swaps = 0
+        self.state = 'idle'  # idle -> loading -> ready | failed
+        self.error = None
+        self.ready_at = None  # wall-clock time the first version started serving
+        self._ready = threading.Event()
+        self._current = None
+        self._previous = None
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        atexit.register(self._finish_loading)
+
+    def current(self):
+        """The ModelVersion serving requests (None until loaded); hold on to it for the whole request"""
+        self.start()
+        return self._current
+
+    def ready(self):
+        return self._current is not None
+
+    def retrying(self):
+        """Whether a failed first load is retried (by polling) without a restart"""
+        return self.poll_interval > 0
+
+    def wait_ready(self, timeout=None):
+        """Block until a version is serving; False on timeout or if loading failed"""
+        self.start()
+        self._ready.wait(timeout)
+        return self.ready()
+
+    def start(self):
+        """
+        Load and warm up the first version in a background thread, which then
+        keeps watching the models directory. Safe to call on every request.
+        """
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher is None or self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                self._watcher = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+                self._watcher.start()
+
+    def _finish_loading(self):
+        # A daemon thread killed inside torch's C++ code at interpreter exit aborts the process
+        if self.state == 'loading' and self._watcher_pid == os.getpid():
+            self._ready.wait(60)
+
+    def _watch(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Model registry refresh failed: {e}")
+        if self.poll_interval <= 0:
+            return
+        # Without a models directory only a missing or broken default checkpoint needs polling
+        while self.models_dir is not None or self._current is None:
+            time.sleep(self.poll_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Model registry refresh failed: {e}")
+
+    def warm_up(self, entry):
+        """Run dummy batches so lazy initialisation does not land on the first real requests"""
+        import torch
+        from models import predict_tensors
+        batch_sizes = [1]
+        if entry.engine is not None and entry.engine.max_batch_size > 1:
+            batch_sizes.append(entry.engine.max_batch_size)
+        for batch_size in batch_sizes:
+            dummy = torch.zeros(batch_size, 3, CROP_SIZE, CROP_SIZE)
+            for _ in range(self.warmup_runs):
+                predict_tensors(entry.model, dummy, entry.class_names, entry.device)
+
+    def refresh(self):
+        """
+        Serve the checkpoint the models directory asks for, loading and warming
+        it first if needed. Returns True when the active version changed.
+        """
+        with self._refresh_lock:
+            path = wanted_checkpoint(self.models_dir) if self.models_dir else None
+            path = path or self.default_path
+            if path is None:
+                self._set_failed("No model checkpoint configured")
+                return False
+            try:
+                key = file_version(path)
+            except OSError as e:
+                # Missing or unreadable; the poller picks it up once it appears
+                print(f"Model checkpoint {path} unavailable: {e}")
+                self._set_failed(f"Model checkpoint {os.path.basename(path)} unavailable: {e.strerror or e}")
+                return False
+            current, previous = self._current, self._previous
+            if current is not None and current.path == path and current.file_key == key:
+                return False
+            if previous is not None and previous.path == path and previous.file_key == key:
+                self._swap(previous)
+                print(f"Switched back to model {previous.version}")
+                return True
+            if key in self._failed:
+                return False
+
+            if current is None:
+                self.state = 'loading'
+            began = time.perf_counter()
+            try:
+                entry = self.loader(path)
+                self.warm_up(entry)
+            except Exception as e:
+                # A checkpoint still being copied changes key, so it is retried once complete
+                self._failed.add(key)
+                print(f"Loading model {path} failed: {e}")
+                self._set_failed(f"Loading {os.path.basename(path)} failed: {e}")
+                return False
+            self._swap(entry)
+            print(f"Serving model {entry.version} from {path} "
+                  f"(loaded and warmed up in {time.perf_counter() - began:.1f} s)")
+            return True
+
+    def _swap(self, entry):
+        with self._lock:
+            dropped = self._previous if self._previous is not entry else None
+            self._previous = self._current
+            self._current = entry
+            self.swaps += 1
+            self.state = 'ready'
+            self.error = None
+            if self.ready_at is None:
+                self.ready_at = time.time()
+        self._ready.set()
+        # Its requests finished long ago; close() still drains anything queued
+        if dropped is not None and dropped.engine is not None:
+            dropped.engine.close()
+
+    def _set_failed(self, error):
+        # A failed update leaves the serving version alone
+        if self._current is None:
+            self.state = 'failed'
+            self.error = error
+            self._ready.set()
+
+    def rollback(self):
+        """Switch back to the previous version (and pin it for the other workers)"""
+        previous = self._previous
+        if previous is None:
+            raise ValueError("No previous model version to roll back to")
+        if self.models_dir:
+            pin_checkpoint(self.models_dir, previous.path)
+        with self._refresh_lock:
+            self._swap(previous)
+        return previous
+
+    def stats(self):
+        current, previous = self._current, self._previous
+        return {
+            'state': self.state,
+            'error': self.error,
+            'ready_at': self.ready_at,
+            'current': current.info() if current else None,
+            'previous': previous.info() if previous else None,
+            'swaps': self.swaps,
+            'models_dir': self.models_dir,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or roll back the model served from a models directory")
+    parser.add_argument('command', choices=['status', 'rollback', 'pin', 'unpin'])
+    parser.add_argument('checkpoint', nargs='?', help="checkpoint file name for 'pin'")
+    parser.add_argument('--models-dir', required=True)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.models_dir, CHECKPOINT_PATTERN)), key=os.path.getmtime)
+    wanted = wanted_checkpoint(args.models_dir)
+    if args.command == 'rollback':
+        # The version served before the current one is the next older checkpoint
+        if wanted not in paths or paths.index(wanted) == 0:
+            raise SystemExit("No older checkpoint to roll back to")
+        pin_checkpoint(args.models_dir, paths[paths.index(wanted) - 1])
+    elif args.command == 'pin':
+        if not args.checkpoint or not os.path.exists(os.path.join(args.models_dir, args.checkpoint)):
+            raise SystemExit("pin needs the name of a checkpoint in the models directory")
+        pin_checkpoint(args.models_dir, args.checkpoint)
+    elif args.command == 'unpin':
+        active_path = os.path.join(args.models_dir, ACTIVE_FILE)
+        if os.path.exists(active_path):
+            os.remove(active_path)
+
+    wanted = wanted_checkpoint(args.models_dir)
+    for path in paths:
+        marker = '*' if path == wanted else ' '
+        print(f"{marker} {os.path.basename(path)}  {file_version(path)}  "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(os.path.getmtime(path)))}")
+    print("Workers pick up changes within their poll interval.")
+
+
+if __name__ == '__main__':
+    main()
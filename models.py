@@ -1,11 +1,16 @@
 # models.py
+import json
+import os
+import threading
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torchvision.models as models
-import torchvision.transforms as transforms
 from PIL import Image
 
+from preprocessing import CROP_SIZE, MEAN, RESIZE_SIZE, STD, prepare_array, resize_for_crop
+
 class FoodClassifier(nn.Module):
     """ResNet50-based food classifier"""
     def __init__(self, num_classes=101):
@@ -20,40 +25,343 @@ class FoodClassifier(nn.Module):
     def forward(self, x):
         return self.resnet(x)
 
-def preprocess_image(image_pil):
-    """Preprocess PIL image for model inference"""
-    transform = transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        )
-    ])
-    return transform(image_pil).unsqueeze(0)
+class LightFoodClassifier(nn.Module):
+    """Small first-stage classifier (ResNet18 or MobileNetV3) over the same classes"""
+    ARCHITECTURES = ('resnet18', 'mobilenet_v3_large', 'mobilenet_v3_small')
+    
+    def __init__(self, num_classes=101, arch='mobilenet_v3_large'):
+        super(LightFoodClassifier, self).__init__()
+        if arch not in self.ARCHITECTURES:
+            raise ValueError(f"Unknown architecture {arch!r}, expected one of {self.ARCHITECTURES}")
+        self.arch = arch
+        self.backbone = getattr(models, arch)(weights=None)
+        if arch == 'resnet18':
+            in_features = self.backbone.fc.in_features
+            self.backbone.fc = nn.Sequential(
+                nn.Dropout(0.5),
+                nn.Linear(in_features, num_classes)
+            )
+        else:
+            in_features = self.backbone.classifier[-1].in_features
+            self.backbone.classifier[-1] = nn.Linear(in_features, num_classes)
+    
+    def forward(self, x):
+        return self.backbone(x)
+
+class CascadeClassifier(nn.Module):
+    """
+    Two-stage cascade with confidence-based early exit
+    
+    Every image goes through the light model first; only rows whose top-1
+    softmax confidence is below ``threshold`` are sent to the large model,
+    whose logits then replace the light ones. The output has the same shape
+    as a single model's, so predict_tensors and the batching engine work
+    unchanged.
+    """
+    def __init__(self, light_model, large_model, threshold=0.8):
+        super(CascadeClassifier, self).__init__()
+        self.light_model = light_model
+        self.large_model = large_model
+        self.threshold = threshold
+        self.images = 0
+        self.escalated = 0
+    
+    def forward(self, x):
+        logits = self.light_model(x)
+        confidence = F.softmax(logits, dim=1).max(dim=1).values
+        escalate = confidence < self.threshold
+        
+        self.images += x.shape[0]
+        if escalate.any():
+            self.escalated += int(escalate.sum())
+            logits = logits.clone()
+            logits[escalate] = self.large_model(x[escalate]).to(logits.dtype)
+        return logits
+    
+    def stats(self):
+        return {
+            'threshold': self.threshold,
+            'images': self.images,
+            'escalated': self.escalated,
+            'escalation_rate': round(self.escalated / self.images, 3) if self.images else 0.0,
+        }
+
+class ImagePreprocessor:
+    """
+    Reusable decode -> resize -> crop -> normalize pipeline
+    
+    The mean/std normalization is folded into a per-channel scale and bias
+    computed once, so turning the uint8 crop into model input is a single
+    fused multiply-add (x * scale + bias) instead of ToTensor + Normalize.
+    """
+    def __init__(self, resize=RESIZE_SIZE, crop=CROP_SIZE, mean=MEAN, std=STD, draft=True):
+        self.resize = resize
+        self.crop = crop
+        self.draft = draft
+        mean = torch.tensor(mean, dtype=torch.float32).view(3, 1, 1)
+        std = torch.tensor(std, dtype=torch.float32).view(3, 1, 1)
+        self.scale = 1.0 / (255.0 * std)
+        self.bias = -mean / std
+    
+    def normalize(self, image_array, out=None):
+        """Turn an HxWx3 uint8 array into a normalized (3, H, W) float tensor, optionally in place into ``out``"""
+        pixels = torch.from_numpy(image_array).permute(2, 0, 1)
+        if out is None:
+            out = torch.empty(pixels.shape, dtype=torch.float32)
+        return torch.addcmul(self.bias, pixels, self.scale, out=out)
+    
+    def __call__(self, image, out=None):
+        """
+        Preprocess one image
+        
+        Args:
+            image: PIL Image or raw encoded image bytes
+            out: Optional preallocated (3, crop, crop) tensor, e.g. a row of a batch
+        
+        Returns:
+            A (1, 3, crop, crop) tensor, or ``out`` when it was given
+        """
+        image_array = prepare_array(image, resize=self.resize, crop=self.crop, draft=self.draft)
+        if out is not None:
+            return self.normalize(image_array, out=out)
+        return self.normalize(image_array).unsqueeze(0)
+
+_preprocessor = ImagePreprocessor()
+_preprocessors = {CROP_SIZE: _preprocessor}
+
+def preprocess_image(image_pil, crop_size=CROP_SIZE):
+    """Preprocess PIL image (or raw image bytes) for model inference"""
+    preprocessor = _preprocessors.get(crop_size)
+    if preprocessor is None:
+        preprocessor = _preprocessors.setdefault(crop_size, ImagePreprocessor(resize=resize_for_crop(crop_size), crop=crop_size))
+    return preprocessor(image_pil)
+
+def tensor_from_array(image_array):
+    """Normalize an already resized and cropped HxWx3 uint8 array into a (1, 3, H, W) tensor"""
+    return _preprocessor.normalize(image_array).unsqueeze(0)
+
+def artifact_paths(checkpoint_path):
+    """Paths of the exported artifacts (see export_model.py) that sit next to a checkpoint"""
+    base = os.path.splitext(checkpoint_path)[0]
+    return {
+        'torchscript': base + '.torchscript.pt',
+        'onnx': base + '.onnx',
+        'mmap': base + '.flat.pt',
+        'classes': base + '.classes.json',
+    }
+
+def _is_fresh(artifact_path, checkpoint_path):
+    """An artifact is usable if it exists and is not older than its checkpoint"""
+    if not os.path.exists(artifact_path):
+        return False
+    if not os.path.exists(checkpoint_path):
+        return True
+    return os.path.getmtime(artifact_path) >= os.path.getmtime(checkpoint_path)
+
+class OnnxFoodClassifier:
+    """Runs an exported ONNX model with onnxruntime, called like the torch model"""
+    def __init__(self, path):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'class_names' not in metadata:
+            raise ValueError(f"ONNX model {path} has no 'class_names' metadata")
+        self.class_names = json.loads(metadata['class_names'])
+    
+    def __call__(self, x):
+        outputs = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+    
+    def eval(self):
+        return self
 
-def load_model(checkpoint_path='food101_model_for_inference (1).pth', device=None):
-    """Load trained model from checkpoint"""
+def load_artifact(checkpoint_path, device, artifact='auto'):
+    """
+    Load an exported artifact instead of the pickled checkpoint
+    
+    Args:
+        checkpoint_path: Checkpoint the artifacts were exported from
+        device: torch device; artifacts are optimized for CPU only
+        artifact: 'auto' (TorchScript, then ONNX), 'torchscript' or 'onnx'
+    
+    Returns:
+        (model, class_names), or None when no usable artifact exists
+    """
+    if device.type != 'cpu':
+        return None
+    paths = artifact_paths(checkpoint_path)
+    
+    if artifact in ('auto', 'torchscript') and _is_fresh(paths['torchscript'], checkpoint_path):
+        extra_files = {'class_names.json': ''}
+        model = torch.jit.load(paths['torchscript'], map_location=device, _extra_files=extra_files)
+        model = torch.jit.optimize_for_inference(model)
+        return model, json.loads(extra_files['class_names.json'])
+    
+    if artifact in ('auto', 'onnx') and _is_fresh(paths['onnx'], checkpoint_path):
+        try:
+            model = OnnxFoodClassifier(paths['onnx'])
+        except ImportError:
+            if artifact == 'onnx':
+                raise
+            return None
+        return model, model.class_names
+    
+    return None
+
+def load_mmap_weights(checkpoint_path, device):
+    """
+    Build the model on top of the memory-mapped flat weights file
+    
+    The tensors alias the file's pages (torch.load(mmap=True) plus
+    load_state_dict(assign=True)), so several worker processes share one copy
+    of the weights through the page cache and startup does not copy them.
+    
+    Returns:
+        (model, class_names), or None when no fresh flat weights file exists
+    """
+    paths = artifact_paths(checkpoint_path)
+    if not (_is_fresh(paths['mmap'], checkpoint_path) and _is_fresh(paths['classes'], checkpoint_path)):
+        return None
+    
+    with open(paths['classes']) as f:
+        class_names = json.load(f)
+    state_dict = torch.load(paths['mmap'], map_location='cpu', mmap=True, weights_only=True)
+    
+    # Parameters are allocated on the meta device, so no memory or random
+    # initialisation is spent on weights that are replaced right away
+    with torch.device('meta'):
+        model = FoodClassifier(num_classes=len(class_names))
+    model.load_state_dict(state_dict, assign=True)
+    model = model.to(device)
+    model.eval()
+    return model, class_names
+
+def load_model(checkpoint_path='food101_model_for_inference (1).pth', device=None, quantize=None, calibration_dir=None,
+               artifact='mmap'):
+    """
+    Load trained model from checkpoint
+    
+    Args:
+        checkpoint_path: Path to the .pth checkpoint
+        device: torch device (defaults to CUDA when available)
+        quantize: None, 'dynamic' or 'static' for an INT8 CPU model (see quantization.py)
+        calibration_dir: Directory of images used to calibrate 'static' quantization
+        artifact: Prefer an exported artifact next to the checkpoint ('auto',
+            'torchscript', 'onnx', 'mmap'), or None to always use the checkpoint.
+            'mmap' (the default) uses the memory-mapped weights when exported
+            and the checkpoint otherwise; 'auto' tries TorchScript, ONNX, then
+            the memory-mapped weights. TorchScript and ONNX models expose no
+            embedding (no similar meals) and ignore the channels_last profile.
+    """
     if device is None:
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     
-    checkpoint = torch.load(checkpoint_path, map_location=device)
+    if artifact in ('auto', 'torchscript', 'onnx') and not quantize:
+        loaded = load_artifact(checkpoint_path, device, artifact)
+        if loaded is not None:
+            model, class_names = loaded
+            source = 'TorchScript' if isinstance(model, torch.jit.ScriptModule) else 'ONNX'
+            print(f"Loaded the {source} artifact of {os.path.basename(checkpoint_path)}")
+            return model, class_names, device
+    
+    loaded = load_mmap_weights(checkpoint_path, device) if artifact in ('auto', 'mmap') else None
+    if loaded is not None:
+        model, class_names = loaded
+        print(f"Loaded the memory-mapped weights of {os.path.basename(checkpoint_path)}")
+    else:
+        checkpoint = torch.load(checkpoint_path, map_location=device)
+        
+        # Extract class names
+        class_names = checkpoint.get('class_names') or checkpoint.get('classes')
+        if class_names is None:
+            raise ValueError("Checkpoint must contain 'class_names' or 'classes' key")
+        
+        num_classes = len(class_names)
+        
+        # Initialize model
+        model = FoodClassifier(num_classes=num_classes)
+        model.load_state_dict(checkpoint['model_state_dict'])
+        model = model.to(device)
+        model.eval()
+        print(f"Loaded checkpoint {os.path.basename(checkpoint_path)}")
+    
+    if quantize:
+        # Quantized kernels only run on CPU
+        from quantization import quantize_model
+        device = torch.device('cpu')
+        model = quantize_model(model.to(device), quantize, calibration_dir=calibration_dir)
+    
+    return model, class_names, device
+
+def load_light_model(checkpoint_path, device=None):
+    """
+    Load a LightFoodClassifier checkpoint
     
-    # Extract class names
+    The checkpoint has the same layout as the main one ('model_state_dict'
+    and 'class_names'/'classes') plus an 'arch' key naming the backbone.
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    
+    checkpoint = torch.load(checkpoint_path, map_location=device)
     class_names = checkpoint.get('class_names') or checkpoint.get('classes')
     if class_names is None:
         raise ValueError("Checkpoint must contain 'class_names' or 'classes' key")
     
-    num_classes = len(class_names)
-    
-    # Initialize model
-    model = FoodClassifier(num_classes=num_classes)
+    model = LightFoodClassifier(num_classes=len(class_names), arch=checkpoint.get('arch', 'mobilenet_v3_large'))
     model.load_state_dict(checkpoint['model_state_dict'])
     model = model.to(device)
     model.eval()
+    return model, class_names
+
+def load_cascade(light_checkpoint_path, large_model, class_names, device, threshold=0.8):
+    """Put a light first-stage model in front of an already loaded large model"""
+    light_model, light_class_names = load_light_model(light_checkpoint_path, device=device)
+    if list(light_class_names) != list(class_names):
+        raise ValueError("Cascade models must be trained on the same class_names in the same order")
+    return CascadeClassifier(light_model, large_model, threshold=threshold).eval()
+
+# Process-wide switches for predict_tensors, set from an inference profile (see inference_profile.py)
+_inference_options = {'inference_mode': False, 'channels_last': False, 'autocast_bf16': False}
+
+def configure_inference(inference_mode=None, channels_last=None, autocast_bf16=None):
+    """
+    Change how predict_tensors runs the model
     
-    return model, class_names, device
+    Args:
+        inference_mode: torch.inference_mode() instead of torch.no_grad()
+        channels_last: Feed NHWC-strided batches (the model must be converted too)
+        autocast_bf16: Run CPU forward passes under bfloat16 autocast
+    """
+    for key, value in (('inference_mode', inference_mode), ('channels_last', channels_last),
+                       ('autocast_bf16', autocast_bf16)):
+        if value is not None:
+            _inference_options[key] = bool(value)
+    return dict(_inference_options)
+
+_features = threading.local()
+
+def _capture_features(module, inputs, output):
+    # Thread-local, so concurrent requests sharing the model never see each other's features
+    if getattr(_features, 'wanted', False):
+        _features.value = inputs[0]
+
+def embedding_layer(model):
+    """
+    The final Linear layer of a (possibly quantized) FoodClassifier, whose
+    input is the 2048-d pooled image embedding, or None for models that do
+    not expose one (TorchScript/ONNX artifacts, the cascade)
+    """
+    if isinstance(model, torch.jit.ScriptModule) or not isinstance(model, nn.Module):
+        return None
+    resnet = getattr(model, 'resnet', None)
+    if resnet is None:
+        return None
+    fc = resnet.fc
+    return fc[-1] if isinstance(fc, nn.Sequential) else fc
 
 def predict_food(model, image_pil, class_names, device, topk=5):
     """
@@ -69,17 +377,91 @@ def predict_food(model, image_pil, class_names, device, topk=5):
     Returns:
         List of tuples (class_name, probability)
     """
-    img_tensor = preprocess_image(image_pil).to(device)
+    img_tensor = preprocess_image(image_pil)
+    return predict_tensors(model, img_tensor, class_names, device, topk=topk)[0]
+
+def predict_batch(model, images, class_names, device, topk=5, crop_size=CROP_SIZE, return_embeddings=False):
+    """
+    Predict food classes for several images with a single forward pass
+    
+    Args:
+        model: Trained FoodClassifier model
+        images: List of PIL Image objects
+        class_names: List of class names
+        device: torch device
+        topk: Number of top predictions to return per image
+        crop_size: Input resolution; smaller crops trade accuracy for speed
+        return_embeddings: Also return the image embeddings (see predict_tensors)
+    
+    Returns:
+        List with one list of (class_name, probability) tuples per image
+    """
+    if not images:
+        return ([], None) if return_embeddings else []
+    batch = torch.cat([preprocess_image(img, crop_size=crop_size) for img in images])
+    return predict_tensors(model, batch, class_names, device, topk=topk, return_embeddings=return_embeddings)
+
+def _grad_mode():
+    return torch.inference_mode() if _inference_options['inference_mode'] else torch.no_grad()
+
+def forward_logits(model, batch, device):
+    """
+    Forward pass over a preprocessed batch under the configure_inference
+    options; the first half of predict_tensors
+    """
+    batch = batch.to(device)
+    if _inference_options['channels_last'] and batch.dim() == 4:
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    autocast = torch.autocast('cpu', dtype=torch.bfloat16,
+                              enabled=_inference_options['autocast_bf16'] and batch.device.type == 'cpu')
+    with _grad_mode(), autocast:
+        return model(batch)
+
+def top_predictions(outputs, class_names, topk=5):
+    """
+    Softmax and top-k over a batch of logits; the second half of predict_tensors
     
-    with torch.no_grad():
-        outputs = model(img_tensor)
-        probabilities = F.softmax(outputs, dim=1)
+    Returns:
+        List with one list of (class_name, probability) tuples per image
+    """
+    with _grad_mode():
+        probabilities = F.softmax(outputs.float(), dim=1)
         topk_prob, topk_idx = torch.topk(probabilities, min(topk, len(class_names)))
     
-    results = []
-    for prob, idx in zip(topk_prob[0], topk_idx[0]):
-        class_name = class_names[idx.item()]
-        probability = float(prob.item())
-        results.append((class_name, probability))
+    topk_prob = topk_prob.cpu().tolist()
+    topk_idx = topk_idx.cpu().tolist()
+    return [
+        [(class_names[idx], float(prob)) for prob, idx in zip(row_prob, row_idx)]
+        for row_prob, row_idx in zip(topk_prob, topk_idx)
+    ]
+
+def predict_tensors(model, batch, class_names, device, topk=5, return_embeddings=False):
+    """
+    Run the model on an already preprocessed (N, 3, 224, 224) batch
+    
+    With ``return_embeddings`` the result is (predictions, embeddings), the
+    embeddings being the L2-normalized pooled features from the same forward
+    pass as an (N, 2048) float16 array, or None if the model has no
+    embedding_layer.
+    """
+    layer = embedding_layer(model) if return_embeddings else None
+    if layer is not None and not getattr(layer, '_captures_features', False):
+        layer.register_forward_hook(_capture_features)
+        layer._captures_features = True
+    
+    _features.wanted = layer is not None
+    _features.value = None
+    try:
+        outputs = forward_logits(model, batch, device)
+    finally:
+        _features.wanted = False
+    
+    predictions = top_predictions(outputs, class_names, topk=topk)
+    if not return_embeddings:
+        return predictions
     
-    return results
\ No newline at end of file
+    embeddings = None
+    if _features.value is not None:
+        embeddings = F.normalize(_features.value.float(), dim=1).cpu().numpy().astype(np.float16)
+        _features.value = None
+    return predictions, embeddings
@@ -0,0 +1,175 @@
+"""Nutrition facts per serving and MET values of the exercises the app knows about."""
+
+# Extended Nutrition Database
+NUTRITION_DB = {
+    # Fruits
+    'apple': {'calories': 52, 'protein': 0.3, 'carbs': 14, 'fats': 0.2, 'serving': '100g'},
+    'banana': {'calories': 89, 'protein': 1.1, 'carbs': 23, 'fats': 0.3, 'serving': '100g'},
+    'orange': {'calories': 47, 'protein': 0.9, 'carbs': 12, 'fats': 0.1, 'serving': '100g'},
+    'mango': {'calories': 60, 'protein': 0.8, 'carbs': 15, 'fats': 0.4, 'serving': '100g'},
+    'grapes': {'calories': 69, 'protein': 0.7, 'carbs': 18, 'fats': 0.2, 'serving': '100g'},
+    'watermelon': {'calories': 30, 'protein': 0.6, 'carbs': 8, 'fats': 0.2, 'serving': '100g'},
+    'strawberry': {'calories': 32, 'protein': 0.7, 'carbs': 8, 'fats': 0.3, 'serving': '100g'},
+    'pineapple': {'calories': 50, 'protein': 0.5, 'carbs': 13, 'fats': 0.1, 'serving': '100g'},
+    'papaya': {'calories': 43, 'protein': 0.5, 'carbs': 11, 'fats': 0.3, 'serving': '100g'},
+    'pomegranate': {'calories': 83, 'protein': 1.7, 'carbs': 19, 'fats': 1.2, 'serving': '100g'},
+    
+    # Vegetables
+    'broccoli': {'calories': 34, 'protein': 2.8, 'carbs': 7, 'fats': 0.4, 'serving': '100g'},
+    'carrot': {'calories': 41, 'protein': 0.9, 'carbs': 10, 'fats': 0.2, 'serving': '100g'},
+    'tomato': {'calories': 18, 'protein': 0.9, 'carbs': 4, 'fats': 0.2, 'serving': '100g'},
+    'spinach': {'calories': 23, 'protein': 2.9, 'carbs': 4, 'fats': 0.4, 'serving': '100g'},
+    'potato': {'calories': 77, 'protein': 2, 'carbs': 17, 'fats': 0.1, 'serving': '100g'},
+    'onion': {'calories': 40, 'protein': 1.1, 'carbs': 9, 'fats': 0.1, 'serving': '100g'},
+    'cucumber': {'calories': 15, 'protein': 0.7, 'carbs': 4, 'fats': 0.1, 'serving': '100g'},
+    'cauliflower': {'calories': 25, 'protein': 1.9, 'carbs': 5, 'fats': 0.3, 'serving': '100g'},
+    'bell pepper': {'calories': 31, 'protein': 1, 'carbs': 6, 'fats': 0.3, 'serving': '100g'},
+    'cabbage': {'calories': 25, 'protein': 1.3, 'carbs': 6, 'fats': 0.1, 'serving': '100g'},
+    
+    # Grains & Staples
+    'rice': {'calories': 130, 'protein': 2.7, 'carbs': 28, 'fats': 0.3, 'serving': '100g cooked'},
+    'bread': {'calories': 265, 'protein': 9, 'carbs': 49, 'fats': 3.2, 'serving': '100g'},
+    'pasta': {'calories': 131, 'protein': 5, 'carbs': 25, 'fats': 1.1, 'serving': '100g cooked'},
+    'oats': {'calories': 389, 'protein': 17, 'carbs': 66, 'fats': 7, 'serving': '100g'},
+    'quinoa': {'calories': 120, 'protein': 4.4, 'carbs': 21, 'fats': 1.9, 'serving': '100g cooked'},
+    'wheat flour': {'calories': 364, 'protein': 10, 'carbs': 76, 'fats': 1, 'serving': '100g'},
+    'corn': {'calories': 86, 'protein': 3.3, 'carbs': 19, 'fats': 1.4, 'serving': '100g'},
+    
+    # Proteins - Vegetarian
+    'paneer': {'calories': 265, 'protein': 18, 'carbs': 1.2, 'fats': 20, 'serving': '100g'},
+    'tofu': {'calories': 76, 'protein': 8, 'carbs': 1.9, 'fats': 4.8, 'serving': '100g'},
+    'chickpeas': {'calories': 164, 'protein': 8.9, 'carbs': 27, 'fats': 2.6, 'serving': '100g cooked'},
+    'lentils': {'calories': 116, 'protein': 9, 'carbs': 20, 'fats': 0.4, 'serving': '100g cooked'},
+    'kidney beans': {'calories': 127, 'protein': 8.7, 'carbs': 23, 'fats': 0.5, 'serving': '100g cooked'},
+    'black beans': {'calories': 132, 'protein': 8.9, 'carbs': 24, 'fats': 0.5, 'serving': '100g cooked'},
+    'green peas': {'calories': 81, 'protein': 5, 'carbs': 14, 'fats': 0.4, 'serving': '100g'},
+    'eggs': {'calories': 155, 'protein': 13, 'carbs': 1.1, 'fats': 11, 'serving': '100g'},
+    'yogurt': {'calories': 59, 'protein': 10, 'carbs': 3.6, 'fats': 0.4, 'serving': '100g'},
+    'milk': {'calories': 42, 'protein': 3.4, 'carbs': 5, 'fats': 1, 'serving': '100ml'},
+    
+    # Proteins - Non-Vegetarian
+    'chicken breast': {'calories': 165, 'protein': 31, 'carbs': 0, 'fats': 3.6, 'serving': '100g'},
+    'chicken': {'calories': 239, 'protein': 27, 'carbs': 0, 'fats': 14, 'serving': '100g'},
+    'fish': {'calories': 206, 'protein': 22, 'carbs': 0, 'fats': 12, 'serving': '100g'},
+    'salmon': {'calories': 208, 'protein': 20, 'carbs': 0, 'fats': 13, 'serving': '100g'},
+    'tuna': {'calories': 130, 'protein': 28, 'carbs': 0, 'fats': 1, 'serving': '100g'},
+    'shrimp': {'calories': 99, 'protein': 24, 'carbs': 0.2, 'fats': 0.3, 'serving': '100g'},
+    'beef': {'calories': 250, 'protein': 26, 'carbs': 0, 'fats': 15, 'serving': '100g'},
+    'lamb': {'calories': 294, 'protein': 25, 'carbs': 0, 'fats': 21, 'serving': '100g'},
+    'pork': {'calories': 242, 'protein': 27, 'carbs': 0, 'fats': 14, 'serving': '100g'},
+    'turkey': {'calories': 189, 'protein': 29, 'carbs': 0, 'fats': 7, 'serving': '100g'},
+    
+    # Fast Food & Snacks
+    'pizza': {'calories': 266, 'protein': 11, 'carbs': 33, 'fats': 10, 'serving': '100g'},
+    'burger': {'calories': 295, 'protein': 17, 'carbs': 24, 'fats': 14, 'serving': '100g'},
+    'french fries': {'calories': 312, 'protein': 3.4, 'carbs': 41, 'fats': 15, 'serving': '100g'},
+    'sandwich': {'calories': 250, 'protein': 10, 'carbs': 30, 'fats': 10, 'serving': '100g'},
+    'hot dog': {'calories': 290, 'protein': 10, 'carbs': 24, 'fats': 17, 'serving': '100g'},
+    'tacos': {'calories': 217, 'protein': 9, 'carbs': 19, 'fats': 11, 'serving': '100g'},
+    'nachos': {'calories': 312, 'protein': 7, 'carbs': 36, 'fats': 16, 'serving': '100g'},
+    
+    # Indian Foods
+    'roti': {'calories': 297, 'protein': 11, 'carbs': 54, 'fats': 4, 'serving': '100g'},
+    'naan': {'calories': 310, 'protein': 9, 'carbs': 52, 'fats': 7, 'serving': '100g'},
+    'dosa': {'calories': 168, 'protein': 3.9, 'carbs': 28, 'fats': 4, 'serving': '100g'},
+    'idli': {'calories': 156, 'protein': 4.4, 'carbs': 28, 'fats': 2.7, 'serving': '100g'},
+    'biryani': {'calories': 200, 'protein': 8, 'carbs': 30, 'fats': 5, 'serving': '100g'},
+    'dal': {'calories': 104, 'protein': 7, 'carbs': 17, 'fats': 1, 'serving': '100g'},
+    'samosa': {'calories': 262, 'protein': 5, 'carbs': 32, 'fats': 13, 'serving': '100g'},
+    'pakora': {'calories': 240, 'protein': 4, 'carbs': 22, 'fats': 15, 'serving': '100g'},
+    'paratha': {'calories': 320, 'protein': 7, 'carbs': 42, 'fats': 14, 'serving': '100g'},
+    
+    # Nuts & Seeds
+    'almonds': {'calories': 579, 'protein': 21, 'carbs': 22, 'fats': 50, 'serving': '100g'},
+    'cashews': {'calories': 553, 'protein': 18, 'carbs': 30, 'fats': 44, 'serving': '100g'},
+    'peanuts': {'calories': 567, 'protein': 26, 'carbs': 16, 'fats': 49, 'serving': '100g'},
+    'walnuts': {'calories': 654, 'protein': 15, 'carbs': 14, 'fats': 65, 'serving': '100g'},
+    'pumpkin seeds': {'calories': 446, 'protein': 19, 'carbs': 54, 'fats': 19, 'serving': '100g'},
+    'sunflower seeds': {'calories': 584, 'protein': 21, 'carbs': 20, 'fats': 51, 'serving': '100g'},
+    
+    # Dairy & Alternatives
+    'cheese': {'calories': 402, 'protein': 25, 'carbs': 1.3, 'fats': 33, 'serving': '100g'},
+    'butter': {'calories': 717, 'protein': 0.9, 'carbs': 0.1, 'fats': 81, 'serving': '100g'},
+    'cream': {'calories': 345, 'protein': 2.2, 'carbs': 2.7, 'fats': 37, 'serving': '100ml'},
+    'ice cream': {'calories': 207, 'protein': 3.5, 'carbs': 24, 'fats': 11, 'serving': '100g'},
+    
+    # Beverages & Others
+    'coffee': {'calories': 2, 'protein': 0.3, 'carbs': 0, 'fats': 0, 'serving': '100ml'},
+    'tea': {'calories': 1, 'protein': 0, 'carbs': 0.3, 'fats': 0, 'serving': '100ml'},
+    'orange juice': {'calories': 45, 'protein': 0.7, 'carbs': 10, 'fats': 0.2, 'serving': '100ml'},
+    'soda': {'calories': 41, 'protein': 0, 'carbs': 11, 'fats': 0, 'serving': '100ml'},
+    'honey': {'calories': 304, 'protein': 0.3, 'carbs': 82, 'fats': 0, 'serving': '100g'},
+    'sugar': {'calories': 387, 'protein': 0, 'carbs': 100, 'fats': 0, 'serving': '100g'},
+    'olive oil': {'calories': 884, 'protein': 0, 'carbs': 0, 'fats': 100, 'serving': '100ml'},
+    'chocolate': {'calories': 546, 'protein': 5, 'carbs': 61, 'fats': 31, 'serving': '100g'},
+    'cake': {'calories': 257, 'protein': 4.6, 'carbs': 41, 'fats': 9, 'serving': '100g'},
+    'cookies': {'calories': 502, 'protein': 5.6, 'carbs': 64, 'fats': 25, 'serving': '100g'},
+}
+
+EXERCISE_DB = {
+    # Cardio Exercises
+    'walking_slow': {'name': 'Walking (Slow pace, 3 km/h)', 'met': 2.5, 'category': 'Cardio', 'icon': '🚶'},
+    'walking_moderate': {'name': 'Walking (Moderate, 5 km/h)', 'met': 3.5, 'category': 'Cardio', 'icon': '🚶‍♂️'},
+    'walking_brisk': {'name': 'Walking (Brisk, 6.5 km/h)', 'met': 5.0, 'category': 'Cardio', 'icon': '🚶‍♀️'},
+    'jogging': {'name': 'Jogging (8 km/h)', 'met': 8.0, 'category': 'Cardio', 'icon': '🏃'},
+    'running_moderate': {'name': 'Running (10 km/h)', 'met': 10.0, 'category': 'Cardio', 'icon': '🏃‍♂️'},
+    'running_fast': {'name': 'Running (12 km/h)', 'met': 12.5, 'category': 'Cardio', 'icon': '🏃‍♀️'},
+    'sprinting': {'name': 'Sprinting (16+ km/h)', 'met': 16.0, 'category': 'Cardio', 'icon': '💨'},
+    
+    # Cycling
+    'cycling_leisure': {'name': 'Cycling (Leisure, 15 km/h)', 'met': 4.0, 'category': 'Cycling', 'icon': '🚴'},
+    'cycling_moderate': {'name': 'Cycling (Moderate, 20 km/h)', 'met': 6.8, 'category': 'Cycling', 'icon': '🚴‍♂️'},
+    'cycling_vigorous': {'name': 'Cycling (Vigorous, 25+ km/h)', 'met': 10.0, 'category': 'Cycling', 'icon': '🚴‍♀️'},
+    'stationary_bike_light': {'name': 'Stationary Bike (Light)', 'met': 3.5, 'category': 'Cycling', 'icon': '🚴'},
+    'stationary_bike_moderate': {'name': 'Stationary Bike (Moderate)', 'met': 6.8, 'category': 'Cycling', 'icon': '🚴‍♂️'},
+    'stationary_bike_vigorous': {'name': 'Stationary Bike (Vigorous)', 'met': 10.0, 'category': 'Cycling', 'icon': '🚴‍♀️'},
+    
+    # Swimming
+    'swimming_leisure': {'name': 'Swimming (Leisure)', 'met': 6.0, 'category': 'Swimming', 'icon': '🏊'},
+    'swimming_laps_light': {'name': 'Swimming Laps (Light)', 'met': 7.0, 'category': 'Swimming', 'icon': '🏊‍♂️'},
+    'swimming_laps_moderate': {'name': 'Swimming Laps (Moderate)', 'met': 8.0, 'category': 'Swimming', 'icon': '🏊‍♀️'},
+    'swimming_laps_vigorous': {'name': 'Swimming Laps (Vigorous)', 'met': 10.0, 'category': 'Swimming', 'icon': '🏊'},
+    
+    # Strength Training
+    'weight_training_light': {'name': 'Weight Training (Light)', 'met': 3.5, 'category': 'Strength', 'icon': '🏋️'},
+    'weight_training_moderate': {'name': 'Weight Training (Moderate)', 'met': 5.0, 'category': 'Strength', 'icon': '🏋️‍♂️'},
+    'weight_training_vigorous': {'name': 'Weight Training (Vigorous)', 'met': 6.0, 'category': 'Strength', 'icon': '🏋️‍♀️'},
+    'bodyweight_exercises': {'name': 'Bodyweight Exercises', 'met': 5.0, 'category': 'Strength', 'icon': '💪'},
+    'push_ups': {'name': 'Push-ups', 'met': 3.8, 'category': 'Strength', 'icon': '💪'},
+    'pull_ups': {'name': 'Pull-ups', 'met': 8.0, 'category': 'Strength', 'icon': '💪'},
+    
+    # Sports
+    'basketball': {'name': 'Basketball (Game)', 'met': 8.0, 'category': 'Sports', 'icon': '🏀'},
+    'football': {'name': 'Football/Soccer', 'met': 7.0, 'category': 'Sports', 'icon': '⚽'},
+    'tennis_singles': {'name': 'Tennis (Singles)', 'met': 8.0, 'category': 'Sports', 'icon': '🎾'},
+    'tennis_doubles': {'name': 'Tennis (Doubles)', 'met': 6.0, 'category': 'Sports', 'icon': '🎾'},
+    'badminton': {'name': 'Badminton', 'met': 5.5, 'category': 'Sports', 'icon': '🏸'},
+    'volleyball': {'name': 'Volleyball', 'met': 4.0, 'category': 'Sports', 'icon': '🏐'},
+    'cricket': {'name': 'Cricket', 'met': 4.8, 'category': 'Sports', 'icon': '🏏'},
+    
+    # HIIT & Aerobics
+    'hiit': {'name': 'HIIT (High Intensity)', 'met': 12.0, 'category': 'HIIT', 'icon': '🔥'},
+    'aerobics_low': {'name': 'Aerobics (Low Impact)', 'met': 5.0, 'category': 'Aerobics', 'icon': '🤸'},
+    'aerobics_high': {'name': 'Aerobics (High Impact)', 'met': 7.0, 'category': 'Aerobics', 'icon': '🤸‍♂️'},
+    'zumba': {'name': 'Zumba', 'met': 8.8, 'category': 'Aerobics', 'icon': '💃'},
+    'dancing': {'name': 'Dancing (General)', 'met': 4.5, 'category': 'Aerobics', 'icon': '💃'},
+    'jump_rope': {'name': 'Jump Rope', 'met': 12.3, 'category': 'HIIT', 'icon': '🦘'},
+    'burpees': {'name': 'Burpees', 'met': 8.0, 'category': 'HIIT', 'icon': '🔥'},
+    
+    # Flexibility & Mind-Body
+    'yoga_hatha': {'name': 'Yoga (Hatha)', 'met': 2.5, 'category': 'Flexibility', 'icon': '🧘'},
+    'yoga_vinyasa': {'name': 'Yoga (Vinyasa)', 'met': 4.0, 'category': 'Flexibility', 'icon': '🧘‍♀️'},
+    'yoga_power': {'name': 'Yoga (Power)', 'met': 4.0, 'category': 'Flexibility', 'icon': '🧘‍♂️'},
+    'pilates': {'name': 'Pilates', 'met': 3.0, 'category': 'Flexibility', 'icon': '🧘'},
+    'stretching': {'name': 'Stretching', 'met': 2.3, 'category': 'Flexibility', 'icon': '🤸'},
+    
+    # Other Activities
+    'stairs_climbing': {'name': 'Stair Climbing', 'met': 8.8, 'category': 'Cardio', 'icon': '🪜'},
+    'elliptical': {'name': 'Elliptical Machine', 'met': 5.0, 'category': 'Cardio', 'icon': '🏃'},
+    'rowing': {'name': 'Rowing Machine', 'met': 7.0, 'category': 'Cardio', 'icon': '🚣'},
+    'hiking': {'name': 'Hiking', 'met': 6.0, 'category': 'Outdoor', 'icon': '🥾'},
+    'rock_climbing': {'name': 'Rock Climbing', 'met': 8.0, 'category': 'Outdoor', 'icon': '🧗'},
+    'skating': {'name': 'Skating/Rollerblading', 'met': 7.0, 'category': 'Outdoor', 'icon': '⛸️'},
+    'martial_arts': {'name': 'Martial Arts', 'met': 10.0, 'category': 'Sports', 'icon': '🥋'},
+    'boxing': {'name': 'Boxing', 'met': 9.0, 'category': 'Sports', 'icon': '🥊'},
+}
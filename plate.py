@@ -0,0 +1,180 @@
+"""
+Plate mode: find several dishes in one photo.
+
+The upload is cut into a grid of overlapping regions which are classified
+together with the usual center crop in a single batch; region predictions
+that agree are merged into a short list of suggested FoodLog entries.
+
+Region crops are small parts of the photo, so they are classified at a
+lower resolution (DEFAULT_CROP_SIZE) than the usual 224 px; on CPU the cost
+of a forward pass grows with the pixel count, and this is what keeps plate
+mode close to the price of the single-crop path. The whole image shares the
+batch and so its resolution: crops of different sizes cannot be stacked
+into one tensor, and a second pass for it at 224 px made plate mode cost
+2.2x a single crop. Measured for a 2x2 grid on a 1-CPU host (ResNet50,
+single crop 140 ms):
+
+    crop size   plate mode          whole-image top-1 same as at 224 px
+    224 px      655 ms (4.7x)       -
+    160 px      319 ms (2.3x)       16/16 sample uploads
+    128 px      219 ms (1.6x)       16/16 sample uploads
+
+Plate mode can be turned off (PLATE_MODE=0) where even that is too much.
+
+The tiling and merging here are torch-free so web workers using the remote
+inference backend can run plate mode too.
+
+Benchmark against the single-crop path:
+    python plate.py --image meal.jpg --grids 2,3 --crop-sizes 224,160,128
+"""
+import argparse
+import time
+
+from preprocessing import decode_image, resize_for_crop
+
+DEFAULT_GRID = 2
+DEFAULT_OVERLAP = 0.25
+DEFAULT_CROP_SIZE = 128
+
+
+def decode_for_plate(data, grid=DEFAULT_GRID, overlap=DEFAULT_OVERLAP, crop_size=DEFAULT_CROP_SIZE):
+    """Decode an upload just large enough for the whole image and every region at ``crop_size``"""
+    region = resize_for_crop(crop_size) * (1 + (grid - 1) * (1 - overlap))
+    return decode_image(data, target_size=int(max(region, resize_for_crop(crop_size))))
+
+
+def plate_regions(image, grid=DEFAULT_GRID, overlap=DEFAULT_OVERLAP):
+    """
+    Cut an image into a grid x grid set of overlapping regions.
+
+    Args:
+        image: RGB PIL Image
+        grid: Regions per side
+        overlap: Fraction of a region shared with its neighbour
+
+    Returns:
+        List of (box, PIL Image) pairs, box being (left, top, right, bottom)
+    """
+    width, height = image.size
+    span = 1 + (grid - 1) * (1 - overlap)
+    tile_w, tile_h = width / span, height / span
+    regions = []
+    for row in range(grid):
+        for col in range(grid):
+            left = int(round(col * tile_w * (1 - overlap)))
+            top = int(round(row * tile_h * (1 - overlap)))
+            box = (left, top, min(width, int(round(left + tile_w))), min(height, int(round(top + tile_h))))
+            regions.append((box, image.crop(box)))
+    return regions
+
+
+def merge_region_predictions(whole, regions, min_confidence=0.3, max_items=4):
+    """
+    Turn per-region predictions into a list of distinct foods on the plate.
+
+    Args:
+        whole: Top-k (name, probability) list for the whole image
+        regions: One top-k list per grid region
+        min_confidence: Regions whose best guess is below this are ignored
+        max_items: Maximum number of suggestions
+
+    Returns:
+        List of dicts with food_name, confidence (best score seen) and
+        regions (number of grid regions voting for it), most supported first
+    """
+    items = {}
+    for predictions in regions:
+        if not predictions:
+            continue
+        name, prob = predictions[0]
+        if prob < min_confidence:
+            continue
+        item = items.setdefault(name, {'food_name': name, 'confidence': 0.0, 'regions': 0})
+        item['confidence'] = max(item['confidence'], prob)
+        item['regions'] += 1
+
+    # The whole-image label is always suggested, so a photo of a single dish still gets it
+    if whole:
+        name, prob = whole[0]
+        item = items.setdefault(name, {'food_name': name, 'confidence': 0.0, 'regions': 0})
+        item['confidence'] = max(item['confidence'], prob)
+
+    ranked = sorted(items.values(), key=lambda item: (item['regions'], item['confidence']), reverse=True)
+    return ranked[:max_items]
+
+
+def classify_plate(image, classify_images, grid=DEFAULT_GRID, overlap=DEFAULT_OVERLAP,
+                   crop_size=DEFAULT_CROP_SIZE, min_confidence=0.3, max_items=4, topk=3):
+    """
+    Suggest the foods on a plate.
+
+    Args:
+        image: RGB PIL Image (see decode_for_plate)
+        classify_images: Callable taking a list of PIL images, ``topk`` and
+            ``crop_size`` and returning one prediction list per image from a
+            single batch (e.g. models.predict_batch bound to a model)
+
+    Returns:
+        (items, whole) where items comes from merge_region_predictions and
+        whole is the top-k list for the whole image
+    """
+    crops = [image] + [crop for _, crop in plate_regions(image, grid=grid, overlap=overlap)]
+    predictions = classify_images(crops, topk=topk, crop_size=crop_size)
+    items = merge_region_predictions(predictions[0], predictions[1:],
+                                     min_confidence=min_confidence, max_items=max_items)
+    return items, predictions[0]
+
+
+def _time(fn, repeat):
+    fn()  # warm-up
+    began = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - began) * 1000 / repeat, result
+
+
+def benchmark(model, class_names, device, data, grid, overlap, crop_size, repeat):
+    """Mean ms per image of plate mode, decode included"""
+    from models import predict_batch
+
+    def classify_images(images, topk=3, crop_size=crop_size):
+        return predict_batch(model, images, class_names, device, topk=topk, crop_size=crop_size)
+
+    def plate():
+        image = decode_for_plate(data, grid, overlap, crop_size)
+        return classify_plate(image, classify_images, grid=grid, overlap=overlap, crop_size=crop_size)
+
+    return _time(plate, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare plate mode with the single center-crop prediction")
+    parser.add_argument('--checkpoint', default='food101_model_for_inference (1).pth')
+    parser.add_argument('--image', required=True)
+    parser.add_argument('--grids', default='2,3', help="comma-separated grid sizes to measure")
+    parser.add_argument('--crop-sizes', default=f'224,160,{DEFAULT_CROP_SIZE}', help="comma-separated region resolutions")
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--quantize', choices=['dynamic', 'static'])
+    args = parser.parse_args()
+
+    import torch
+    from models import load_model, predict_food
+
+    model, class_names, device = load_model(args.checkpoint, device=torch.device('cpu'), quantize=args.quantize)
+    with open(args.image, 'rb') as f:
+        data = f.read()
+
+    single_ms, single = _time(lambda: predict_food(model, decode_image(data), class_names, device), args.repeat)
+    print(f"single crop: {single_ms:.1f} ms -> {single[0][0]} ({single[0][1]:.1%})")
+    for grid in (int(g) for g in args.grids.split(',')):
+        for crop_size in (int(c) for c in args.crop_sizes.split(',')):
+            plate_ms, (items, _) = benchmark(model, class_names, device, data, grid, args.overlap,
+                                             crop_size, args.repeat)
+            foods = ', '.join(f"{item['food_name']} ({item['regions']})" for item in items)
+            print(f"plate {grid}x{grid} @ {crop_size}px ({1 + grid * grid} crops, one batch): "
+                  f"{plate_ms:.1f} ms ({plate_ms / single_ms:.2f}x single) -> {foods}")
+
+
+if __name__ == '__main__':
+    main()
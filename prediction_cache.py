@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Default for an embedding that was never stored (None means the model has none)
+NOT_STORED = object()
+
+
+def file_version(path):
+    """Cheap version tag for a model file, derived from its name, size and modification time"""
+    stat = os.stat(path)
+    tag = f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    return hashlib.sha1(tag.encode()).hexdigest()[:12]
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of classifier predictions keyed by image content.
+
+    Keys combine the SHA-256 of the uploaded bytes with the model version and
+    top-k, so a new checkpoint never serves stale predictions. An entry can
+    also keep the upload's embedding (float16, for the similar-meals index),
+    so a repeat upload never needs the model. Entries can optionally be
+    persisted as small JSON files (and .f16 embedding files) so they survive
+    restarts and are shared between workers on the same host. The directory is pruned every
+    ``prune_interval`` seconds: files unused for ``max_age`` seconds go first,
+    then the least recently used until it fits in ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_entries=1024, persist_dir=None, max_disk_bytes=256 * 1024 * 1024,
+                 max_age=30 * 86400, prune_interval=600):
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._last_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image_bytes, model_version, topk=5):
+        """Build the cache key for raw image bytes"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{digest}-{model_version}-{topk}"
+
+    def _path(self, key):
+        return os.path.join(self.persist_dir, key[:2], f"{key}.json")
+
+    def get(self, key, with_embedding=False):
+        """
+        Return the cached list of (class_name, probability) tuples, or None.
+
+        With ``with_embedding`` return a (predictions, embedding) pair instead;
+        the embedding is None when the model that made the predictions has
+        none, and entries stored without one count as misses.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not with_embedding or entry[1] is not NOT_STORED):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._result(entry, with_embedding)
+
+        if self.persist_dir:
+            entry = self._read(key, with_embedding)
+            if entry is not None:
+                self._remember(key, *entry)
+                with self._lock:
+                    self.hits += 1
+                return self._result(entry, with_embedding)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _result(entry, with_embedding):
+        predictions, embedding = entry
+        if not with_embedding:
+            return predictions
+        return predictions, embedding if embedding is not None and embedding.size else None
+
+    def _read(self, key, with_embedding):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                predictions = [tuple(p) for p in json.load(f)]
+            embedding = NOT_STORED
+            if with_embedding:
+                embedding = np.fromfile(path[:-len('.json')] + '.f16', dtype=np.float16)
+                os.utime(path[:-len('.json')] + '.f16')
+            # Pruning goes by modification time, so a hit keeps the files
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return predictions, embedding
+
+    def put(self, key, predictions, embedding=NOT_STORED):
+        """
+        Store predictions in memory and, when configured, on disk; pass the
+        upload's embedding (None if the model has none) to keep it with them
+        """
+        predictions = [tuple(p) for p in predictions]
+        if embedding is not NOT_STORED:
+            # An empty array records that the model gave no embedding
+            embedding = np.asarray(embedding if embedding is not None else [], dtype=np.float16).reshape(-1)
+        self._remember(key, predictions, embedding)
+        if self.persist_dir:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if embedding is not NOT_STORED:
+                # Written first: a reader that finds the predictions finds the embedding too
+                self._write(path[:-len('.json')] + '.f16', embedding.tobytes())
+            self._write(path, json.dumps(predictions).encode())
+            if time.monotonic() - self._last_prune > self.prune_interval:
+                self.prune()
+
+    @staticmethod
+    def _write(path, data):
+        # A unique temp file per write: threads and workers may store the same key at once
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def prune(self):
+        """Trim the persisted entries to ``max_age`` and ``max_disk_bytes``; returns the number removed"""
+        if not self.persist_dir or not self._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._last_prune = time.monotonic()
+            now = time.time()
+            files = []
+            for entry in os.scandir(self.persist_dir):
+                if not entry.is_dir():
+                    continue
+                for f in os.scandir(entry.path):
+                    try:
+                        stat = f.stat()
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, f.path))
+            # Oldest first; expired files and temp files left by a crashed write always go
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            removed = 0
+            for mtime, size, path in files:
+                if path.endswith('.tmp'):
+                    # Being written unless it is old enough to have been left by a crashed write
+                    if now - mtime <= 60:
+                        continue
+                elif now - mtime <= self.max_age and total <= self.max_disk_bytes:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Another worker pruned it first
+                    continue
+                total -= size
+                removed += 1
+            self.pruned += removed
+            return removed
+        finally:
+            self._prune_lock.release()
+
+    def _remember(self, key, predictions, embedding=NOT_STORED):
+        with self._lock:
+            if embedding is NOT_STORED and key in self._entries:
+                # Storing the predictions again does not forget the embedding
+                embedding = self._entries[key][1]
+            self._entries[key] = (predictions, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'persistent': bool(self.persist_dir),
+                'disk_pruned': self.pruned,
+            }
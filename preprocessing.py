@@ -0,0 +1,82 @@
+"""
+Torch-free half of the image preprocessing pipeline: decode, resize and crop.
+
+Kept free of torch imports so inference_client.py can use it in web workers.
+The normalization step lives in models.ImagePreprocessor.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+RESIZE_SIZE = 256
+CROP_SIZE = 224
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+# Shorter side the upload forms downscale photos to in the browser. At 2 x RESIZE_SIZE, JPEG
+# DCT scaling decodes straight to RESIZE_SIZE, so resize_and_crop is left with only the crop.
+PRESIZED_SIDE = 2 * RESIZE_SIZE
+
+
+def resize_for_crop(crop):
+    """Resize size that keeps the standard RESIZE_SIZE / CROP_SIZE ratio for another crop size"""
+    return int(round(crop * RESIZE_SIZE / CROP_SIZE))
+
+
+def decode_image(data, target_size=RESIZE_SIZE, draft=True):
+    """
+    Decode an image to RGB, letting JPEG skip detail the model never sees.
+
+    Args:
+        data: Raw encoded bytes, a file-like object or a PIL Image
+        target_size: Smallest side length needed downstream
+        draft: Use libjpeg's reduced-DCT decoding (scale 1/2, 1/4 or 1/8) so
+            a 12 MP photo is decoded straight to roughly ``target_size`` px
+
+    Returns:
+        RGB PIL Image
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = io.BytesIO(data)
+    image = data if isinstance(data, Image.Image) else Image.open(data)
+    if draft and image.format == 'JPEG':
+        # draft() keeps both sides >= the requested size, so the later
+        # resize to target_size is still a downscale
+        image.draft('RGB', (target_size, target_size))
+    return image.convert('RGB')
+
+
+def is_presized(data, max_side=PRESIZED_SIDE):
+    """
+    True for an upload that was already downscaled (shorter side at most
+    ``max_side``), judged from the image header alone. Decoding one takes
+    about a millisecond, so it is not worth the work meant for full-size photos.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return min(image.size) <= max_side
+    except Exception:
+        return False
+
+
+def resize_and_crop(image, resize=RESIZE_SIZE, crop=CROP_SIZE):
+    """Resize the shorter side to ``resize`` and take a centered ``crop`` x ``crop`` square"""
+    width, height = image.size
+    if width <= height:
+        new_size = (resize, int(resize * height / width))
+    else:
+        new_size = (int(resize * width / height), resize)
+    if new_size != image.size:
+        image = image.resize(new_size, Image.BILINEAR)
+
+    width, height = image.size
+    left = int(round((width - crop) / 2.0))
+    top = int(round((height - crop) / 2.0))
+    return image.crop((left, top, left + crop, top + crop))
+
+
+def prepare_array(data, resize=RESIZE_SIZE, crop=CROP_SIZE, draft=True):
+    """Decode (bytes or PIL), resize and crop into a contiguous HxWx3 uint8 array"""
+    image = decode_image(data, target_size=resize, draft=draft)
+    # np.array (not asarray) so the result is writable and torch.from_numpy accepts it
+    return np.array(resize_and_crop(image, resize=resize, crop=crop), dtype=np.uint8)
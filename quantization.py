@@ -0,0 +1,228 @@
+"""
+INT8 inference modes for FoodClassifier on CPU-only hosts.
+
+    dynamic  - dynamic quantization of the final nn.Linear only
+    static   - post-training static quantization of the conv backbone,
+               calibrated on local images, plus a dynamically quantized head
+
+Run as a script to compare a quantized model against the float one:
+    python quantization.py --checkpoint model.pth --mode static --images static/uploads
+
+Agreement is measured on images the model was not calibrated on: those from
+--eval-images, or else every fourth image of --images, held out of
+calibration.
+"""
+import argparse
+import copy
+import io
+import os
+import time
+
+import torch
+import torch.nn as nn
+from PIL import Image
+from torch.ao.quantization import DeQuantStub, convert, get_default_qconfig, prepare, quantize_dynamic
+from torchvision.models.quantization import resnet50 as quantizable_resnet50
+
+from models import load_model, preprocess_image
+
+QUANTIZATION_MODES = ('dynamic', 'static')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def quantized_engine():
+    """Pick the best quantized kernel backend available on this CPU"""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available in this torch build")
+
+
+class QuantizedFoodClassifier(nn.Module):
+    """FoodClassifier whose backbone runs with INT8 kernels"""
+    def __init__(self, resnet):
+        super(QuantizedFoodClassifier, self).__init__()
+        self.resnet = resnet
+
+    def forward(self, x):
+        return self.resnet(x)
+
+
+def list_images(directory, limit=None):
+    """Image files in a directory (non-recursive), sorted for reproducibility"""
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def split_images(paths, eval_every=4):
+    """(calibration, evaluation) paths, holding out every ``eval_every``-th image for evaluation"""
+    evaluation = paths[::eval_every]
+    calibration = [path for index, path in enumerate(paths) if index % eval_every]
+    return calibration, evaluation
+
+
+def calibration_batches(image_paths, batch_size=8):
+    """Yield preprocessed calibration batches from image files"""
+    tensors = []
+    for path in image_paths:
+        try:
+            tensors.append(preprocess_image(Image.open(path).convert('RGB')))
+        except OSError as e:
+            print(f"Skipping calibration image {path}: {e}")
+            continue
+        if len(tensors) == batch_size:
+            yield torch.cat(tensors)
+            tensors = []
+    if tensors:
+        yield torch.cat(tensors)
+
+
+def quantize_dynamic_head(model):
+    """Dynamically quantize the classifier head (nn.Linear layers) to INT8"""
+    torch.backends.quantized.engine = quantized_engine()
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_paths, batch_size=8):
+    """
+    Static post-training quantization of the ResNet50 backbone.
+
+    Args:
+        model: Float FoodClassifier in eval mode (left untouched)
+        calibration_paths: Image files used to calibrate activation ranges
+        batch_size: Calibration batch size
+
+    Returns:
+        QuantizedFoodClassifier with INT8 convolutions and a dynamically
+        quantized INT8 fc layer
+    """
+    if not calibration_paths:
+        raise ValueError("Static quantization needs at least one calibration image")
+
+    engine = quantized_engine()
+    torch.backends.quantized.engine = engine
+
+    resnet = quantizable_resnet50(weights=None, quantize=False)
+    resnet.fc = copy.deepcopy(model.resnet.fc)
+    resnet.load_state_dict(model.resnet.state_dict())
+    # Hand the head float activations so it can use dynamic quantization
+    resnet.fc = nn.Sequential(DeQuantStub(), *resnet.fc)
+    resnet.eval()
+    resnet.fuse_model()
+
+    resnet.qconfig = get_default_qconfig(engine)
+    resnet.fc.qconfig = None
+    resnet.fc[0].qconfig = resnet.qconfig
+    prepare(resnet, inplace=True)
+
+    with torch.no_grad():
+        for batch in calibration_batches(calibration_paths, batch_size=batch_size):
+            resnet(batch)
+
+    convert(resnet, inplace=True)
+    resnet.fc = quantize_dynamic(resnet.fc, {nn.Linear}, dtype=torch.qint8)
+    return QuantizedFoodClassifier(resnet).eval()
+
+
+def quantize_model(model, mode, calibration_dir=None, calibration_limit=64, calibration_paths=None):
+    """Apply one of QUANTIZATION_MODES to a loaded float model"""
+    if mode == 'dynamic':
+        return quantize_dynamic_head(model)
+    if mode == 'static':
+        if calibration_paths is None:
+            if calibration_dir is None:
+                raise ValueError("Static quantization needs a calibration image directory")
+            calibration_paths = list_images(calibration_dir, limit=calibration_limit)
+        return quantize_static(model, calibration_paths)
+    raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+
+
+def model_size_mb(model):
+    """Serialized state_dict size in MB"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def _latency_ms(model, batch, runs):
+    with torch.no_grad():
+        model(batch)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def compare(float_model, quantized_model, image_paths, runs=20, topk=5):
+    """Latency, size and top-1/top-k agreement of a quantized model against the float one"""
+    tensors = list(calibration_batches(image_paths, batch_size=1))
+    if not tensors:
+        raise ValueError("No evaluation images found")
+
+    top1_agree = 0
+    topk_overlap = 0.0
+    with torch.no_grad():
+        for tensor in tensors:
+            float_top = torch.topk(float_model(tensor), topk).indices[0].tolist()
+            quant_top = torch.topk(quantized_model(tensor), topk).indices[0].tolist()
+            top1_agree += float_top[0] == quant_top[0]
+            topk_overlap += len(set(float_top) & set(quant_top)) / topk
+
+    return {
+        'images': len(tensors),
+        'float_latency_ms': round(_latency_ms(float_model, tensors[0], runs), 2),
+        'quantized_latency_ms': round(_latency_ms(quantized_model, tensors[0], runs), 2),
+        'float_size_mb': round(model_size_mb(float_model), 1),
+        'quantized_size_mb': round(model_size_mb(quantized_model), 1),
+        'top1_agreement': round(top1_agree / len(tensors), 3),
+        f'top{topk}_agreement': round(topk_overlap / len(tensors), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize FoodClassifier and compare it with the float model")
+    parser.add_argument('--checkpoint', default='food101_model_for_inference (1).pth')
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES, default='static')
+    parser.add_argument('--images', default=os.path.join('static', 'uploads'),
+                        help="directory of calibration images (and of held-out evaluation images "
+                             "when --eval-images is not given)")
+    parser.add_argument('--eval-images', default=None,
+                        help="separate directory of images for the agreement checks")
+    parser.add_argument('--calibration-limit', type=int, default=64)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.eval_images:
+        if os.path.realpath(args.eval_images) == os.path.realpath(args.images):
+            parser.error("--eval-images must not be the calibration directory")
+        calibration_paths, eval_paths = list_images(args.images), list_images(args.eval_images)
+    elif args.mode == 'static':
+        calibration_paths, eval_paths = split_images(list_images(args.images))
+    else:
+        # Dynamic quantization is not calibrated, so every image can be used for evaluation
+        calibration_paths, eval_paths = [], list_images(args.images)
+    calibration_paths = calibration_paths[:args.calibration_limit]
+
+    float_model, class_names, _ = load_model(args.checkpoint, device=torch.device('cpu'))
+    quantized_model = quantize_model(float_model, args.mode, calibration_paths=calibration_paths)
+    report = compare(float_model, quantized_model, eval_paths, runs=args.runs)
+    report['calibration_images'] = len(calibration_paths) if args.mode == 'static' else 0
+
+    print(f"Quantization mode: {args.mode} ({torch.backends.quantized.engine})")
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
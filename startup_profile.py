@@ -0,0 +1,80 @@
+"""
+Where a worker's boot time goes.
+
+app.py records each startup phase (imports, config, database, services,
+and in the background thread: importing torch, loading and warming up the
+model) in the process-wide ``startup`` profiler. The report is printed
+once the app is created and served under /inference_stats; benchmark.py
+boot measures the same phases over fresh processes.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def process_started_at():
+    """Wall-clock time this process was started (forked, for a gunicorn worker), or None"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22, after the parenthesised command name, is the start time in clock ticks since boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+class StartupProfiler:
+    """Named, timed startup phases of one process"""
+
+    def __init__(self):
+        self.process_started = process_started_at()
+        self.created = time.time()
+        self.phases = []
+        self._last_mark = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases.append({'phase': name, 'ms': round(seconds * 1000, 1),
+                                'at_s': round(self.since_process_start(), 3)})
+
+    @contextmanager
+    def phase(self, name):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - began)
+            self._last_mark = time.perf_counter()
+
+    def mark(self, name):
+        """Record everything since the previous phase or mark (e.g. a block of imports) as ``name``"""
+        now = time.perf_counter()
+        self.record(name, now - self._last_mark)
+        self._last_mark = now
+
+    def since_process_start(self):
+        """Seconds since the process started (since this profiler was created if unknown)"""
+        return time.time() - (self.process_started or self.created)
+
+    def report(self):
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            'pid': os.getpid(),
+            'before_app_import_ms': round((self.created - self.process_started) * 1000, 1)
+                                    if self.process_started else None,
+            'phases': phases,
+        }
+
+    def summary(self):
+        """One line for the log: the phases and the time since the process started"""
+        with self._lock:
+            phases = ', '.join(f"{p['phase']} {p['ms']:.0f} ms" for p in self.phases)
+        return f"{phases} ({self.since_process_start():.2f} s since process start)"
+
+
+startup = StartupProfiler()
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncUploadWriter:
+    """
+    Writes uploaded images to the upload folder off the request thread.
+
+    Requests classify straight from the in-memory bytes and hand the original
+    to this writer; anything that needs the file on disk (e.g. the preview
+    route) calls wait() for that filename first. The queue is per process,
+    so wait() falls back to watching for the file when another worker
+    process took the upload.
+    """
+
+    def __init__(self, folder, max_workers=2):
+        self.folder = folder
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Executor threads do not survive a fork, so create one per process
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='upload-writer')
+            self._pid = os.getpid()
+            self._pending = {}
+        return self._executor
+
+    def _write(self, filename, data):
+        path = os.path.join(self.folder, filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        # Readers only ever see complete files
+        os.replace(tmp_path, path)
+        return path
+
+    def _done(self, filename, future):
+        with self._lock:
+            if self._pending.get(filename) is future:
+                del self._pending[filename]
+        if future.exception() is not None:
+            print(f"Saving upload {filename} failed: {future.exception()}")
+
+    def save(self, filename, data):
+        """Queue ``data`` to be written as ``filename`` and return the Future"""
+        with self._lock:
+            future = self._get_executor().submit(self._write, filename, data)
+            self._pending[filename] = future
+        future.add_done_callback(lambda f: self._done(filename, f))
+        return future
+
+    def wait(self, filename, timeout=10.0, poll_timeout=0.0):
+        """
+        Block until ``filename`` is on disk: a write queued in this process is
+        waited on directly, one queued elsewhere is polled for up to
+        ``poll_timeout`` seconds. Returns whether the file exists.
+        """
+        with self._lock:
+            future = self._pending.get(filename)
+        if future is not None:
+            future.result(timeout=timeout)
+        path = os.path.join(self.folder, filename)
+        deadline = time.monotonic() + poll_timeout
+        while not os.path.exists(path):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)